@@ -1,31 +1,196 @@
-from msgspec import Struct
-from pyramid.response import FileResponse, Response
+from datetime import datetime
+from os import SEEK_END
+from typing import Annotated, Any, Dict, List, Set, Union
+from uuid import UUID
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+from msgspec import UNSET, Meta, Struct, UnsetType
+from msgspec import convert as msgspec_convert
+from msgspec import to_builtins as msgspec_to_builtins
+from msgspec.json import decode as msgspec_json_decode
+from pyramid.response import FileIter, FileResponse, Response
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import NoResultFound
 
+from nextgisweb.env import DBSession, gettext, gettextf
+from nextgisweb.lib.geometry import Geometry
+
+from nextgisweb.core.exception import InsufficientPermissions, ValidationError
+from nextgisweb.file_upload import FileUploadRef
 from nextgisweb.resource import (
     DataScope,
+    Resource,
     ResourceNotFound,
     ResourceRef,
     ResourceScope,
     resource_factory,
 )
 
-from .model import FormbuilderForm, FormbuilderFormValue
+from .cache import spooled_file
+from .element import (
+    CascadeOption,
+    FormbuilderCascadeItem,
+    FormbuilderDropdownItem,
+    FormbuilderOutlineItem,
+    FormbuilderRadioItem,
+    OptionSingle,
+)
+from .job import submit_ngfp_job
+from .model import (
+    FormbuilderForm,
+    FormbuilderFormElement,
+    FormbuilderFormRevision,
+    FormbuilderFormValue,
+    FormbuilderNGFPJob,
+    FormbuilderNGFPJobNotFound,
+    FormbuilderRecordError,
+    NGFPJobStatus,
+    ngfp_archive_key,
+    revision_changes,
+    revision_value,
+    schema_stale,
+)
+from .revision import RevisionChange
+
+BATCH_MAX_RECORDS = 10000
+
+DISTINCT_MAX_LIMIT = 10000
+
+ELEMENT_MAX_LIMIT = 10000
+ELEMENT_FILTER_OPS = ("eq", "ne", "lt", "le", "gt", "ge")
+
+FILTER_OPS = ("eq", "ne", "lt", "le", "gt", "ge", "like", "ilike")
+
 
+def _features_filter(request, keynames):
+    result = []
+    for param, value in request.GET.items():
+        if not param.startswith("fld_"):
+            continue
+        keyname, _, op = param[4:].partition("__")
+        if op == "":
+            op = "eq"
+        if keyname not in keynames or op not in FILTER_OPS:
+            raise ValidationError(gettextf("Invalid filter parameter '{}'.").format(param))
+        result.append((keyname, op, value))
+    return result
 
-def formbuilder_form_ngfp(resource, request):
+
+def _features_intersects(bbox):
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise ValidationError(gettext("Invalid bbox parameter."))
+    return Geometry.from_wkt(
+        f"POLYGON(({minx} {miny}, {maxx} {miny}, {maxx} {maxy}, {minx} {maxy}, {minx} {miny}))",
+        srid=4326,
+    )
+
+
+def formbuilder_form_ngfp(
+    resource,
+    request,
+    *,
+    data: Annotated[
+        bool,
+        Meta(description="Include features of the parent layer into data.geojson"),
+    ] = False,
+    bbox: Annotated[
+        Union[str, None],
+        Meta(description="Include only features intersecting minx,miny,maxx,maxy in EPSG:4326"),
+    ] = None,
+):
     request.resource_permission(ResourceScope.read)
+    resource.check_schema()
 
-    if ngfp := resource.value:
-        data = ngfp.to_legacy(resource.display_name)
-        response = Response(data)
+    if data:
+        layer = resource.feature_layer
+        request.resource_permission(DataScope.read, layer)
+        features = resource.legacy_features(
+            filter=_features_filter(request, {f.keyname for f in layer.fields}),
+            intersects=_features_intersects(bbox) if bbox is not None else None,
+        )
     else:
+        features = None
+
+    if features is None and resource.value is None:
         response = FileResponse(resource.ngfp_fileobj.filename(), request=request)
+    else:
+        # Served from a file, either a cached archive or a spooled temporary
+        # one, to keep the worker's memory flat, and as a conditional response
+        # to support HTTP Range requests
+        options = request.env.formbuilder.ngfp_encode_options
+        if features is None:
+            fd = resource.ngfp_archive(**options)
+        else:
+            fd = spooled_file(lambda fd: resource.write_ngfp(fd, features=features, **options))
+        size = fd.seek(0, SEEK_END)
+        fd.seek(0)
+        response = Response(
+            app_iter=FileIter(fd),
+            content_type="application/octet-stream",
+            content_length=size,
+            conditional_response=True,
+            request=request,
+        )
 
     response.content_disposition = "attachment; filename=%d.ngfp" % resource.id
     return response
 
 
+class NGFPJobBody(Struct, kw_only=True):
+    file: FileUploadRef
+
+
+class FormbuilderNGFPJobRead(Struct, kw_only=True):
+    id: str
+    status: NGFPJobStatus
+    value: Union[FormbuilderFormValue, UnsetType] = UNSET
+    error: Union[str, UnsetType] = UNSET
+
+
+def _ngfp_job_read(job: FormbuilderNGFPJob) -> FormbuilderNGFPJobRead:
+    return FormbuilderNGFPJobRead(
+        id=str(job.id),
+        status=job.status,
+        value=job.value if job.value is not None else UNSET,
+        error=job.error if job.error is not None else UNSET,
+    )
+
+
+def _ngfp_job_user(request) -> int:
+    # Guests share a single user ID, so their jobs would be visible to each
+    # other, and queueing jobs anonymously is not allowed anyway
+    if (user_id := request.authenticated_userid) is None:
+        raise InsufficientPermissions(
+            message=gettext("NGFP conversion jobs are available to authenticated users only.")
+        )
+    return user_id
+
+
+def ngfp_job_create(request, *, body: NGFPJobBody) -> FormbuilderNGFPJobRead:
+    """Validate and convert an uploaded NGFP file in background
+
+    The job status is polled until it's done or failed. Without background
+    workers configured, the job is complete on return."""
+
+    user_id = _ngfp_job_user(request)
+    job = submit_ngfp_job(body.file().data_path, user_id=user_id)
+    return _ngfp_job_read(job)
+
+
+def ngfp_job_item(request) -> FormbuilderNGFPJobRead:
+    user_id = _ngfp_job_user(request)
+    try:
+        job = FormbuilderNGFPJob.filter_by(id=UUID(request.matchdict["id"])).one_or_none()
+    except ValueError:
+        job = None
+    if job is None or job.user_id != user_id:
+        raise FormbuilderNGFPJobNotFound()
+    return _ngfp_job_read(job)
+
+
 class NGFPConvertBody(Struct, kw_only=True):
     resource: ResourceRef
 
@@ -38,11 +203,374 @@ def formbuilder_form_convert(request, *, body: NGFPConvertBody) -> FormbuilderFo
 
     request.resource_permission(DataScope.read, res)
 
-    if res.value is not None:
-        return res.value
+    return res.resolve_value()
+
+
+class FormbuilderValidateBody(Struct, kw_only=True):
+    records: Annotated[
+        List[Dict[str, Any]],
+        Meta(max_length=BATCH_MAX_RECORDS, description="Feature field values by keyname"),
+    ]
+
+
+class FormbuilderValidateResponse(Struct, kw_only=True):
+    total: int
+    invalid: int
+    errors: List[FormbuilderRecordError]
+
+
+def formbuilder_form_validate(
+    resource,
+    request,
+    *,
+    body: FormbuilderValidateBody,
+) -> FormbuilderValidateResponse:
+    request.resource_permission(ResourceScope.read)
+
+    errors = resource.validate_records(body.records)
+    return FormbuilderValidateResponse(
+        total=len(body.records),
+        invalid=len({e.record for e in errors}),
+        errors=errors,
+    )
+
+
+class FormbuilderDefaultsBody(Struct, kw_only=True):
+    count: Annotated[
+        Union[int, None],
+        Meta(ge=1, le=BATCH_MAX_RECORDS, description="Number of records to generate"),
+    ] = None
+    records: Annotated[
+        Union[List[Dict[str, Any]], None],
+        Meta(max_length=BATCH_MAX_RECORDS, description="Partial records to complete"),
+    ] = None
+
+
+def formbuilder_form_defaults(
+    resource,
+    request,
+    *,
+    body: FormbuilderDefaultsBody,
+) -> List[Dict[str, Any]]:
+    request.resource_permission(ResourceScope.read)
+
+    if (body.count is None) == (body.records is None):
+        raise ValidationError(gettext("Either count or records must be given."))
+
+    base = resource.record_defaults().resolve(
+        now=datetime.now(),
+        username=request.user.keyname,
+    )
+    if body.records is None:
+        return [dict(base) for _ in range(body.count)]
+    return [base | record for record in body.records]
+
+
+DistinctLimit = Annotated[int, Meta(ge=1, le=DISTINCT_MAX_LIMIT)]
+
+
+class FormbuilderDistinctValue(Struct, kw_only=True):
+    value: Any
+    secondary: Union[Any, UnsetType] = UNSET
+    count: int
+
+
+def _distinct_values(resource, request, keynames, *, limit, offset=0):
+    layer = resource.feature_layer
+    request.resource_permission(DataScope.read, layer)
+
+    layer_keynames = {f.keyname for f in layer.fields}
+    for keyname in keynames:
+        if keyname not in layer_keynames:
+            raise ValidationError(gettextf("Unknown field '{}'.").format(keyname))
+
+    return resource.distinct_values(keynames, limit=limit, offset=offset)
+
+
+def distinct(
+    resource,
+    request,
+    *,
+    field: Annotated[str, Meta(description="Field keyname")],
+    secondary: Annotated[
+        Union[str, None],
+        Meta(description="Secondary field keyname to get distinct pairs"),
+    ] = None,
+    limit: DistinctLimit = 100,
+    offset: Annotated[int, Meta(ge=0)] = 0,
+) -> List[FormbuilderDistinctValue]:
+    keynames = (field,) if secondary is None else (field, secondary)
+    rows = _distinct_values(resource, request, keynames, limit=limit, offset=offset)
+    return [
+        FormbuilderDistinctValue(
+            value=values[0],
+            secondary=values[1] if secondary is not None else UNSET,
+            count=count,
+        )
+        for values, count in rows
+    ]
+
+
+class DistinctOptionsBody(Struct, kw_only=True):
+    field: str
+    limit: DistinctLimit = 1000
+    apply: Annotated[
+        bool,
+        Meta(description="Replace options of the item bound to the field"),
+    ] = False
+
+
+class DistinctCascadeBody(Struct, kw_only=True):
+    field_primary: str
+    field_secondary: str
+    limit: DistinctLimit = 1000
+    apply: Annotated[
+        bool,
+        Meta(description="Replace options of the cascade item bound to the fields"),
+    ] = False
+
+
+def _apply_options(resource, request, match, options):
+    request.resource_permission(ResourceScope.update)
+    if resource.value is None:
+        raise ValidationError(gettext("Options can't be applied to a form stored as NGFP file."))
+
+    value = msgspec_convert(msgspec_to_builtins(resource.value), FormbuilderFormValue)
+    for item in value.walk_items():
+        if match(item):
+            item.options = options
+            break
+    else:
+        raise ValidationError(gettext("No suitable form item is bound to the field."))
+
+    resource.update_value(value)
+
+
+def distinct_options(resource, request, *, body: DistinctOptionsBody) -> List[OptionSingle]:
+    rows = _distinct_values(resource, request, (body.field,), limit=body.limit)
+    options = [OptionSingle(value=str(v), label=str(v)) for (v,), _ in rows]
+
+    if body.apply:
+        _apply_options(
+            resource,
+            request,
+            lambda i: (
+                isinstance(i, (FormbuilderRadioItem, FormbuilderDropdownItem))
+                and i.field == body.field
+            ),
+            options,
+        )
+
+    return options
+
+
+def distinct_cascade(resource, request, *, body: DistinctCascadeBody) -> List[CascadeOption]:
+    keynames = (body.field_primary, body.field_secondary)
+    rows = _distinct_values(resource, request, keynames, limit=body.limit)
+
+    options: Dict[str, CascadeOption] = dict()
+    for (primary, secondary), _ in rows:
+        primary = str(primary)
+        if (option := options.get(primary)) is None:
+            option = options[primary] = CascadeOption(value=primary, label=primary, items=[])
+        if secondary is not None:
+            secondary = str(secondary)
+            option.items.append(OptionSingle(value=secondary, label=secondary))
+    result = list(options.values())
+
+    if body.apply:
+        _apply_options(
+            resource,
+            request,
+            lambda i: (
+                isinstance(i, FormbuilderCascadeItem)
+                and (i.field_primary, i.field_secondary) == keynames
+            ),
+            result,
+        )
 
-    fn = res.ngfp_fileobj.filename()
-    return FormbuilderFormValue.from_legacy(fn)
+    return result
+
+
+class FormbuilderManifestItem(Struct, kw_only=True):
+    id: int
+    parent: int
+    hash: Union[str, None]
+    size: Union[int, None]
+    stale: Annotated[bool, Meta(description="Parent layer fields changed since last update")]
+
+
+def _readable_forms(request, ids: List[int]) -> Set[int]:
+    # Only columns and ACL rules needed for permission checks are loaded, so
+    # form values aren't fetched and decoded
+    F = FormbuilderForm
+    query = (
+        DBSession.query(F)
+        .filter(F.id.in_(ids))
+        .options(
+            orm.load_only(F.id, F.parent_id, F.owner_user_id),
+            orm.selectinload(F.acl),
+        )
+    )
+    return {res.id for res in query if res.has_permission(ResourceScope.read, request.user)}
+
+
+def manifest(
+    request,
+    *,
+    parent: Annotated[int, Meta(description="Subtree root resource ID")] = 0,
+    stale: Annotated[
+        Union[bool, None],
+        Meta(description="Only forms with parent layer fields changed or not"),
+    ] = None,
+) -> List[FormbuilderManifestItem]:
+    subtree = sa.select(Resource.id).where(Resource.id == parent).cte(recursive=True)
+    subtree = subtree.union_all(
+        sa.select(Resource.id).where(Resource.parent_id == subtree.c.id),
+    )
+
+    F, is_stale = FormbuilderForm, schema_stale()
+    query = sa.select(F.id, F.parent_id, F.display_name, F.content_hash, F.content_size, is_stale)
+    query = query.where(F.id.in_(sa.select(subtree.c.id)))
+    if stale is not None:
+        query = query.where(is_stale if stale else ~is_stale)
+    query = query.order_by(F.id)
+
+    rows = DBSession.execute(query).all()
+    readable = _readable_forms(request, [row.id for row in rows])
+
+    # Devices download generated NGFP files, which include the name, so
+    # the hash is the key of such a file
+    options = request.env.formbuilder.ngfp_encode_options
+    return [
+        FormbuilderManifestItem(
+            id=res_id,
+            parent=parent_id,
+            hash=(
+                ngfp_archive_key(content_hash, display_name, options)
+                if content_hash is not None
+                else None
+            ),
+            size=content_size,
+            stale=res_stale,
+        )
+        for res_id, parent_id, display_name, content_hash, content_size, res_stale in rows
+        if res_id in readable
+    ]
+
+
+class FormbuilderRevisionItem(Struct, kw_only=True):
+    revision: int
+    tstamp: datetime
+    snapshot: bool
+
+
+def _element_filter(request):
+    E = FormbuilderFormElement
+    result = []
+    for param, value in request.GET.items():
+        if not param.startswith("attr_"):
+            continue
+        name, _, op = param[5:].partition("__")
+        if op == "":
+            op = "eq"
+        if name == "" or op not in ELEMENT_FILTER_OPS:
+            raise ValidationError(gettextf("Invalid filter parameter '{}'.").format(param))
+
+        try:
+            value = msgspec_json_decode(value)
+        except ValueError:
+            pass
+
+        if op == "eq":
+            # Containment is served by the GIN index on attributes
+            result.append(E.attrs.contains({name: value}))
+        else:
+            operand = sa.literal(value, JSONB)
+            result.append(getattr(E.attrs[name], f"__{op}__")(operand))
+    return result
+
+
+class FormbuilderElementMatch(Struct, kw_only=True):
+    resource: int
+    path: str
+    tag: str
+    attrs: Dict[str, Any]
+
+
+def element_search(
+    request,
+    *,
+    tag: Annotated[Union[str, None], Meta(description="Element type tag")] = None,
+    limit: Annotated[int, Meta(ge=1, le=ELEMENT_MAX_LIMIT)] = 1000,
+) -> List[FormbuilderElementMatch]:
+    """Search form elements by type and attributes
+
+    Attribute predicates are passed as attr_{name}__{op} parameters, where
+    op is one of eq, ne, lt, le, gt, ge and the value is parsed as JSON
+    when possible, for example attr_max_count__gt=10."""
+
+    E = FormbuilderFormElement
+    query = sa.select(E.resource_id, E.path, E.tag, E.attrs).where(*_element_filter(request))
+    if tag is not None:
+        query = query.where(E.tag == tag)
+    query = query.order_by(E.resource_id, E.position)
+
+    result = []
+    checked: Set[int] = set()
+    readable: Set[int] = set()
+    rows = DBSession.execute(query.execution_options(yield_per=limit))
+    for partition in rows.partitions():
+        # Permissions are checked once per batch for forms not seen before
+        if unchecked := {row.resource_id for row in partition} - checked:
+            readable |= _readable_forms(request, list(unchecked))
+            checked |= unchecked
+
+        for resource_id, path, etag, attrs in partition:
+            if resource_id not in readable:
+                continue
+            result.append(
+                FormbuilderElementMatch(resource=resource_id, path=path, tag=etag, attrs=attrs)
+            )
+            if len(result) == limit:
+                return result
+    return result
+
+
+def outline(resource, request) -> List[FormbuilderOutlineItem]:
+    request.resource_permission(ResourceScope.read)
+    return resource.outline()
+
+
+def revision_collection(resource, request) -> List[FormbuilderRevisionItem]:
+    request.resource_permission(ResourceScope.read)
+
+    R = FormbuilderFormRevision
+    query = (
+        DBSession.query(R.revision, R.tstamp, R.snapshot.isnot(None))
+        .filter(R.resource_id == resource.id)
+        .order_by(R.revision)
+    )
+    return [
+        FormbuilderRevisionItem(revision=revision, tstamp=tstamp, snapshot=snapshot)
+        for revision, tstamp, snapshot in query
+    ]
+
+
+def revision_item(resource, request) -> FormbuilderFormValue:
+    request.resource_permission(ResourceScope.read)
+    return revision_value(resource, int(request.matchdict["revision"]))
+
+
+def revision_diff(
+    resource,
+    request,
+    *,
+    base: Annotated[int, Meta(description="Base revision")],
+    target: Annotated[int, Meta(description="Target revision")],
+) -> List[RevisionChange]:
+    request.resource_permission(ResourceScope.read)
+    return revision_changes(resource, base, target)
 
 
 def setup_pyramid(comp, config):
@@ -56,3 +584,77 @@ def setup_pyramid(comp, config):
         "formbuilder.formbuilder_form_convert",
         "/api/component/formbuilder/ngfp_convert",
     ).post(formbuilder_form_convert)
+
+    config.add_route(
+        "formbuilder.ngfp_job.collection",
+        "/api/component/formbuilder/ngfp_job/",
+    ).post(ngfp_job_create)
+
+    config.add_route(
+        "formbuilder.ngfp_job.item",
+        "/api/component/formbuilder/ngfp_job/{id}",
+    ).get(ngfp_job_item)
+
+    config.add_route(
+        "formbuilder.validate",
+        "/api/resource/{id:uint}/formbuilder/validate",
+        factory=resource_factory,
+    ).post(formbuilder_form_validate, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.defaults",
+        "/api/resource/{id:uint}/formbuilder/defaults",
+        factory=resource_factory,
+    ).post(formbuilder_form_defaults, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.distinct",
+        "/api/resource/{id:uint}/formbuilder/distinct",
+        factory=resource_factory,
+    ).get(distinct, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.distinct.options",
+        "/api/resource/{id:uint}/formbuilder/distinct/options",
+        factory=resource_factory,
+    ).post(distinct_options, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.distinct.cascade",
+        "/api/resource/{id:uint}/formbuilder/distinct/cascade",
+        factory=resource_factory,
+    ).post(distinct_cascade, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.outline",
+        "/api/resource/{id:uint}/formbuilder/outline",
+        factory=resource_factory,
+    ).get(outline, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.revision.collection",
+        "/api/resource/{id:uint}/formbuilder/revision/",
+        factory=resource_factory,
+    ).get(revision_collection, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.revision.item",
+        "/api/resource/{id:uint}/formbuilder/revision/{revision:uint}",
+        factory=resource_factory,
+    ).get(revision_item, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.revision.diff",
+        "/api/resource/{id:uint}/formbuilder/revision/diff",
+        factory=resource_factory,
+    ).get(revision_diff, context=FormbuilderForm)
+
+    config.add_route(
+        "formbuilder.element",
+        "/api/component/formbuilder/element",
+    ).get(element_search)
+
+    config.add_route(
+        "formbuilder.manifest",
+        "/api/component/formbuilder/manifest",
+    ).get(manifest)
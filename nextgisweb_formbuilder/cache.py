@@ -0,0 +1,427 @@
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fcntl import LOCK_EX, flock
+from functools import lru_cache
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from threading import Event, Lock
+from time import time
+from typing import IO, Any, Callable, Dict, Hashable, Iterator, List, Type, TypeVar, Union
+
+import sqlalchemy as sa
+from msgspec import UNSET, DecodeError, ValidationError
+from msgspec.msgpack import Decoder as MsgpackDecoder
+from msgspec.msgpack import Encoder as MsgpackEncoder
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from nextgisweb.env import DBSession, env
+
+from nextgisweb.file_storage import FileObj
+
+T = TypeVar("T")
+
+msgpack_encoder = MsgpackEncoder()
+
+
+@lru_cache
+def msgpack_decoder(type: Type[T]) -> MsgpackDecoder:
+    return MsgpackDecoder(type)
+
+
+# Share of max_size left occupied after eviction, so that eviction doesn't run
+# on each write once the cache is full
+EVICT_WATERMARK = 0.9
+
+# Temporary files of interrupted writes and lock files older than this are
+# removed on eviction
+STALE_TEMPORARY = 3600
+
+# Artifacts built as files are kept in memory up to this size
+SPOOL_SIZE = 1 << 20
+
+
+def spooled_file(write: Callable[[IO[bytes]], None]) -> IO[bytes]:
+    fd = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        write(fd)
+    except BaseException:
+        fd.close()
+        raise
+    fd.seek(0)
+    return fd
+
+
+def spooled_copy(fd: IO[bytes]) -> IO[bytes]:
+    fd.seek(0)
+    result = spooled_file(lambda dst: copyfileobj(fd, dst))
+    fd.seek(0)
+    return result
+
+
+class ArtifactCache(ABC):
+    """Storage for derived artifacts shared between worker processes
+
+    Keys are content hashes, so entries never have to be invalidated and
+    concurrent writers of the same key always write the same data."""
+
+    @abstractmethod
+    def open(self, kind: str, key: str) -> Union[IO[bytes], None]:
+        """Open a stored entry for reading or return None if missing"""
+
+    @abstractmethod
+    def put_file(self, kind: str, key: str, fd: IO[bytes]) -> None:
+        """Store an entry copying it from a file from its current position"""
+
+    def get(self, kind: str, key: str) -> Union[bytes, None]:
+        if (fd := self.open(kind, key)) is None:
+            return None
+        with fd:
+            return fd.read()
+
+    def put(self, kind: str, key: str, data: bytes) -> None:
+        self.put_file(kind, key, BytesIO(data))
+
+    def contains(self, kind: str, key: str) -> bool:
+        if (fd := self.open(kind, key)) is None:
+            return False
+        fd.close()
+        return True
+
+    @contextmanager
+    def lock(self, kind: str, key: str) -> Iterator[None]:
+        yield
+
+    def build(self, kind: str, key: str, factory: Callable[[], T], *, type: Type[T]) -> T:
+        """Get an artifact or build and store it
+
+        Processes missing the same artifact simultaneously wait for the first
+        one to build it instead of building it again."""
+
+        if (result := self._load(kind, key, type)) is not UNSET:
+            return result
+        with self.lock(kind, key):
+            if (result := self._load(kind, key, type)) is not UNSET:
+                return result
+            result = factory()
+            data = result if type is bytes else msgpack_encoder.encode(result)
+            self.put(kind, key, data)  # type: ignore
+        return result
+
+    def build_file(self, kind: str, key: str, write: Callable[[IO[bytes]], None]) -> IO[bytes]:
+        """Open an artifact or write, store and return it as a file
+
+        Unlike build, the artifact is never loaded into memory as a whole,
+        so it suits large artifacts served to clients."""
+
+        if (fd := self.open(kind, key)) is not None:
+            return fd
+        with self.lock(kind, key):
+            if (fd := self.open(kind, key)) is not None:
+                return fd
+            fd = spooled_file(write)
+            try:
+                self.put_file(kind, key, fd)
+                fd.seek(0)
+            except BaseException:
+                fd.close()
+                raise
+        return fd
+
+    def _load(self, kind: str, key: str, type: Type[T]) -> Any:
+        # Undecodable entries, left by a previous version for example, are
+        # rebuilt and overwritten
+        if (data := self.get(kind, key)) is None:
+            return UNSET
+        elif type is bytes:
+            return data
+        try:
+            return msgpack_decoder(type).decode(data)
+        except (DecodeError, ValidationError):
+            return UNSET
+
+
+class DiskArtifactCache(ArtifactCache):
+    def __init__(self, path: Path, *, max_size: int):
+        self.path = path
+        self.max_size = max_size
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.path / kind / key[:2] / key
+
+    def open(self, kind: str, key: str) -> Union[IO[bytes], None]:
+        path = self._path(kind, key)
+        try:
+            fd = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        # Modification time serves as the last access time for LRU eviction.
+        # The opened file remains readable even if it's evicted meanwhile.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return fd
+
+    def contains(self, kind: str, key: str) -> bool:
+        return self._path(kind, key).exists()
+
+    def put_file(self, kind: str, key: str, fd: IO[bytes]) -> None:
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Readers see either no file or a complete one
+        with NamedTemporaryFile(dir=path.parent, prefix=".tmp-", delete=False) as tmp:
+            try:
+                copyfileobj(fd, tmp)
+                tmp.flush()
+                size = tmp.tell()
+                try:
+                    size -= path.stat().st_size
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp.name, path)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+        self._account(size)
+
+    @contextmanager
+    def lock(self, kind: str, key: str) -> Iterator[None]:
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.parent / f".lock-{key}", "wb") as fd:
+            flock(fd, LOCK_EX)
+            yield
+
+    def evict(self) -> int:
+        """Evict least recently used entries above max_size, return usage
+
+        Usage is computed from the directory contents under a cache-wide
+        lock, so all processes sharing the directory respect max_size."""
+
+        with self._lock_cache():
+            usage = self._evict()
+            self._write_usage(usage)
+        return usage
+
+    def _account(self, delta: int) -> None:
+        # Writes only update the approximate usage shared by processes. The
+        # directory is walked when usage is unknown or exceeds max_size.
+        with self._lock_cache():
+            usage = self._read_usage()
+            if usage is not None:
+                usage += delta
+            if usage is None or usage > self.max_size:
+                usage = self._evict()
+            self._write_usage(usage)
+
+    @contextmanager
+    def _lock_cache(self) -> Iterator[None]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "wb") as fd:
+            flock(fd, LOCK_EX)
+            yield
+
+    def _read_usage(self) -> Union[int, None]:
+        try:
+            return int((self.path / ".usage").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_usage(self, usage: int) -> None:
+        (self.path / ".usage").write_text(str(usage))
+
+    def _evict(self) -> int:
+        entries, stale = [], time() - STALE_TEMPORARY
+        for dirpath, _, filenames in os.walk(self.path):
+            for fn in filenames:
+                fpath = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(fpath)
+                    if not fn.startswith("."):
+                        entries.append((st.st_mtime, st.st_size, fpath))
+                    elif fn.startswith((".tmp-", ".lock-")) and st.st_mtime < stale:
+                        os.unlink(fpath)
+                except FileNotFoundError:
+                    pass
+
+        usage = sum(size for _, size, _ in entries)
+        if usage > self.max_size:
+            entries.sort()
+            limit = self.max_size * EVICT_WATERMARK
+            for _, size, fpath in entries:
+                if usage <= limit:
+                    break
+                try:
+                    os.unlink(fpath)
+                except FileNotFoundError:
+                    pass
+                usage -= size
+        return usage
+
+
+class FileStorageArtifactCache(ArtifactCache):
+    def __init__(self, *, max_size: int):
+        self.max_size = max_size
+
+    def open(self, kind: str, key: str) -> Union[IO[bytes], None]:
+        from .model import FormbuilderArtifact as A
+
+        fileobj = (
+            DBSession.query(FileObj)
+            .join(A, A.fileobj_id == FileObj.id)
+            .filter(A.kind == kind, A.key == key)
+            .one_or_none()
+        )
+        if fileobj is None:
+            return None
+        try:
+            return open(fileobj.filename(), "rb")
+        except FileNotFoundError:
+            return None
+
+    def contains(self, kind: str, key: str) -> bool:
+        from .model import FormbuilderArtifact as A
+
+        query = sa.select(sa.exists().where(A.kind == kind, A.key == key))
+        return DBSession.execute(query).scalar()
+
+    @contextmanager
+    def lock(self, kind: str, key: str) -> Iterator[None]:
+        # Held until the end of the transaction, i.e. until the stored
+        # artifact becomes visible to other processes
+        lock_id = int.from_bytes(sha256(f"{kind}:{key}".encode()).digest()[:8], signed=True)
+        DBSession.execute(sa.select(sa.func.pg_advisory_xact_lock(lock_id)))
+        yield
+
+    def put_file(self, kind: str, key: str, fd: IO[bytes]) -> None:
+        from .model import FormbuilderArtifact as A
+
+        # File storage writes the file completely before the row referencing
+        # it becomes visible. Files of replaced or evicted rows are removed by
+        # the file storage cleanup.
+        fileobj = FileObj(component="formbuilder").copy_from(fd)
+        DBSession.add(fileobj)
+        DBSession.flush()
+
+        size = Path(fileobj.filename()).stat().st_size
+        values = dict(
+            fileobj_id=fileobj.id,
+            size=size,
+            tstamp=datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+        DBSession.execute(
+            pg_insert(A)
+            .values(kind=kind, key=key, **values)
+            .on_conflict_do_update(index_elements=[A.kind, A.key], set_=values)
+        )
+
+        total = sa.func.sum(A.size).over(order_by=A.tstamp.desc()).label("total")
+        window = sa.select(A.kind, A.key, total).subquery()
+        DBSession.execute(
+            sa.delete(A).where(
+                sa.tuple_(A.kind, A.key).in_(
+                    sa.select(window.c.kind, window.c.key).where(window.c.total > self.max_size)
+                )
+            )
+        )
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key within a process
+
+    The first caller runs the function, others wait for it and get the same
+    result or exception. Results are not kept after the call completes.
+
+    Results that can't be shared, like open files, are passed through the
+    share function by the first caller, once for each waiting one."""
+
+    class Call:
+        def __init__(self):
+            self.event = Event()
+            self.result: Any = None
+            self.error: Union[BaseException, None] = None
+            self.waiters = 0
+            self.shared: List[Any] = []
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[Hashable, SingleFlight.Call] = dict()
+
+    def __call__(
+        self,
+        key: Hashable,
+        fn: Callable[[], T],
+        *,
+        share: Union[Callable[[T], T], None] = None,
+    ) -> T:
+        with self._lock:
+            if (call := self._calls.get(key)) is None:
+                call = self._calls[key] = self.Call()
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.shared.pop() if share is not None else call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            # No more waiters can join after the call is removed
+            with self._lock:
+                del self._calls[key]
+            if share is not None and call.error is None:
+                try:
+                    call.shared = [share(call.result) for _ in range(call.waiters)]
+                except BaseException as exc:
+                    call.error = exc
+            call.event.set()
+        return call.result
+
+
+single_flight = SingleFlight()
+
+
+def cached_artifact(
+    kind: str,
+    key: str,
+    factory: Callable[[], T],
+    type: Type[T],
+) -> T:
+    """Get an artifact from the shared cache or build and store it
+
+    Artifacts are serialized with MessagePack, except bytes stored as is."""
+
+    if (cache := env.formbuilder.artifact_cache) is None:
+        return factory()
+    return cache.build(kind, key, factory, type=type)
+
+
+def cached_artifact_file(
+    kind: str,
+    key: str,
+    write: Callable[[IO[bytes]], None],
+) -> IO[bytes]:
+    """Open an artifact file from the shared cache or write and store it
+
+    Without the shared cache, concurrent calls within a process still write
+    the file once, and each caller gets its own copy."""
+
+    if (cache := env.formbuilder.artifact_cache) is None:
+        return single_flight((kind, key), lambda: spooled_file(write), share=spooled_copy)
+    return cache.build_file(kind, key, write)
@@ -0,0 +1,182 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import sqlalchemy as sa
+import transaction
+
+from nextgisweb.env import DBSession, env
+from nextgisweb.env.cli import EnvCommand, arg, comp_cli, opt
+
+from nextgisweb.resource import Resource
+
+from . import roundtrip as rt
+from .loadtest import HTTPClient, LoadProfile, run_load
+from .model import FormbuilderForm, ngfp_archive_key
+
+
+def missing_artifacts(
+    comp,
+    content_hash: str,
+    display_name: str,
+    file_backed: bool,
+) -> Tuple[List[str], int]:
+    """Kinds of shared artifacts missing for a form and the total count
+
+    Artifacts are keyed by the content hash, so the cache is checked
+    without loading the form value."""
+
+    steps = [("defaults", content_hash), ("outline", content_hash)]
+    if file_backed:
+        # Uploaded NGFP files are served as is, but their decoded values are
+        # used to build other artifacts
+        steps.insert(0, ("value", content_hash))
+    else:
+        key = ngfp_archive_key(content_hash, display_name, comp.ngfp_encode_options)
+        steps.insert(0, ("ngfp", key))
+
+    cache = comp.artifact_cache
+    return [kind for kind, key in steps if not cache.contains(kind, key)], len(steps)
+
+
+def _worker_init():
+    # Connections inherited from the parent process can't be shared
+    DBSession.get_bind().dispose(close=False)
+
+
+def warmup_form(form_id: int, kinds: List[str]) -> int:
+    """Build shared artifacts of the given kinds for a form"""
+
+    opts = env.formbuilder.ngfp_encode_options
+    with transaction.manager:
+        obj = FormbuilderForm.filter_by(id=form_id).one()
+        build = dict(
+            value=obj.resolve_value,
+            ngfp=lambda: obj.ngfp_archive(**opts).close(),
+            defaults=obj.record_defaults,
+            outline=obj.outline,
+        )
+        for kind in kinds:
+            build[kind]()
+    return len(kinds)
+
+
+@comp_cli.command()
+def warmup(
+    self: EnvCommand,
+    *,
+    resource: Union[int, None] = opt(None, doc="Only forms within this resource subtree"),
+    workers: int = opt(4, doc="Number of worker processes"),
+) -> None:
+    """Build shared cache artifacts of forms
+
+    Forms are identified by content hashes, so a rerun only builds
+    artifacts for forms changed or added since the previous one."""
+
+    comp = self.env.formbuilder
+    if comp.artifact_cache is None:
+        raise RuntimeError("Shared cache is not configured, see cache.backend option")
+
+    F = FormbuilderForm
+    query = (
+        sa.select(F.id, F.content_hash, F.display_name, F.value.is_(None))
+        .where(F.content_hash.isnot(None))
+        .order_by(F.id)
+    )
+    if resource is not None:
+        tree = sa.select(Resource.id).where(Resource.id == resource).cte("tree", recursive=True)
+        tree = tree.union_all(sa.select(Resource.id).where(Resource.parent_id == tree.c.id))
+        query = query.where(F.id.in_(sa.select(tree.c.id)))
+
+    pending: List[Tuple[int, List[str], int]] = []
+    with transaction.manager:
+        rows = DBSession.execute(query).all()
+        for fid, content_hash, display_name, file_backed in rows:
+            kinds, form_total = missing_artifacts(comp, content_hash, display_name, file_backed)
+            if kinds:
+                pending.append((fid, kinds, form_total))
+
+    total, built, failed = len(rows), 0, 0
+    print(f"{total} forms found, {len(pending)} with missing artifacts")
+
+    # Forked workers inherit the loaded environment
+    executor = ProcessPoolExecutor(workers, get_context("fork"), initializer=_worker_init)
+    with executor:
+        futures = {
+            executor.submit(warmup_form, fid, kinds): (fid, form_total)
+            for fid, kinds, form_total in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            fid, form_total = futures[future]
+            prefix = f"[{done}/{len(pending)}] Form {fid}"
+            try:
+                form_built = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"{prefix} failed: {exc}")
+                continue
+            built += form_built
+            print(f"{prefix}: {form_built} of {form_total} artifacts built")
+
+    print(f"{total} forms processed, {built} artifacts built, {failed} failed")
+
+
+ROUNDTRIP_BUDGET = rt.RoundtripBudget()
+
+
+@comp_cli.command()
+def roundtrip(
+    self: EnvCommand,
+    paths: List[Path] = arg(doc="NGFP files or directories, test elements by default"),
+    *,
+    generate: int = opt(0, doc="Number of generated forms"),
+    seed: int = opt(0, doc="Seed of generated forms"),
+    workers: Union[int, None] = opt(None, doc="Number of worker processes"),
+    time: float = opt(ROUNDTRIP_BUDGET.time, doc="Time budget of a form in seconds"),
+    memory: int = opt(ROUNDTRIP_BUDGET.memory, doc="Memory budget of a form in bytes"),
+) -> None:
+    """Check NGFP conversion round-trip over a corpus of forms"""
+
+    forms = [*rt.read(paths or [rt.ELEMENTS]), *rt.generate(generate, seed=seed)]
+    budget = rt.RoundtripBudget(time=time, memory=memory)
+    report = rt.run(forms, budget=budget, workers=workers)
+    print(report.format())
+    if report.failed or report.over_budget:
+        raise SystemExit(1)
+
+
+LOAD_PROFILE = LoadProfile()
+
+
+@comp_cli.command()
+def loadtest(
+    self: EnvCommand,
+    url: str = arg(doc="Base URL of the server"),
+    *,
+    parent: int = opt(doc="Parent vector layer ID"),
+    login: Union[str, None] = opt(None, doc="Login of a user with permissions on the parent"),
+    password: str = opt("", doc="Password of the user"),
+    pid: List[int] = opt([], doc="Worker process ID, may be repeated"),
+    devices: int = opt(LOAD_PROFILE.devices, doc="Number of concurrent devices"),
+    requests: int = opt(LOAD_PROFILE.requests, doc="Total number of requests"),
+    items: int = opt(LOAD_PROFILE.items, doc="Number of items of the test form"),
+    options: int = opt(LOAD_PROFILE.options, doc="Number of options per item"),
+    seed: int = opt(LOAD_PROFILE.seed, doc="Seed of the request plan"),
+    ngfp_ratio: float = opt(LOAD_PROFILE.ratios["ngfp"], doc="Share of NGFP downloads"),
+    convert_ratio: float = opt(LOAD_PROFILE.ratios["convert"], doc="Share of conversions"),
+    save_ratio: float = opt(LOAD_PROFILE.ratios["save"], doc="Share of form saves"),
+) -> None:
+    """Load test formbuilder endpoints of a running server"""
+
+    profile = LoadProfile(
+        devices=devices,
+        requests=requests,
+        ratios=dict(ngfp=ngfp_ratio, convert=convert_ratio, save=save_ratio),
+        items=items,
+        options=options,
+        seed=seed,
+    )
+    client = HTTPClient(url, login=login, password=password)
+    report = run_load(client, parent=parent, profile=profile, pids=pid)
+    print(report.format())
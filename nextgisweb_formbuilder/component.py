@@ -1,4 +1,10 @@
+from functools import cached_property
+from pathlib import Path
+from tempfile import gettempdir
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
 from nextgisweb.env import Component, require
+from nextgisweb.lib.config import Option, SizeInBytes
 
 
 class FormBuilderComponent(Component):
@@ -15,3 +21,89 @@ class FormBuilderComponent(Component):
         super(FormBuilderComponent, self).setup_pyramid(config)
         api.setup_pyramid(self, config)
         view.setup_pyramid(self, config)
+
+    @property
+    def ngfp_encode_options(self):
+        opts = self.options
+        return dict(
+            pretty=opts["ngfp.pretty"],
+            compression=ZIP_DEFLATED if opts["ngfp.compression"] else ZIP_STORED,
+            compresslevel=opts["ngfp.compression_level"],
+        )
+
+    @property
+    def ngfp_limits(self):
+        from .model import NGFPLimits
+
+        opts = self.options
+        return NGFPLimits(
+            max_size=opts["ngfp.max_size"],
+            max_member_size=opts["ngfp.max_member_size"],
+            max_total_size=opts["ngfp.max_total_size"],
+            max_ratio=opts["ngfp.max_ratio"],
+        )
+
+    def client_settings(self, request):
+        from msgspec import to_builtins
+
+        # The client-side NGFP reader applies the same limits as uploads
+        return dict(ngfp_limits=to_builtins(self.ngfp_limits))
+
+    @property
+    def budget(self):
+        from .model import FormbuilderBudget
+
+        opts = self.options
+        return FormbuilderBudget(
+            max_items=opts["budget.max_items"],
+            max_depth=opts["budget.max_depth"],
+            max_options=opts["budget.max_options"],
+            max_size=opts["budget.max_size"],
+            max_string=opts["budget.max_string"],
+        )
+
+    @cached_property
+    def ngfp_job_executor(self):
+        if (workers := self.options["ngfp.job_workers"]) == 0:
+            return None
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=workers)
+
+    @cached_property
+    def artifact_cache(self):
+        from .cache import DiskArtifactCache, FileStorageArtifactCache
+
+        opts = self.options
+        backend, max_size = opts["cache.backend"], opts["cache.max_size"]
+        if backend == "disk":
+            path = opts["cache.path"]
+            path = Path(path) if path else Path(gettempdir()) / "nextgisweb_formbuilder"
+            return DiskArtifactCache(path, max_size=max_size)
+        elif backend == "file_storage":
+            return FileStorageArtifactCache(max_size=max_size)
+        elif backend is None:
+            return None
+        raise ValueError(f"Invalid cache backend: {backend}")
+
+    # fmt: off
+    option_annotations = (
+        Option("revision.snapshot_interval", int, default=20, doc="Store a full form value snapshot every N revisions."),
+        Option("ngfp.max_size", SizeInBytes, default=10 * 2**20, doc="Maximum size of an uploaded NGFP file."),
+        Option("ngfp.max_member_size", SizeInBytes, default=10 * 2**20, doc="Maximum uncompressed size of a single NGFP file entry."),
+        Option("ngfp.max_total_size", SizeInBytes, default=32 * 2**20, doc="Maximum total uncompressed size of NGFP file entries."),
+        Option("ngfp.max_ratio", float, default=100.0, doc="Maximum compression ratio of NGFP file entries larger than 1 MiB."),
+        Option("ngfp.pretty", bool, default=True, doc="Indent JSON entries of generated NGFP files."),
+        Option("ngfp.compression", bool, default=True, doc="Deflate entries of generated NGFP files, store them uncompressed otherwise."),
+        Option("ngfp.compression_level", int, default=None, doc="Deflate compression level (0-9) for generated NGFP files."),
+        Option("ngfp.job_workers", int, default=0, doc="Number of background processes per web worker converting uploaded NGFP files, conversion runs within the request if zero."),
+        Option("budget.max_items", int, default=5000, doc="Maximum number of elements in a form, including elements of tabs."),
+        Option("budget.max_depth", int, default=8, doc="Maximum nesting depth of form elements."),
+        Option("budget.max_options", int, default=50000, doc="Maximum number of options of a single form element, including dependent options."),
+        Option("budget.max_size", SizeInBytes, default=16 * 2**20, doc="Maximum uncompressed size of form entries of an uploaded NGFP file."),
+        Option("budget.max_string", int, default=10000, doc="Maximum length of labels, option values and other form strings, 10000 at most."),
+        Option("cache.backend", str, default=None, doc="Cache for generated NGFP files and other form artifacts shared between worker processes: disk or file_storage. Nothing is cached by default, only concurrent builds within a worker process are coalesced."),
+        Option("cache.path", str, default=None, doc="Directory of the disk cache, node-wide temporary directory by default."),
+        Option("cache.max_size", SizeInBytes, default=256 * 2**20, doc="Maximum total size of cached artifacts."),
+    )
+    # fmt: on
@@ -1,3 +1,4 @@
+import math
 import re
 from datetime import datetime
 from typing import (
@@ -7,8 +8,10 @@ from typing import (
     Callable,
     ClassVar,
     Dict,
+    Iterator,
     List,
     Literal,
+    Mapping,
     Tuple,
     Type,
     Union,
@@ -25,11 +28,60 @@ from nextgisweb.core.exception import ValidationError
 from nextgisweb.feature_layer import FIELD_TYPE, FeatureLayerFieldDatatype
 from nextgisweb.jsrealm import TSExport
 
+from .legacy import (
+    LegacyCascadeOption,
+    LegacyElement,
+    LegacyNoAttrs,
+    LegacyOption,
+    LegacyOptionDual,
+    LegacyPage,
+    LegacyTabs,
+    legacy_element_cls,
+)
+
 DatatypeTuple = Tuple[FeatureLayerFieldDatatype, ...]
 BindFieldCallback = Callable[[str, DatatypeTuple], None]
 
 
 FieldKeyname = str
+FieldDatatypes = Mapping[FieldKeyname, FeatureLayerFieldDatatype]
+
+RecordValue = Mapping[FieldKeyname, Any]
+RecordErrorCode = Literal["number", "datetime", "option", "cascade"]
+RecordCheck = Callable[[RecordValue], Union[Tuple[FieldKeyname, RecordErrorCode], None]]
+
+# Ceilings enforced by the decoder, so an oversized form fails before the
+# rest of it is built. Budget settings can lower them but not raise.
+TEXT_MAX_LENGTH = 10000
+ITEMS_MAX_LENGTH = 5000
+OPTIONS_MAX_LENGTH = 50000
+
+Text = Annotated[str, Meta(max_length=TEXT_MAX_LENGTH)]
+
+RecordDynamic = Literal["date", "time", "datetime", "ngw_username", "ngid_username"]
+
+
+class RecordDynamicValue(Struct, frozen=True):
+    kind: RecordDynamic
+
+
+RecordDefault = Tuple[FieldKeyname, Any]
+
+NUMBER_DATATYPES = (FIELD_TYPE.INTEGER, FIELD_TYPE.BIGINT, FIELD_TYPE.REAL)
+
+
+class FormbuilderOutlineTab(Struct, kw_only=True):
+    title: str
+    active: bool
+    items: List["FormbuilderOutlineItem"]
+
+
+class FormbuilderOutlineItem(Struct, kw_only=True):
+    type: str
+    label: Union[str, UnsetType] = UNSET
+    fields: List[FieldKeyname]
+    options: Union[int, UnsetType] = UNSET
+    tabs: Union[List[FormbuilderOutlineTab], UnsetType] = UNSET
 
 
 class FieldSpec(Struct, kw_only=True, frozen=True):
@@ -46,13 +98,17 @@ Remember = Annotated[bool, LegacySpec(attr="last")]
 
 class FormbuilderItem(Struct, kw_only=True):
     registry: ClassVar[list[Type["FormbuilderItem"]]] = list()
+    legacy_registry: ClassVar[Dict[str, Type["FormbuilderItem"]]] = dict()
     field_specs: ClassVar[Tuple[Tuple[str, FieldSpec], ...]]
     legacy_specs: ClassVar[Tuple[Tuple[str, LegacySpec], ...]]
     legacy_type: ClassVar[str]
+    legacy_cls: ClassVar[Type[LegacyElement]]
 
     def __init_subclass__(cls, **kw):
         super().__init_subclass__(**kw)
         cls.registry.append(cls)
+        cls.legacy_registry.setdefault(cls.legacy_type, cls)
+        cls.legacy_cls = legacy_element_cls[cls.legacy_type]
         field_specs = set()
         legacy_specs = set()
         for attr, tdef in cls.__annotations__.items():
@@ -68,10 +124,10 @@ class FormbuilderItem(Struct, kw_only=True):
         cls.legacy_specs = tuple(legacy_specs)
 
     @classmethod
-    def attrs_from_legacy(cls, li) -> Dict[str, Any]:
+    def attrs_from_legacy(cls, li: LegacyElement) -> Dict[str, Any]:
         attrs = dict()
         for attr, spec, collection_cls in cls.legacy_specs:
-            obj = li["attributes"][spec.attr]
+            obj = getattr(li.attributes, spec.attr)
             if collection_cls is not None:
                 if obj is not None:
                     value = [collection_cls.from_legacy(i) for i in obj]
@@ -83,22 +139,18 @@ class FormbuilderItem(Struct, kw_only=True):
         return attrs
 
     @classmethod
-    def from_legacy(cls, li):
-        match li["type"]:
+    def from_legacy(cls, li: LegacyElement):
+        match ltype := li.legacy_type:
             case "counter" | "signature":
                 return FormbuilderLabelItem(label="UNSUPPORTED")
             case "text_edit":
-                if li["attributes"]["ngid_login"] or li["attributes"]["ngw_login"]:
+                if li.attributes.ngid_login or li.attributes.ngw_login:
                     item_cls = FormbuilderSystemItem
                 else:
                     item_cls = FormbuilderTextboxItem
             case _:
-                for c in cls.registry:
-                    if c.legacy_type == li["type"]:
-                        item_cls = c
-                        break
-                else:
-                    raise ValueError(f"Unknown item type {li['type']}.")
+                if (item_cls := cls.legacy_registry.get(ltype)) is None:
+                    raise ValueError(f"Unknown item type {ltype}.")
 
         attrs = item_cls.attrs_from_legacy(li)
         return item_cls(**attrs)
@@ -108,9 +160,8 @@ class FormbuilderItem(Struct, kw_only=True):
             keyname = getattr(self, attr)
             bind_field(keyname, spec.datatypes)
 
-    def to_legacy(self) -> Dict[str, Any]:
-        data: Dict[str, Any] = dict(type=self.legacy_type)
-        attributes = data["attributes"] = dict()
+    def attrs_to_legacy(self, *, datatypes: FieldDatatypes) -> Dict[str, Any]:
+        attrs: Dict[str, Any] = dict()
         for attr, spec, collection_cls in self.legacy_specs:
             value = getattr(self, attr)
             if value is UNSET:
@@ -121,27 +172,47 @@ class FormbuilderItem(Struct, kw_only=True):
                 legacy_value = [i.to_legacy() for i in value]
             else:
                 legacy_value = value
-            attributes[spec.attr] = legacy_value
-        return data
+            attrs[spec.attr] = legacy_value
+        return attrs
+
+    def outline(self) -> FormbuilderOutlineItem:
+        options = getattr(self, "options", None)
+        return FormbuilderOutlineItem(
+            type=self.__struct_config__.tag,
+            label=getattr(self, "label", UNSET),
+            fields=[getattr(self, attr) for attr, _ in self.field_specs],
+            options=len(options) if options is not None else UNSET,
+        )
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        yield from ()
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        yield from ()
+
+    def to_legacy(self, *, datatypes: FieldDatatypes) -> LegacyElement:
+        legacy_cls = self.legacy_cls
+        attrs = self.attrs_to_legacy(datatypes=datatypes)
+        return legacy_cls(attributes=legacy_cls.attributes_cls(**attrs))
 
 
 class FormbuilderLabelItem(FormbuilderItem, tag="label"):
     legacy_type = "text_label"
 
-    label: Annotated[str, LegacySpec(attr="text")]
+    label: Annotated[Text, LegacySpec(attr="text")]
 
 
 class FormbuilderTab(Struct):
-    title: str
+    title: Text
     active: bool
-    items: List["FormbuilderFormItemUnion"]
+    items: Annotated[List["FormbuilderFormItemUnion"], Meta(max_length=ITEMS_MAX_LENGTH)]
 
     @classmethod
-    def from_legacy(cls, li):
-        items = [FormbuilderItem.from_legacy(i) for i in li["elements"]]
+    def from_legacy(cls, li: LegacyPage):
+        items = [FormbuilderItem.from_legacy(i) for i in li.elements]
         return cls(
-            title=li["caption"],
-            active=li.get("default", False),
+            title=li.caption,
+            active=li.default is True,
             items=items,
         )
 
@@ -149,23 +220,31 @@ class FormbuilderTab(Struct):
         for item in self.items:
             item.validate(bind_field=bind_field)
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result: Dict[str, Any] = dict(caption=self.title)
-        if self.active:
-            result["default"] = True
-        result["elements"] = [i.to_legacy() for i in self.items]
-        return result
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        for item in self.items:
+            yield from item.record_checks(datatypes=datatypes)
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        for item in self.items:
+            yield from item.record_defaults(datatypes=datatypes)
+
+    def to_legacy(self, *, datatypes: FieldDatatypes) -> LegacyPage:
+        return LegacyPage(
+            caption=self.title,
+            default=True if self.active else UNSET,
+            elements=[i.to_legacy(datatypes=datatypes) for i in self.items],
+        )
 
 
 class FormbuilderTabsItem(FormbuilderItem, tag="tabs"):
     legacy_type = "tabs"
 
-    tabs: List[FormbuilderTab]
+    tabs: Annotated[List[FormbuilderTab], Meta(max_length=ITEMS_MAX_LENGTH)]
 
     @classmethod
     def attrs_from_legacy(cls, li):
         attrs = super().attrs_from_legacy(li)
-        attrs["tabs"] = [FormbuilderTab.from_legacy(i) for i in li["pages"]]
+        attrs["tabs"] = [FormbuilderTab.from_legacy(i) for i in li.pages]
         return attrs
 
     def validate(self, *, bind_field: BindFieldCallback) -> None:
@@ -173,11 +252,32 @@ class FormbuilderTabsItem(FormbuilderItem, tag="tabs"):
         for tab in self.tabs:
             tab.validate(bind_field=bind_field)
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
-        result["pages"] = [i.to_legacy() for i in self.tabs]
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        for tab in self.tabs:
+            yield from tab.record_checks(datatypes=datatypes)
+
+    def outline(self) -> FormbuilderOutlineItem:
+        result = super().outline()
+        result.tabs = [
+            FormbuilderOutlineTab(
+                title=tab.title,
+                active=tab.active,
+                items=[i.outline() for i in tab.items],
+            )
+            for tab in self.tabs
+        ]
         return result
 
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        for tab in self.tabs:
+            yield from tab.record_defaults(datatypes=datatypes)
+
+    def to_legacy(self, *, datatypes: FieldDatatypes) -> LegacyTabs:
+        return LegacyTabs(
+            attributes=LegacyNoAttrs(),
+            pages=[i.to_legacy(datatypes=datatypes) for i in self.tabs],
+        )
+
 
 class FormbuilderSpacerItem(FormbuilderItem, tag="spacer"):
     legacy_type = "space"
@@ -199,13 +299,46 @@ class FormbuilderTextboxItem(FormbuilderItem, tag="textbox", kw_only=True):
         LegacySpec(attr="field"),
     ]
     remember: Remember
-    initial: Annotated[Union[str, UnsetType], LegacySpec(attr="text", default="")] = UNSET
+    initial: Annotated[Union[Text, UnsetType], LegacySpec(attr="text", default="")] = UNSET
     max_lines: Annotated[int, Meta(ge=1, lt=256), LegacySpec(attr="max_string_count")]
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
-        result["attributes"].update({"ngid_login": False, "ngw_login": False})
-        return result
+    def attrs_to_legacy(self, *, datatypes: FieldDatatypes) -> Dict[str, Any]:
+        attrs = super().attrs_to_legacy(datatypes=datatypes)
+        datatype = datatypes[self.field]
+        is_number = datatype in NUMBER_DATATYPES
+        attrs["only_figures"] = is_number
+        if is_number and (text := attrs["text"]) != "":
+            if not _check_number(text, datatype == FIELD_TYPE.REAL):
+                attrs["text"] = ""
+        return attrs
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        if (datatype := datatypes[self.field]) not in NUMBER_DATATYPES:
+            return
+
+        keyname = self.field
+        is_real = datatype == FIELD_TYPE.REAL
+        number_types = (int, float) if is_real else (int,)
+
+        def check(record: RecordValue):
+            value = record.get(keyname)
+            if value is None or (type(value) in number_types):
+                return None
+            elif isinstance(value, str) and _check_number(value, is_real):
+                return None
+            return keyname, "number"
+
+        yield check
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        if (text := self.initial) is UNSET or text == "":
+            return
+
+        datatype = datatypes[self.field]
+        if datatype not in NUMBER_DATATYPES:
+            yield self.field, text
+        elif _check_number(text, is_real := datatype == FIELD_TYPE.REAL):
+            yield self.field, float(text) if is_real else int(text)
 
 
 class FormbuilderCheckboxItem(FormbuilderItem, tag="checkbox", kw_only=True):
@@ -228,7 +361,17 @@ class FormbuilderCheckboxItem(FormbuilderItem, tag="checkbox", kw_only=True):
         Union[bool, UnsetType],
         LegacySpec(attr="init_value", default=False),
     ] = UNSET
-    label: Annotated[str, LegacySpec(attr="text")]
+    label: Annotated[Text, LegacySpec(attr="text")]
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        value = int(self.initial is True)
+        match datatypes[self.field]:
+            case FIELD_TYPE.REAL:
+                yield self.field, float(value)
+            case FIELD_TYPE.STRING:
+                yield self.field, str(value)
+            case _:
+                yield self.field, value
 
 
 class FormbuilderSystemItem(FormbuilderItem, tag="system", kw_only=True):
@@ -241,21 +384,24 @@ class FormbuilderSystemItem(FormbuilderItem, tag="system", kw_only=True):
     ]
     system: Literal["ngid_username", "ngw_username"]
 
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        yield self.field, RecordDynamicValue(kind=self.system)
+
     @classmethod
     def attrs_from_legacy(cls, la) -> Dict[str, Any]:
         attrs = super().attrs_from_legacy(la)
-        if la["attributes"]["ngid_login"]:
+        if la.attributes.ngid_login:
             system = "ngid_username"
-        elif la["attributes"]["ngw_login"]:
+        elif la.attributes.ngw_login:
             system = "ngw_username"
         else:
             raise NotImplementedError
         attrs["system"] = system
         return attrs
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
-        result["attributes"].update(
+    def attrs_to_legacy(self, *, datatypes: FieldDatatypes) -> Dict[str, Any]:
+        attrs = super().attrs_to_legacy(datatypes=datatypes)
+        attrs.update(
             {
                 "last": False,
                 "text": "",
@@ -269,7 +415,7 @@ class FormbuilderSystemItem(FormbuilderItem, tag="system", kw_only=True):
                 )
             },
         )
-        return result
+        return attrs
 
 
 class FormbuilderDatetimeItem(FormbuilderItem, tag="datetime", kw_only=True):
@@ -310,7 +456,7 @@ class FormbuilderDatetimeItem(FormbuilderItem, tag="datetime", kw_only=True):
     def attrs_from_legacy(cls, li):
         attrs = super().attrs_from_legacy(li)
 
-        ldtype = li["attributes"]["date_type"]
+        ldtype = li.attributes.date_type
         for dt, date_type in cls.legacy_datetime_map.items():
             if ldtype == date_type:
                 attrs["datetime"] = dt
@@ -318,7 +464,7 @@ class FormbuilderDatetimeItem(FormbuilderItem, tag="datetime", kw_only=True):
         else:
             raise ValueError(f"Unknown date_type {ldtype}.")
 
-        if (ldt := li["attributes"]["datetime"]) is None:
+        if (ldt := li.attributes.datetime) is None:
             initial = "CURRENT"
         elif ldtype == 2:
             initial = datetime.strptime(ldt, cls.legacy_datetime_format).isoformat()
@@ -340,8 +486,8 @@ class FormbuilderDatetimeItem(FormbuilderItem, tag="datetime", kw_only=True):
                     ).format(i=self.initial, t=self.datetime)
                 )
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
+    def attrs_to_legacy(self, *, datatypes: FieldDatatypes) -> Dict[str, Any]:
+        attrs = super().attrs_to_legacy(datatypes=datatypes)
 
         date_type = self.legacy_datetime_map[self.datetime]
 
@@ -352,31 +498,47 @@ class FormbuilderDatetimeItem(FormbuilderItem, tag="datetime", kw_only=True):
         else:
             dt = self.initial
 
-        result["attributes"].update({"date_type": date_type, "datetime": dt})
-        return result
+        attrs.update({"date_type": date_type, "datetime": dt})
+        return attrs
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        keyname = self.field
+        match = re.compile(cast(str, getattr(self, f"pat_{self.datetime}"))).fullmatch
+
+        def check(record: RecordValue):
+            value = record.get(keyname)
+            if value is None or (isinstance(value, str) and match(value)):
+                return None
+            return keyname, "datetime"
+
+        yield check
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        if self.initial == "CURRENT":
+            yield self.field, RecordDynamicValue(kind=self.datetime)
+        elif self.initial is not UNSET:
+            yield self.field, self.initial
+
 
+# Options hold no references back to other objects, so they're excluded from
+# garbage collector tracking. Forms may have hundreds of thousands of them.
 
-class OptionSingle(Struct, kw_only=True):
-    value: str
-    label: str
+
+class OptionSingle(Struct, kw_only=True, gc=False):
+    value: Text
+    label: Text
     initial: Union[bool, UnsetType] = UNSET
 
     @classmethod
-    def from_legacy(cls, li):
+    def from_legacy(cls, li: LegacyOption):
         return cls(
-            value=li["name"],
-            label=li["alias"],
-            initial=li.get("default", UNSET),
+            value=li.name,
+            label=li.alias,
+            initial=li.default,
         )
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result: Dict[str, Any] = dict(
-            name=self.value,
-            alias=self.label,
-        )
-        if self.initial is not UNSET:
-            result["default"] = self.initial
-        return result
+    def to_legacy(self) -> LegacyOption:
+        return LegacyOption(name=self.value, alias=self.label, default=self.initial)
 
 
 class FormbuilderRadioItem(FormbuilderItem, tag="radio", kw_only=True):
@@ -388,7 +550,17 @@ class FormbuilderRadioItem(FormbuilderItem, tag="radio", kw_only=True):
         LegacySpec(attr="field"),
     ]
     remember: Remember
-    options: Annotated[List[OptionSingle], LegacySpec(attr="values")]
+    options: Annotated[
+        List[OptionSingle],
+        Meta(max_length=OPTIONS_MAX_LENGTH),
+        LegacySpec(attr="values"),
+    ]
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        yield _option_check(self.field, self.options)
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        yield from _option_default(self.field, self.options)
 
 
 class FormbuilderDropdownItem(FormbuilderItem, tag="dropdown", kw_only=True):
@@ -400,35 +572,44 @@ class FormbuilderDropdownItem(FormbuilderItem, tag="dropdown", kw_only=True):
         LegacySpec(attr="field"),
     ]
     remember: Remember
-    options: Annotated[List[OptionSingle], LegacySpec(attr="values")]
+    options: Annotated[
+        List[OptionSingle],
+        Meta(max_length=OPTIONS_MAX_LENGTH),
+        LegacySpec(attr="values"),
+    ]
     search: Annotated[bool, LegacySpec(attr="input_search")]
     free_input: Annotated[bool, LegacySpec(attr="allow_adding_values")]
 
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        if not self.free_input:
+            yield _option_check(self.field, self.options)
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        yield from _option_default(self.field, self.options)
+
 
-class OptionDual(Struct, kw_only=True):
-    value: str
-    first: str
-    second: str
+class OptionDual(Struct, kw_only=True, gc=False):
+    value: Text
+    first: Text
+    second: Text
     initial: Union[bool, UnsetType] = UNSET
 
     @classmethod
-    def from_legacy(cls, li):
+    def from_legacy(cls, li: LegacyOptionDual):
         return cls(
-            value=li["name"],
-            first=li["alias"],
-            second=li["alias2"],
-            initial=li.get("default", UNSET),
+            value=li.name,
+            first=li.alias,
+            second=li.alias2,
+            initial=li.default,
         )
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result: Dict[str, Any] = dict(
+    def to_legacy(self) -> LegacyOptionDual:
+        return LegacyOptionDual(
             name=self.value,
             alias=self.first,
             alias2=self.second,
+            default=self.initial,
         )
-        if self.initial is not UNSET:
-            result["default"] = self.initial
-        return result
 
 
 class FormbuilderDropdownDualItem(FormbuilderItem, tag="dropdown_dual", kw_only=True):
@@ -440,28 +621,79 @@ class FormbuilderDropdownDualItem(FormbuilderItem, tag="dropdown_dual", kw_only=
         LegacySpec(attr="field"),
     ]
     remember: Remember
-    options: Annotated[List[OptionDual], LegacySpec(attr="values")]
-    label_first: Annotated[str, LegacySpec(attr="label1")]
-    label_second: Annotated[str, LegacySpec(attr="label2")]
+    options: Annotated[
+        List[OptionDual],
+        Meta(max_length=OPTIONS_MAX_LENGTH),
+        LegacySpec(attr="values"),
+    ]
+    label_first: Annotated[Text, LegacySpec(attr="label1")]
+    label_second: Annotated[Text, LegacySpec(attr="label2")]
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        yield _option_check(self.field, self.options)
 
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        yield from _option_default(self.field, self.options)
 
+
+# Inherits gc=False. Item lists are tracked themselves, but they hold only
+# options, which in turn hold only strings and booleans. Nothing refers back
+# to a cascade option from below, so no reference cycle can form through it.
 class CascadeOption(OptionSingle, kw_only=True):
-    items: Annotated[List[OptionSingle], LegacySpec(attr="values")]
+    items: Annotated[
+        List[OptionSingle],
+        Meta(max_length=OPTIONS_MAX_LENGTH),
+        LegacySpec(attr="values"),
+    ]
 
     @classmethod
-    def from_legacy(cls, li):
-        items = [OptionSingle.from_legacy(i) for i in li["values"]]
+    def from_legacy(cls, li: LegacyCascadeOption):
+        items = [OptionSingle.from_legacy(i) for i in li.values or ()]
         return cls(
-            value=li["name"],
-            label=li["alias"],
-            initial=li.get("default", UNSET),
+            value=li.name,
+            label=li.alias,
+            initial=li.default,
             items=items,
         )
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
-        result["values"] = [o.to_legacy() for o in self.items]
-        return result
+    def to_legacy(self) -> LegacyCascadeOption:
+        return LegacyCascadeOption(
+            name=self.value,
+            alias=self.label,
+            default=self.initial,
+            values=[o.to_legacy() for o in self.items],
+        )
+
+
+# Lists with fewer options aren't worth a pass over them after decoding
+OPTION_SHARE_MIN = 1000
+
+
+def share_option_labels(options: Union[List[OptionSingle], List[OptionDual]]) -> None:
+    """Make labels equal to values share one string object
+
+    Generated options, populated from distinct layer values for example,
+    usually have such labels. Large option lists take noticeably less memory
+    then, and small ones are left as decoded."""
+
+    total = len(options)
+    for option in options:
+        if isinstance(option, CascadeOption):
+            total += len(option.items)
+    if total < OPTION_SHARE_MIN:
+        return
+
+    for option in options:
+        if isinstance(option, OptionDual):
+            if option.first == option.value:
+                option.first = option.value
+            continue
+        if option.label == option.value:
+            option.label = option.value
+        if isinstance(option, CascadeOption):
+            for sub in option.items:
+                if sub.label == sub.value:
+                    sub.label = sub.value
 
 
 class FormbuilderCascadeItem(FormbuilderItem, tag="cascade", kw_only=True):
@@ -478,7 +710,35 @@ class FormbuilderCascadeItem(FormbuilderItem, tag="cascade", kw_only=True):
         LegacySpec(attr="field_level2"),
     ]
     remember: Remember
-    options: Annotated[List[CascadeOption], LegacySpec(attr="values")]
+    options: Annotated[
+        List[CascadeOption],
+        Meta(max_length=OPTIONS_MAX_LENGTH),
+        LegacySpec(attr="values"),
+    ]
+
+    def record_checks(self, *, datatypes: FieldDatatypes) -> Iterator[RecordCheck]:
+        primary, secondary = self.field_primary, self.field_secondary
+        pairs = {o.value: frozenset(i.value for i in o.items) for o in self.options}
+
+        def check(record: RecordValue):
+            if (value := record.get(primary)) is None:
+                return None
+            elif not isinstance(value, str) or (values := pairs.get(value)) is None:
+                return primary, "option"
+            elif (value := record.get(secondary)) is None:
+                return None
+            elif not isinstance(value, str) or value not in values:
+                return secondary, "cascade"
+            return None
+
+        yield check
+
+    def record_defaults(self, *, datatypes: FieldDatatypes) -> Iterator[RecordDefault]:
+        for option in self.options:
+            if option.initial is True:
+                yield self.field_primary, option.value
+                yield from _option_default(self.field_secondary, option.items)
+                break
 
 
 class FormbuilderCoordinatesItem(FormbuilderItem, tag="coordinates", kw_only=True):
@@ -496,10 +756,10 @@ class FormbuilderCoordinatesItem(FormbuilderItem, tag="coordinates", kw_only=Tru
     ]
     hidden: Annotated[bool, LegacySpec(attr="hidden")]
 
-    def to_legacy(self) -> Dict[str, Any]:
-        result = super().to_legacy()
-        result["attributes"].update({"crs": 0, "format": 0})
-        return result
+    def attrs_to_legacy(self, *, datatypes: FieldDatatypes) -> Dict[str, Any]:
+        attrs = super().attrs_to_legacy(datatypes=datatypes)
+        attrs.update({"crs": 0, "format": 0})
+        return attrs
 
 
 class FormbuilderDistanceItem(FormbuilderItem, tag="distance", kw_only=True):
@@ -541,7 +801,47 @@ class FormbuilderPhotoItem(FormbuilderItem, tag="photo", kw_only=True):
     legacy_type = "photo"
 
     max_count: Annotated[int, Meta(ge=1, le=50), LegacySpec(attr="gallery_size")]
-    comment: Annotated[str, LegacySpec(attr="comment")]
+    comment: Annotated[Text, LegacySpec(attr="comment")]
+
+
+def _check_number(text: str, is_real: bool) -> bool:
+    if is_real:
+        try:
+            v = float(text)
+        except ValueError:
+            return False
+        return math.isfinite(v)
+
+    try:
+        int(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _option_check(
+    keyname: FieldKeyname,
+    options: List[OptionSingle] | List[OptionDual],
+) -> RecordCheck:
+    values = frozenset(o.value for o in options)
+
+    def check(record: RecordValue):
+        value = record.get(keyname)
+        if value is None or (isinstance(value, str) and value in values):
+            return None
+        return keyname, "option"
+
+    return check
+
+
+def _option_default(
+    keyname: FieldKeyname,
+    options: List[OptionSingle] | List[OptionDual],
+) -> Iterator[RecordDefault]:
+    for option in options:
+        if option.initial is True:
+            yield keyname, option.value
+            break
 
 
 if TYPE_CHECKING:
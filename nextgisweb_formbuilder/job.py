@@ -0,0 +1,139 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Tuple, Union
+from uuid import UUID, uuid4
+
+import transaction
+
+from nextgisweb.env import DBSession, env
+
+from nextgisweb.core.exception import ValidationError
+
+from .model import (
+    FormbuilderBudget,
+    FormbuilderFormValue,
+    FormbuilderNGFPJob,
+    NGFPLimits,
+    validate_ngfp_file,
+    value_decoder,
+    value_encoder,
+)
+
+# Finished jobs are kept for polling clients this long
+JOB_RETENTION = timedelta(days=1)
+
+
+def convert_ngfp(
+    path: str,
+    limits: NGFPLimits,
+    budget: FormbuilderBudget,
+) -> Tuple[Union[bytes, None], Union[str, None]]:
+    """Validate and convert an NGFP file, possibly in a worker process
+
+    Exceptions are not passed through the process boundary, validation
+    errors are returned as messages instead."""
+
+    try:
+        meta, form = validate_ngfp_file(Path(path), limits=limits, budget=budget)
+        value = FormbuilderFormValue.from_legacy_decoded(meta, form)
+    except ValidationError as exc:
+        return None, str(exc.message)
+    except ValueError as exc:
+        return None, str(exc)
+    return value_encoder.encode(value), None
+
+
+def convert_upload(
+    path: str,
+    limits: NGFPLimits,
+    budget: FormbuilderBudget,
+) -> Union[FormbuilderFormValue, None]:
+    meta, form = validate_ngfp_file(Path(path), limits=limits, budget=budget)
+    try:
+        return FormbuilderFormValue.from_legacy_decoded(meta, form)
+    except ValueError:
+        # Files with elements unknown to the server are kept as is
+        return None
+
+
+def _convert_upload_encoded(
+    path: str,
+    limits: NGFPLimits,
+    budget: FormbuilderBudget,
+) -> Tuple[Union[bytes, None], Union[str, None]]:
+    try:
+        value = convert_upload(path, limits, budget)
+    except ValidationError as exc:
+        return None, str(exc.message)
+    return (value_encoder.encode(value) if value is not None else None), None
+
+
+def convert_ngfp_upload(path: Path) -> Union[FormbuilderFormValue, None]:
+    """Validate and convert an NGFP file uploaded with the resource
+
+    With background workers configured, one of them does the work, so the
+    web worker process stays responsive. The request still waits for it, as
+    invalid files are rejected before the resource is saved."""
+
+    comp = env.formbuilder
+    args = (str(path), comp.ngfp_limits, comp.budget)
+    if (executor := comp.ngfp_job_executor) is None:
+        return convert_upload(*args)
+
+    data, error = executor.submit(_convert_upload_encoded, *args).result()
+    if error is not None:
+        raise ValidationError(message=error)
+    return value_decoder.decode(data) if data is not None else None
+
+
+def submit_ngfp_job(path: Path, *, user_id: int) -> FormbuilderNGFPJob:
+    comp = env.formbuilder
+    job = FormbuilderNGFPJob(
+        id=uuid4(),
+        user_id=user_id,
+        status="pending",
+        tstamp=datetime.now(timezone.utc).replace(tzinfo=None),
+    ).persist()
+
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - JOB_RETENTION
+    DBSession.query(FormbuilderNGFPJob).filter(FormbuilderNGFPJob.tstamp < cutoff).delete(
+        synchronize_session=False
+    )
+
+    if (executor := comp.ngfp_job_executor) is None:
+        _finish(job, *convert_ngfp(str(path), comp.ngfp_limits, comp.budget))
+        return job
+
+    # The job row has to be committed before a worker can update it
+    def submit(success: bool):
+        if success:
+            future = executor.submit(convert_ngfp, str(path), comp.ngfp_limits, comp.budget)
+            future.add_done_callback(lambda f: _complete(job_id, f))
+
+    job_id = job.id
+    transaction.get().addAfterCommitHook(submit)
+    return job
+
+
+def _complete(job_id: UUID, future: Future):
+    try:
+        data, error = future.result()
+    except Exception as exc:
+        data, error = None, str(exc)
+
+    with transaction.manager:
+        job = FormbuilderNGFPJob.filter_by(id=job_id).one_or_none()
+        if job is not None:
+            _finish(job, data, error)
+
+
+def _finish(job: FormbuilderNGFPJob, data: Union[bytes, None], error: Union[str, None]):
+    if data is not None:
+        job.value = value_decoder.decode(data)
+        job.status = "done"
+    else:
+        job.error = error
+        job.status = "failed"
+    job.tstamp = datetime.now(timezone.utc).replace(tzinfo=None)
+    DBSession.flush()
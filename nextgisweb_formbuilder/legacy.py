@@ -0,0 +1,304 @@
+from typing import IO, Any, Callable, ClassVar, Dict, Iterable, List, Tuple, Type, Union, get_args
+from zipfile import ZipFile
+
+from msgspec import UNSET, Struct, UnsetType, field
+from msgspec.json import Decoder, Encoder
+from msgspec.json import format as msgspec_json_format
+
+from nextgisweb.feature_layer import FeatureLayerFieldDatatype, FeatureLayerGeometryType
+
+
+class LegacyField(Struct, kw_only=True):
+    keyname: str
+    display_name: str
+    datatype: FeatureLayerFieldDatatype
+
+
+class LegacySrs(Struct, kw_only=True):
+    id: Union[int, str]
+
+
+class LegacyMeta(Struct, kw_only=True):
+    version: str = "2.2"
+    name: str = ""
+    geometry_type: FeatureLayerGeometryType
+    fields: List[LegacyField]
+    translations: List[Any] = []
+    srs: LegacySrs = field(default_factory=lambda: LegacySrs(id=4326))
+    ngw_connection: Any = None
+    lists: Any = None
+    key_list: Any = None
+
+
+class LegacyOption(Struct, kw_only=True, gc=False):
+    name: str
+    alias: str
+    default: Union[bool, UnsetType] = UNSET
+
+
+class LegacyOptionDual(LegacyOption, kw_only=True):
+    alias2: str
+
+
+class LegacyCascadeOption(LegacyOption, kw_only=True):
+    values: Union[List[LegacyOption], None]
+
+
+class LegacyNoAttrs(Struct):
+    pass
+
+
+class LegacyTextLabelAttrs(Struct, kw_only=True):
+    text: str
+
+
+class LegacyTextEditAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    text: Union[str, None]
+    max_string_count: int
+    ngid_login: bool = False
+    ngw_login: bool = False
+    only_figures: bool = False
+
+
+class LegacyCheckboxAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    init_value: bool
+    text: str
+
+
+class LegacyDateTimeAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    date_type: int
+    datetime: Union[str, None]
+
+
+class LegacyRadioGroupAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    values: Union[List[LegacyOption], None]
+
+
+class LegacyComboboxAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    values: Union[List[LegacyOption], None]
+    input_search: bool
+    allow_adding_values: bool
+
+
+class LegacySplitComboboxAttrs(Struct, kw_only=True):
+    field: str
+    last: bool
+    values: Union[List[LegacyOptionDual], None]
+    label1: str
+    label2: str
+
+
+class LegacyDoubleComboboxAttrs(Struct, kw_only=True):
+    field_level1: str
+    field_level2: str
+    last: bool
+    values: Union[List[LegacyCascadeOption], None]
+
+
+class LegacyCoordinatesAttrs(Struct, kw_only=True):
+    field_long: str
+    field_lat: str
+    hidden: bool
+    crs: int = 0
+    format: int = 0
+
+
+class LegacyDistanceAttrs(Struct, kw_only=True):
+    field: str
+
+
+class LegacyAverageCounterAttrs(Struct, kw_only=True):
+    field: str
+    num_values: int
+
+
+class LegacyPhotoAttrs(Struct, kw_only=True):
+    gallery_size: int
+    comment: str
+
+
+class LegacyFeature(Struct, kw_only=True, tag="Feature", tag_field="type"):
+    id: int
+    geometry: Any
+    properties: Dict[str, Any]
+
+
+class LegacyElement(Struct, kw_only=True, tag_field="type"):
+    attributes_cls: ClassVar[Type[Struct]] = LegacyNoAttrs
+
+    @property
+    def legacy_type(self) -> str:
+        return self.__struct_config__.tag
+
+
+class LegacyTextLabel(LegacyElement, tag="text_label"):
+    attributes_cls = LegacyTextLabelAttrs
+
+    attributes: LegacyTextLabelAttrs
+
+
+class LegacyTextEdit(LegacyElement, tag="text_edit"):
+    attributes_cls = LegacyTextEditAttrs
+
+    attributes: LegacyTextEditAttrs
+
+
+class LegacyCheckbox(LegacyElement, tag="checkbox"):
+    attributes_cls = LegacyCheckboxAttrs
+
+    attributes: LegacyCheckboxAttrs
+
+
+class LegacyDateTime(LegacyElement, tag="date_time"):
+    attributes_cls = LegacyDateTimeAttrs
+
+    attributes: LegacyDateTimeAttrs
+
+
+class LegacyRadioGroup(LegacyElement, tag="radio_group"):
+    attributes_cls = LegacyRadioGroupAttrs
+
+    attributes: LegacyRadioGroupAttrs
+
+
+class LegacyCombobox(LegacyElement, tag="combobox"):
+    attributes_cls = LegacyComboboxAttrs
+
+    attributes: LegacyComboboxAttrs
+
+
+class LegacySplitCombobox(LegacyElement, tag="split_combobox"):
+    attributes_cls = LegacySplitComboboxAttrs
+
+    attributes: LegacySplitComboboxAttrs
+
+
+class LegacyDoubleCombobox(LegacyElement, tag="double_combobox"):
+    attributes_cls = LegacyDoubleComboboxAttrs
+
+    attributes: LegacyDoubleComboboxAttrs
+
+
+class LegacyCoordinates(LegacyElement, tag="coordinates"):
+    attributes_cls = LegacyCoordinatesAttrs
+
+    attributes: LegacyCoordinatesAttrs
+
+
+class LegacyDistance(LegacyElement, tag="distance"):
+    attributes_cls = LegacyDistanceAttrs
+
+    attributes: LegacyDistanceAttrs
+
+
+class LegacyAverageCounter(LegacyElement, tag="average_counter"):
+    attributes_cls = LegacyAverageCounterAttrs
+
+    attributes: LegacyAverageCounterAttrs
+
+
+class LegacyPhoto(LegacyElement, tag="photo"):
+    attributes_cls = LegacyPhotoAttrs
+
+    attributes: LegacyPhotoAttrs
+
+
+class LegacySpace(LegacyElement, tag="space"):
+    attributes: Union[LegacyNoAttrs, None] = None
+
+
+class LegacyCounter(LegacyElement, tag="counter"):
+    attributes: Union[Dict[str, Any], None] = None
+
+
+class LegacySignature(LegacyElement, tag="signature"):
+    attributes: Union[Dict[str, Any], None] = None
+
+
+class LegacyPage(Struct, kw_only=True):
+    caption: str
+    default: Union[bool, UnsetType] = UNSET
+    elements: List["LegacyElementUnion"]
+
+
+class LegacyTabs(LegacyElement, tag="tabs", kw_only=True):
+    attributes: Union[LegacyNoAttrs, None] = None
+    pages: List[LegacyPage]
+
+
+LegacyElementUnion = Union[
+    LegacyTextLabel,
+    LegacyTextEdit,
+    LegacyCheckbox,
+    LegacyDateTime,
+    LegacyRadioGroup,
+    LegacyCombobox,
+    LegacySplitCombobox,
+    LegacyDoubleCombobox,
+    LegacyCoordinates,
+    LegacyDistance,
+    LegacyAverageCounter,
+    LegacyPhoto,
+    LegacySpace,
+    LegacyCounter,
+    LegacySignature,
+    LegacyTabs,
+]
+
+LegacyForm = List[LegacyElementUnion]
+
+legacy_element_cls: Dict[str, Type[LegacyElement]] = {
+    c.__struct_config__.tag: c for c in get_args(LegacyElementUnion)
+}
+
+legacy_meta_decoder = Decoder(LegacyMeta)
+legacy_form_decoder = Decoder(LegacyForm)
+legacy_encoder = Encoder()
+
+LEGACY_FEATURES_CHUNK = 1 << 16
+
+
+def legacy_decode(
+    zf: ZipFile,
+    *,
+    check: Union[Callable[[bytes], None], None] = None,
+) -> Tuple[LegacyMeta, LegacyForm]:
+    meta, form = zf.read("meta.json"), zf.read("form.json")
+    if check is not None:
+        check(meta)
+        check(form)
+    return legacy_meta_decoder.decode(meta), legacy_form_decoder.decode(form)
+
+
+def legacy_encode(obj: Union[LegacyMeta, LegacyForm], *, pretty: bool) -> bytes:
+    result = legacy_encoder.encode(obj)
+    if pretty:
+        # msgspec can't indent while encoding, and reformatting the bytes is
+        # cheaper than any single-pass indenting encoder
+        result = msgspec_json_format(result, indent=4)
+    return result
+
+
+def legacy_write_features(fd: IO[bytes], features: Iterable[LegacyFeature]) -> None:
+    buf = bytearray(b'{"type":"FeatureCollection","features":[')
+    sep = False
+    for feature in features:
+        if sep:
+            buf += b","
+        sep = True
+        legacy_encoder.encode_into(feature, buf, -1)
+        if len(buf) >= LEGACY_FEATURES_CHUNK:
+            fd.write(buf)
+            buf.clear()
+    buf += b"]}"
+    fd.write(buf)
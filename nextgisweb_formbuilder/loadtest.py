@@ -0,0 +1,241 @@
+import os
+from base64 import b64encode
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from resource import RUSAGE_SELF, getrusage
+from threading import Lock
+from time import perf_counter
+from typing import Any, Dict, List, Literal, Protocol, Sequence, Tuple, Union
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from msgspec import Struct, field
+from msgspec.json import decode as msgspec_json_decode
+from msgspec.json import encode as msgspec_json_encode
+
+LoadOperation = Literal["ngfp", "convert", "save"]
+
+# Devices mostly poll for form updates, conversion and editing are rare
+LOAD_RATIOS: Dict[LoadOperation, float] = {"ngfp": 0.9, "convert": 0.08, "save": 0.02}
+
+
+class LoadProfile(Struct, kw_only=True):
+    devices: int = 8
+    requests: int = 1000
+    ratios: Dict[LoadOperation, float] = field(default_factory=lambda: dict(LOAD_RATIOS))
+    items: int = 20
+    options: int = 100
+    seed: int = 0
+
+
+class LoadLatency(Struct, kw_only=True):
+    count: int
+    errors: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+class LoadReport(Struct, kw_only=True):
+    requests: int
+    errors: int
+    elapsed: float
+    throughput: float
+    latency: Dict[LoadOperation, LoadLatency]
+    memory: Dict[str, int]
+
+    def format(self) -> str:
+        lines = [
+            f"{self.requests} requests, {self.errors} errors in {self.elapsed:.2f} s, "
+            f"{self.throughput:.1f} requests/s",
+            "",
+            f"{'operation':<10}{'count':>8}{'errors':>8}"
+            f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+        ]
+        for op, lat in self.latency.items():
+            lines.append(
+                f"{op:<10}{lat.count:>8}{lat.errors:>8}"
+                + "".join(f"{v * 1000:>10.1f}" for v in (lat.p50, lat.p90, lat.p99, lat.max))
+            )
+        if self.memory:
+            lines.append("")
+            for worker, rss in self.memory.items():
+                lines.append(f"memory {worker}: {rss / 2**20:.1f} MiB")
+        return "\n".join(lines)
+
+
+class LoadClient(Protocol):
+    def request(self, method: str, url: str, json: Any = None) -> Tuple[int, bytes]: ...
+
+
+class WebTestClient:
+    """Requests through a WebTestApp within the current process"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method: str, url: str, json: Any = None) -> Tuple[int, bytes]:
+        fn = getattr(self.app, method.lower() + ("_json" if json is not None else ""))
+        args = (url,) if json is None else (url, json)
+        resp = fn(*args, expect_errors=True)
+        return resp.status_int, resp.body
+
+
+class HTTPClient:
+    """Requests to a running server"""
+
+    def __init__(self, base_url: str, *, login: Union[str, None] = None, password: str = ""):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Content-Type": "application/json"}
+        if login is not None:
+            cred = b64encode(f"{login}:{password}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {cred}"
+
+    def request(self, method: str, url: str, json: Any = None) -> Tuple[int, bytes]:
+        data = msgspec_json_encode(json) if json is not None else None
+        req = Request(self.base_url + url, data=data, method=method, headers=self.headers)
+        try:
+            with urlopen(req) as resp:
+                return resp.status, resp.read()
+        except HTTPError as exc:
+            return exc.code, exc.read()
+
+
+def synthetic_value(*, items: int, options: int, revision: int = 0) -> Dict[str, Any]:
+    """Form value with textboxes and dropdowns alternating"""
+
+    fields, result = [], []
+    for i in range(items):
+        keyname = f"f{i}"
+        fields.append(dict(keyname=keyname, display_name=f"Field {i}", datatype="STRING"))
+        if i % 2 == 0:
+            result.append(
+                dict(type="textbox", field=keyname, remember=False, max_lines=1, initial="")
+            )
+        else:
+            opts = [dict(value=f"v{j}", label=f"Value {j}") for j in range(options)]
+            result.append(
+                dict(
+                    type="dropdown",
+                    field=keyname,
+                    remember=False,
+                    options=opts,
+                    search=False,
+                    free_input=False,
+                )
+            )
+    result.insert(0, dict(type="label", label=f"Revision {revision}"))
+    return dict(geometry_type="POINT", fields=fields, items=result)
+
+
+def process_rss(pid: Union[int, None] = None) -> int:
+    if pid is None:
+        return getrusage(RUSAGE_SELF).ru_maxrss * 1024
+    with open(f"/proc/{pid}/status") as fd:
+        for line in fd:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def run_load(
+    client: LoadClient,
+    *,
+    parent: int,
+    profile: LoadProfile,
+    pids: Sequence[int] = (),
+) -> LoadReport:
+    """Simulate devices downloading, converting and saving a form
+
+    A form with a synthetic value is created under the parent layer for the
+    run and deleted afterwards. Memory is reported for given worker
+    processes or for the current process if none given."""
+
+    value = synthetic_value(items=profile.items, options=profile.options)
+    status, body = client.request(
+        "POST",
+        "/api/resource/",
+        dict(
+            resource=dict(cls="formbuilder_form", parent=dict(id=parent)),
+            formbuilder_form=dict(value=value),
+        ),
+    )
+    if status != 201:
+        raise RuntimeError(f"Unable to create a form: {status} {body[:200]!r}")
+    res_id = msgspec_json_decode(body)["id"]
+
+    rnd = Random(profile.seed)
+    ops: List[LoadOperation] = list(profile.ratios)
+    plan = rnd.choices(ops, weights=[profile.ratios[o] for o in ops], k=profile.requests)
+
+    lock = Lock()
+    timings: Dict[LoadOperation, List[float]] = defaultdict(list)
+    errors: Dict[LoadOperation, int] = defaultdict(int)
+    revisions = iter(range(1, profile.requests + 1))
+
+    def perform(op: LoadOperation):
+        args: Tuple[Any, ...]
+        if op == "ngfp":
+            args = ("GET", f"/api/resource/{res_id}/ngfp")
+        elif op == "convert":
+            ref = dict(resource=dict(id=res_id))
+            args = ("POST", "/api/component/formbuilder/ngfp_convert", ref)
+        else:
+            with lock:
+                revision = next(revisions)
+            saved = synthetic_value(
+                items=profile.items,
+                options=profile.options,
+                revision=revision,
+            )
+            args = ("PUT", f"/api/resource/{res_id}", dict(formbuilder_form=dict(value=saved)))
+
+        start = perf_counter()
+        status, _ = client.request(*args)
+        elapsed = perf_counter() - start
+        with lock:
+            timings[op].append(elapsed)
+            if status >= 400:
+                errors[op] += 1
+
+    start = perf_counter()
+    try:
+        # Each device is a thread sending requests one after another
+        with ThreadPoolExecutor(profile.devices) as executor:
+            for future in [executor.submit(perform, op) for op in plan]:
+                future.result()
+    finally:
+        elapsed = perf_counter() - start
+        client.request("DELETE", f"/api/resource/{res_id}")
+
+    latency = dict()
+    for op in ops:
+        values = sorted(timings[op])
+        latency[op] = LoadLatency(
+            count=len(values),
+            errors=errors[op],
+            p50=_percentile(values, 0.5),
+            p90=_percentile(values, 0.9),
+            p99=_percentile(values, 0.99),
+            max=values[-1] if values else 0.0,
+        )
+
+    if pids:
+        memory = {str(pid): process_rss(pid) for pid in pids}
+    else:
+        memory = {f"{os.getpid()} (peak)": process_rss()}
+
+    return LoadReport(
+        requests=len(plan),
+        errors=sum(errors.values()),
+        elapsed=elapsed,
+        throughput=len(plan) / elapsed if elapsed > 0 else 0.0,
+        latency=latency,
+        memory=memory,
+    )
@@ -0,0 +1,19 @@
+/*** {
+    "revision": "80ddf487", "parents": ["4d5bfd2d"],
+    "date": "2026-10-19T09:12:41",
+    "message": "Content hash"
+} ***/
+
+ALTER TABLE formbuilder_form ADD COLUMN content_hash character varying;
+ALTER TABLE formbuilder_form ADD COLUMN content_size bigint;
+
+UPDATE formbuilder_form SET
+    content_hash = encode(sha256(convert_to(value::text, 'UTF8')), 'hex'),
+    content_size = octet_length(value::text)
+WHERE value IS NOT NULL;
+
+-- Uploaded files are replaced with new file objects, so the file object ID
+-- is enough to track versions until the next upload.
+UPDATE formbuilder_form SET
+    content_hash = encode(sha256(convert_to('fileobj:' || ngfp_fileobj_id::text, 'UTF8')), 'hex')
+WHERE ngfp_fileobj_id IS NOT NULL;
@@ -0,0 +1,4 @@
+/*** { "revision": "80ddf487" } ***/
+
+ALTER TABLE formbuilder_form DROP COLUMN content_size;
+ALTER TABLE formbuilder_form DROP COLUMN content_hash;
@@ -0,0 +1,17 @@
+/*** {
+    "revision": "8b2e61c4", "parents": ["80ddf487"],
+    "date": "2026-10-19T11:47:05",
+    "message": "Form revision"
+} ***/
+
+CREATE TABLE formbuilder_form_revision (
+    resource_id integer NOT NULL,
+    revision integer NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    snapshot jsonb,
+    delta jsonb,
+    PRIMARY KEY (resource_id, revision),
+    FOREIGN KEY (resource_id) REFERENCES formbuilder_form (id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE formbuilder_form_revision IS 'formbuilder';
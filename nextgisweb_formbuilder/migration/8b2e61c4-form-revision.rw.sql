@@ -0,0 +1,3 @@
+/*** { "revision": "8b2e61c4" } ***/
+
+DROP TABLE formbuilder_form_revision;
@@ -0,0 +1,39 @@
+/*** {
+    "revision": "9c4f0a7e", "parents": ["8b2e61c4"],
+    "date": "2026-10-19T14:05:32",
+    "message": "Form element index"
+} ***/
+
+CREATE TABLE formbuilder_form_element (
+    resource_id integer NOT NULL,
+    path character varying NOT NULL,
+    tag character varying NOT NULL,
+    attrs jsonb NOT NULL,
+    PRIMARY KEY (resource_id, path),
+    FOREIGN KEY (resource_id) REFERENCES formbuilder_form (id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE formbuilder_form_element IS 'formbuilder';
+
+CREATE INDEX formbuilder_form_element_tag_idx ON formbuilder_form_element (tag);
+CREATE INDEX formbuilder_form_element_attrs_idx ON formbuilder_form_element USING gin (attrs jsonb_path_ops);
+
+-- Forms stored as uploaded files are indexed on the next upload or update
+WITH RECURSIVE element(resource_id, path, item) AS (
+    SELECT f.id, '/items/' || (i.ord - 1), i.item
+    FROM formbuilder_form f, jsonb_array_elements(f.value -> 'items') WITH ORDINALITY i(item, ord)
+    WHERE f.value IS NOT NULL
+UNION ALL
+    SELECT e.resource_id, e.path || '/tabs/' || (t.ord - 1) || '/items/' || (c.ord - 1), c.item
+    FROM element e,
+        jsonb_array_elements(e.item -> 'tabs') WITH ORDINALITY t(tab, ord),
+        jsonb_array_elements(t.tab -> 'items') WITH ORDINALITY c(item, ord)
+    WHERE e.item ->> 'type' = 'tabs'
+)
+INSERT INTO formbuilder_form_element (resource_id, path, tag, attrs)
+SELECT resource_id, path, item ->> 'type', (
+    SELECT coalesce(jsonb_object_agg(k, v), '{}'::jsonb)
+    FROM jsonb_each(item) AS a(k, v)
+    WHERE k <> 'type' AND jsonb_typeof(v) <> 'array'
+)
+FROM element;
@@ -0,0 +1,3 @@
+/*** { "revision": "9c4f0a7e" } ***/
+
+DROP TABLE formbuilder_form_element;
@@ -0,0 +1,19 @@
+/*** {
+    "revision": "a3d5e6f1", "parents": ["9c4f0a7e"],
+    "date": "2026-10-19T16:20:11",
+    "message": "Artifact cache"
+} ***/
+
+CREATE TABLE formbuilder_artifact (
+    kind character varying NOT NULL,
+    key character varying NOT NULL,
+    fileobj_id integer NOT NULL,
+    size bigint NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    PRIMARY KEY (kind, key),
+    FOREIGN KEY (fileobj_id) REFERENCES fileobj (id)
+);
+
+CREATE INDEX formbuilder_artifact_tstamp_idx ON formbuilder_artifact (tstamp);
+
+COMMENT ON TABLE formbuilder_artifact IS 'formbuilder';
@@ -0,0 +1,3 @@
+/*** { "revision": "a3d5e6f1" } ***/
+
+DROP TABLE formbuilder_artifact;
@@ -0,0 +1,17 @@
+/*** {
+    "revision": "b7c1f2d8", "parents": ["a3d5e6f1"],
+    "date": "2026-10-19T17:42:05",
+    "message": "NGFP conversion jobs"
+} ***/
+
+CREATE TABLE formbuilder_ngfp_job (
+    id uuid NOT NULL,
+    user_id integer NOT NULL,
+    status character varying NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    value jsonb,
+    error character varying,
+    PRIMARY KEY (id)
+);
+
+COMMENT ON TABLE formbuilder_ngfp_job IS 'formbuilder';
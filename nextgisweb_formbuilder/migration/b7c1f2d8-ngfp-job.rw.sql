@@ -0,0 +1,3 @@
+/*** { "revision": "b7c1f2d8" } ***/
+
+DROP TABLE formbuilder_ngfp_job;
@@ -0,0 +1,27 @@
+/*** {
+    "revision": "c2e8a4b9", "parents": ["b7c1f2d8"],
+    "date": "2026-10-19T19:06:27",
+    "message": "Parent layer schema fingerprint"
+} ***/
+
+ALTER TABLE formbuilder_form ADD COLUMN schema_fingerprint character varying;
+ALTER TABLE formbuilder_form ADD COLUMN schema_fields jsonb;
+
+-- Existing forms are considered bound to current schemas of their layers.
+-- Bound fields of uploaded NGFP files are unknown until the next upload.
+UPDATE formbuilder_form ff SET
+    schema_fingerprint = (
+        SELECT encode(sha256(convert_to(coalesce(string_agg(
+            lf.keyname || E'\t' || lf.datatype || E'\n', ''
+            ORDER BY lf.keyname COLLATE "C"
+        ), ''), 'UTF8')), 'hex')
+        FROM layer_field lf WHERE lf.layer_id = r.parent_id
+    ),
+    schema_fields = CASE WHEN ff.value IS NOT NULL THEN (
+        SELECT coalesce(jsonb_object_agg(lf.keyname, lf.datatype), '{}'::jsonb)
+        FROM jsonb_array_elements(ff.value -> 'fields') f
+        JOIN layer_field lf ON lf.layer_id = r.parent_id
+            AND lf.keyname = f ->> 'keyname'
+            AND lf.datatype = f ->> 'datatype'
+    ) END
+FROM resource r WHERE r.id = ff.id;
@@ -0,0 +1,4 @@
+/*** { "revision": "c2e8a4b9" } ***/
+
+ALTER TABLE formbuilder_form DROP COLUMN schema_fields;
+ALTER TABLE formbuilder_form DROP COLUMN schema_fingerprint;
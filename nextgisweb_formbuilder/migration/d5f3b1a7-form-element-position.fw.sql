@@ -0,0 +1,23 @@
+/*** {
+    "revision": "d5f3b1a7", "parents": ["c2e8a4b9"],
+    "date": "2026-10-19T21:14:03",
+    "message": "Form element position"
+} ***/
+
+ALTER TABLE formbuilder_form_element ADD COLUMN position integer;
+
+-- Paths compared by their numeric components give the document order
+UPDATE formbuilder_form_element e SET position = p.position
+FROM (
+    SELECT resource_id, path, row_number() OVER (
+        PARTITION BY resource_id
+        ORDER BY string_to_array(trim(regexp_replace(path, '\D+', ' ', 'g')), ' ')::int[]
+    ) - 1 AS position
+    FROM formbuilder_form_element
+) p
+WHERE e.resource_id = p.resource_id AND e.path = p.path;
+
+ALTER TABLE formbuilder_form_element ALTER COLUMN position SET NOT NULL;
+
+CREATE INDEX formbuilder_form_element_position_idx
+    ON formbuilder_form_element (resource_id, position);
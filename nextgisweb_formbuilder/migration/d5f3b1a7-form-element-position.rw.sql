@@ -0,0 +1,4 @@
+/*** { "revision": "d5f3b1a7" } ***/
+
+DROP INDEX formbuilder_form_element_position_idx;
+ALTER TABLE formbuilder_form_element DROP COLUMN position;
@@ -0,0 +1,12 @@
+/*** {
+    "revision": "e8a2c6d4", "parents": ["d5f3b1a7"],
+    "date": "2026-10-19T22:05:41",
+    "message": "NGFP conversion job user foreign key"
+} ***/
+
+DELETE FROM formbuilder_ngfp_job j
+WHERE NOT EXISTS (SELECT 1 FROM auth_user u WHERE u.principal_id = j.user_id);
+
+ALTER TABLE formbuilder_ngfp_job
+    ADD CONSTRAINT formbuilder_ngfp_job_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES auth_user (principal_id) ON DELETE CASCADE;
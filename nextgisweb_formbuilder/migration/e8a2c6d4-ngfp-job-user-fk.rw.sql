@@ -0,0 +1,3 @@
+/*** { "revision": "e8a2c6d4" } ***/
+
+ALTER TABLE formbuilder_ngfp_job DROP CONSTRAINT formbuilder_ngfp_job_user_id_fkey;
@@ -1,51 +1,170 @@
-import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from hashlib import file_digest, sha256
+from heapq import nlargest
 from io import BytesIO
+from itertools import groupby
 from pathlib import Path
-from typing import Any, Dict, List, Union
-from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile
+from typing import (
+    IO,
+    Annotated,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+from uuid import UUID, uuid4
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile, ZipInfo
 
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
-from msgspec import UNSET, Struct, UnsetType
+from msgspec import UNSET, Meta, Struct, UnsetType
 from msgspec import DecodeError as MsgspecDecodeErrror
 from msgspec import ValidationError as MsgspecValidationError
+from msgspec import convert as msgspec_convert
+from msgspec import to_builtins as msgspec_to_builtins
+from msgspec.json import Decoder, Encoder
 from msgspec.json import decode as msgspec_json_decode
+from msgspec.json import encode as msgspec_json_encode
+from shapely.geometry import mapping
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
 from sqlalchemy.orm import Mapped, mapped_column
 
-from nextgisweb.env import gettext, gettextf, ngettextf
-from nextgisweb.lib.json import dumpb, loadb
+from nextgisweb.env import Base, DBSession, env, gettext, gettextf, ngettextf
+from nextgisweb.lib.geometry import Geometry
 from nextgisweb.lib.saext import Msgspec
 
-from nextgisweb.core.exception import InsufficientPermissions, ValidationError
+from nextgisweb.auth import User
+from nextgisweb.core.exception import InsufficientPermissions, UserException, ValidationError
 from nextgisweb.feature_layer import (
-    FIELD_TYPE,
     FeatureLayerFieldDatatype,
     FeatureLayerGeometryType,
     IFeatureLayer,
+    IFeatureQueryOrderBy,
     IFieldEditableFeatureLayer,
+    LayerField,
 )
 from nextgisweb.file_storage import FileObj
 from nextgisweb.file_upload import FileUploadRef
 from nextgisweb.resource import DataScope, Resource, ResourceScope, SAttribute, Serializer
 from nextgisweb.resource.category import FieldDataCollectionCategory
+from nextgisweb.spatial_ref_sys import SRS
 
+from .cache import cached_artifact, cached_artifact_file, single_flight, spooled_file
 from .element import (
+    ITEMS_MAX_LENGTH,
+    TEXT_MAX_LENGTH,
     FieldKeyname,
+    FormbuilderCascadeItem,
     FormbuilderFormItemUnion,
     FormbuilderItem,
+    FormbuilderOutlineItem,
+    FormbuilderTabsItem,
+    RecordCheck,
+    RecordDynamic,
+    RecordDynamicValue,
+    RecordErrorCode,
+    RecordValue,
+    Text,
+    share_option_labels,
+)
+from .legacy import (
+    LegacyFeature,
+    LegacyField,
+    LegacyForm,
+    LegacyMeta,
+    legacy_decode,
+    legacy_encode,
+    legacy_form_decoder,
+    legacy_meta_decoder,
+    legacy_write_features,
+)
+from .revision import (
+    RevisionChange,
+    RevisionDelta,
+    delta_apply,
+    delta_between,
+    delta_changes,
+    delta_compose,
+    delta_invert,
+    flatten,
+    unflatten,
 )
 
 
 class FormbuilderField(Struct):
     keyname: FieldKeyname
-    display_name: str
+    display_name: Text
     datatype: FeatureLayerFieldDatatype
 
 
+SchemaFields = Dict[FieldKeyname, FeatureLayerFieldDatatype]
+
+
+def schema_fingerprint(fields: Iterable[Tuple[str, str]]) -> str:
+    """Fingerprint of keynames and datatypes, see layer_schema_fingerprint"""
+
+    data = "".join(f"{keyname}\t{datatype}\n" for keyname, datatype in sorted(fields))
+    return sha256(data.encode("utf-8")).hexdigest()
+
+
+def layer_schema_fingerprint(layer_id) -> sa.ScalarSelect:
+    """SQL expression evaluating to schema_fingerprint of layer fields"""
+
+    # Code point order of Python strings matches byte order of the C collation
+    line = LayerField.keyname + "\t" + sa.cast(LayerField.datatype, sa.Unicode) + "\n"
+    order = aggregate_order_by(sa.literal(""), LayerField.keyname.collate("C"))
+    agg = sa.func.string_agg(line, order)
+    digest = sa.func.sha256(sa.func.convert_to(sa.func.coalesce(agg, ""), "UTF8"))
+    return (
+        sa.select(sa.func.encode(digest, "hex"))
+        .where(LayerField.layer_id == layer_id)
+        .scalar_subquery()
+    )
+
+
+class FormbuilderRecordError(Struct, kw_only=True):
+    record: int
+    field: FieldKeyname
+    code: RecordErrorCode
+
+
+T = TypeVar("T")
+
+
+class FormbuilderRecordDefaults(Struct, kw_only=True, frozen=True):
+    static: Dict[FieldKeyname, Any]
+    dynamic: Dict[FieldKeyname, RecordDynamic]
+
+    def resolve(self, *, now: datetime, username: Union[str, None]) -> Dict[FieldKeyname, Any]:
+        result = dict(self.static)
+        if self.dynamic:
+            now = now.replace(microsecond=0)
+            values = dict(
+                date=now.date().isoformat(),
+                time=now.time().isoformat(),
+                datetime=now.isoformat(),
+                ngw_username=username,
+                ngid_username=None,
+            )
+            for keyname, kind in self.dynamic.items():
+                result[keyname] = values[kind]
+        return result
+
+
 class FormbuilderFormValue(Struct, kw_only=True):
     geometry_type: FeatureLayerGeometryType
     fields: List[FormbuilderField]
-    items: List[FormbuilderFormItemUnion]
+    items: Annotated[List[FormbuilderFormItemUnion], Meta(max_length=ITEMS_MAX_LENGTH)]
 
     def validate(self):
         fields_mapping: dict[str, FormbuilderField] = {}
@@ -122,72 +241,340 @@ class FormbuilderFormValue(Struct, kw_only=True):
                 return f
         raise KeyError
 
+    def share_labels(self) -> None:
+        """Share label and value strings in large option lists
+
+        Done once when a value is built or written, values read back keep
+        decoded strings."""
+
+        for item in self.walk_items():
+            if (options := getattr(item, "options", None)) is not None:
+                share_option_labels(options)
+
+    def walk_items(self) -> Iterator[FormbuilderItem]:
+        def _walk(items):
+            for item in items:
+                yield item
+                if isinstance(item, FormbuilderTabsItem):
+                    for tab in item.tabs:
+                        yield from _walk(tab.items)
+
+        return _walk(self.items)
+
+    def element_index(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        def _walk(items, prefix):
+            for index, item in enumerate(items):
+                path = f"{prefix}/{index}"
+                data = msgspec_to_builtins(item)
+                tag = data.pop("type")
+                yield path, tag, {k: v for k, v in data.items() if not isinstance(v, list)}
+                if isinstance(item, FormbuilderTabsItem):
+                    for tab_index, tab in enumerate(item.tabs):
+                        yield from _walk(tab.items, f"{path}/tabs/{tab_index}/items")
+
+        return _walk(self.items, "/items")
+
+    def outline(self) -> List[FormbuilderOutlineItem]:
+        return [i.outline() for i in self.items]
+
+    def record_checks(self) -> List[RecordCheck]:
+        datatypes = {f.keyname: f.datatype for f in self.fields}
+        return [c for i in self.items for c in i.record_checks(datatypes=datatypes)]
+
+    def validate_records(
+        self,
+        records: Iterable[RecordValue],
+        *,
+        checks: Union[List[RecordCheck], None] = None,
+    ) -> List[FormbuilderRecordError]:
+        if checks is None:
+            checks = self.record_checks()
+        errors = []
+        for index, record in enumerate(records):
+            for check in checks:
+                if (error := check(record)) is not None:
+                    field, code = error
+                    errors.append(FormbuilderRecordError(record=index, field=field, code=code))
+        return errors
+
+    def record_defaults(self) -> FormbuilderRecordDefaults:
+        datatypes = {f.keyname: f.datatype for f in self.fields}
+        static: Dict[FieldKeyname, Any] = dict.fromkeys(datatypes)
+        dynamic: Dict[FieldKeyname, RecordDynamic] = dict()
+        for item in self.items:
+            for keyname, value in item.record_defaults(datatypes=datatypes):
+                if isinstance(value, RecordDynamicValue):
+                    dynamic[keyname] = value.kind
+                else:
+                    static[keyname] = value
+        return FormbuilderRecordDefaults(static=static, dynamic=dynamic)
+
     @classmethod
-    def from_legacy(cls, filename) -> "FormbuilderFormValue":
+    def from_legacy(
+        cls,
+        filename,
+        *,
+        budget: Union["FormbuilderBudget", None] = None,
+    ) -> "FormbuilderFormValue":
         with ZipFile(filename, "r") as z:
-            meta = loadb(z.read("meta.json"))
-            form = loadb(z.read("form.json"))
+            if budget is not None:
+                budget.check_size(sum(z.getinfo(fn).file_size for fn in NGFP_FORM_FILES))
+            meta, form = legacy_decode(z, check=budget.check_json if budget else None)
+        return cls.from_legacy_decoded(meta, form)
 
+    @classmethod
+    def from_legacy_decoded(cls, meta: LegacyMeta, form: LegacyForm) -> "FormbuilderFormValue":
+        fields = [
+            FormbuilderField(
+                keyname=f.keyname,
+                display_name=f.display_name,
+                datatype=f.datatype,
+            )
+            for f in meta.fields
+        ]
         items = [FormbuilderItem.from_legacy(i) for i in form]
+        value = cls(geometry_type=meta.geometry_type, fields=fields, items=items)
+        value.share_labels()
+        return value
 
-        return cls(
-            geometry_type=meta["geometry_type"],
-            fields=meta["fields"],
-            items=items,
-        )
-
-    def to_legacy(self, name: str) -> bytes:
+    def to_legacy(
+        self,
+        name: str,
+        *,
+        pretty: bool = True,
+        compression: int = ZIP_DEFLATED,
+        compresslevel: Union[int, None] = None,
+        features: Union[Iterable[LegacyFeature], None] = None,
+    ) -> bytes:
         buf = BytesIO()
-        with ZipFile(buf, "w", ZIP_DEFLATED) as zf:
-            meta = dict(
-                version="2.2",
-                name=name,
-                geometry_type=self.geometry_type,
-                fields=self.fields,
-                translations=[],
-                srs=dict(id=4326),
-                ngw_connection=None,
-                lists=None,
-                key_list=None,
-            )
-            zf.writestr("meta.json", dumpb(meta, pretty=True))
+        self.write_legacy(
+            buf,
+            name,
+            pretty=pretty,
+            compression=compression,
+            compresslevel=compresslevel,
+            features=features,
+        )
+        return buf.getvalue()
 
-            legacy_items = [i.to_legacy() for i in self.items]
-            self.legacy_items_extra(legacy_items)
-            zf.writestr("form.json", dumpb(legacy_items, pretty=True))
+    def write_legacy(
+        self,
+        fileobj: IO[bytes],
+        name: str,
+        *,
+        pretty: bool = True,
+        compression: int = ZIP_DEFLATED,
+        compresslevel: Union[int, None] = None,
+        features: Union[Iterable[LegacyFeature], None] = None,
+    ) -> None:
+        datatypes = {f.keyname: f.datatype for f in self.fields}
 
-            zf.writestr("data.geojson", "")
+        meta = LegacyMeta(
+            name=name,
+            geometry_type=self.geometry_type,
+            fields=[
+                LegacyField(
+                    keyname=f.keyname,
+                    display_name=f.display_name,
+                    datatype=f.datatype,
+                )
+                for f in self.fields
+            ],
+        )
+        form = [i.to_legacy(datatypes=datatypes) for i in self.items]
 
-        return buf.getvalue()
+        with ZipFile(fileobj, "w", compression, compresslevel=compresslevel) as zf:
+            zf.writestr("meta.json", legacy_encode(meta, pretty=pretty))
+            zf.writestr("form.json", legacy_encode(form, pretty=pretty))
+            if features is None:
+                zf.writestr("data.geojson", "")
+            else:
+                with zf.open("data.geojson", "w") as fd:
+                    legacy_write_features(fd, features)
 
-    def legacy_items_extra(self, legacy_items: List[Dict[str, Any]]):
-        for li in legacy_items:
-            if li["type"] == "tabs":
-                for p in li["pages"]:
-                    self.legacy_items_extra(p["elements"])
-            elif li["type"] == "text_edit":
-                attrs = li["attributes"]
-                field = self.field_by_keyname(attrs["field"])
-                is_number = field.datatype in (
-                    FIELD_TYPE.INTEGER,
-                    FIELD_TYPE.BIGINT,
-                    FIELD_TYPE.REAL,
-                )
-                attrs["only_figures"] = is_number
-                if is_number and (text := attrs["text"]) != "":
-                    is_real = field.datatype == FIELD_TYPE.REAL
-                    if not _check_number(text, is_real):
-                        attrs["text"] = ""
 
+# Built at import to keep type resolution out of the first request
+value_decoder = Decoder(FormbuilderFormValue)
+value_encoder = Encoder()
 
 NGFP_MAX_SIZE = 10 * 1 << 20
+NGFP_READ_CHUNK = 1 << 16
+NGFP_RATIO_THRESHOLD = 1 << 20
 NGFP_FILE_SCHEMA: Dict[str, Any] = {
-    "meta.json": Dict,
-    "form.json": List[Dict],
+    "meta.json": legacy_meta_decoder,
+    "form.json": legacy_form_decoder,
     "data.geojson": None,
 }
 
 NGFP_FILES = {"meta.json", "form.json", "data.geojson"}
+NGFP_FORM_FILES = ("meta.json", "form.json")
+
+
+def ngfp_archive_key(content_hash: str, display_name: str, options: Dict[str, Any]) -> str:
+    # The resource name goes into meta.json
+    return sha256(
+        msgspec_json_encode([content_hash, display_name, sorted(options.items())])
+    ).hexdigest()
+
+
+class NGFPLimits(Struct, kw_only=True, frozen=True):
+    max_size: int
+    max_member_size: int
+    max_total_size: int
+    max_ratio: float
+
+
+# JSON tokens relevant for budgets, anything else between them is skipped
+BUDGET_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}:]')
+
+# Keys of arrays containing form elements and options in both form value and
+# legacy formats. Arrays nested into options, like options of cascade
+# options, contain options too.
+BUDGET_ITEM_KEYS = (b'"items"', b'"elements"')
+BUDGET_OPTION_KEYS = (b'"options"', b'"values"')
+
+# Each level of elements takes at most this many levels of JSON nesting: an
+# element, its tabs, a tab and its elements
+BUDGET_NESTING_PER_LEVEL = 4
+BUDGET_NESTING_EXTRA = 8
+
+
+class FormbuilderBudget(Struct, kw_only=True, frozen=True):
+    max_items: int
+    max_depth: int
+    max_options: int
+    max_size: int
+    max_string: int
+
+    def check_size(self, size: int) -> None:
+        if size > self.max_size:
+            msg = gettextf("The form exceeds {} bytes serialized.")
+            raise ValidationError(msg.format(self.max_size))
+
+    def check_json(self, data: bytes) -> None:
+        """Scan a form value or legacy JSON document before decoding it
+
+        The scan fails on the first exceeded budget and doesn't build any
+        objects, so the cost is bounded by the document size."""
+
+        self.check_size(len(data))
+        max_items, max_depth = self.max_items, self.max_depth
+        max_options, max_string = self.max_options, self.max_string
+        max_nesting = max_depth * BUDGET_NESTING_PER_LEVEL + BUDGET_NESTING_EXTRA
+
+        # Stack of open containers: "[" arrays with their kind and "{" objects
+        # with options counter of the enclosing element saved
+        stack: List[Tuple[bytes, Any]] = []
+        items = options = depth = in_options = 0
+        key = prev = None
+
+        for m in BUDGET_TOKEN.finditer(data):
+            token = m.group()
+            if token[0] == 0x22:  # String
+                # Each character takes at least one byte, so shorter strings
+                # don't need to be decoded
+                if len(token) - 2 > max_string and len(msgspec_json_decode(token)) > max_string:
+                    msg = gettextf("The form contains a text longer than {} characters.")
+                    raise ValidationError(msg.format(max_string))
+                prev = token
+            elif token == b":":
+                key, prev = prev, None
+            elif token == b"[" or token == b"{":
+                parent = stack[-1][1] if stack and stack[-1][0] == b"[" else None
+                if len(stack) >= max_nesting:
+                    msg = gettextf("Form elements are nested deeper than {} levels.")
+                    raise ValidationError(msg.format(max_depth))
+
+                if token == b"[":
+                    if in_options or key in BUDGET_OPTION_KEYS:
+                        kind, in_options = "options", in_options + 1
+                    elif not stack or key in BUDGET_ITEM_KEYS:
+                        kind, depth = "items", depth + 1
+                    else:
+                        kind = None
+                    stack.append((token, kind))
+                elif parent == "items":
+                    items += 1
+                    if items > max_items:
+                        msg = gettextf("The form has more than {} elements.")
+                        raise ValidationError(msg.format(max_items))
+                    if depth > max_depth:
+                        msg = gettextf("Form elements are nested deeper than {} levels.")
+                        raise ValidationError(msg.format(max_depth))
+
+                    # Options are counted per element, nested ones have own
+                    stack.append((token, options))
+                    options = 0
+                else:
+                    if parent == "options":
+                        options += 1
+                        if options > max_options:
+                            msg = gettextf("A form element has more than {} options.")
+                            raise ValidationError(msg.format(max_options))
+                    stack.append((token, None))
+                key = None
+            elif stack:  # Closing bracket
+                opening, state = stack.pop()
+                if opening == b"[":
+                    if state == "options":
+                        in_options -= 1
+                    elif state == "items":
+                        depth -= 1
+                elif state is not None:
+                    options = state
+                key = None
+
+    def check_value(self, value: "FormbuilderFormValue") -> None:
+        """Check a decoded form value
+
+        The decoder limits elements and options of a single list and lengths
+        of texts, so only totals are counted. Texts are walked only if the
+        budget is lower than the decoder limit."""
+
+        max_items, max_depth, max_options = self.max_items, self.max_depth, self.max_options
+        count, stack = 0, [(value.items, 1)]
+        while stack:
+            items, depth = stack.pop()
+            if depth > max_depth:
+                msg = gettextf("Form elements are nested deeper than {} levels.")
+                raise ValidationError(msg.format(max_depth))
+            count += len(items)
+            if count > max_items:
+                msg = gettextf("The form has more than {} elements.")
+                raise ValidationError(msg.format(max_items))
+
+            for item in items:
+                if isinstance(item, FormbuilderTabsItem):
+                    stack.extend((tab.items, depth + 1) for tab in item.tabs)
+                elif (options := getattr(item, "options", None)) is not None:
+                    total = len(options)
+                    if isinstance(item, FormbuilderCascadeItem):
+                        total += sum(len(o.items) for o in options)
+                    if total > max_options:
+                        msg = gettextf("A form element has more than {} options.")
+                        raise ValidationError(msg.format(max_options))
+
+        if (max_string := self.max_string) < TEXT_MAX_LENGTH:
+            for text in _struct_texts(value):
+                if len(text) > max_string:
+                    msg = gettextf("The form contains a text longer than {} characters.")
+                    raise ValidationError(msg.format(max_string))
+
+
+def _struct_texts(obj) -> Iterator[str]:
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, list):
+        for i in obj:
+            yield from _struct_texts(i)
+    elif isinstance(obj, Struct):
+        for f in obj.__struct_fields__:
+            yield from _struct_texts(getattr(obj, f))
+
+
+# Layers without ordering support are counted in memory up to this number of
+# distinct values
+DISTINCT_MAX_KEYS = 100000
 
 
 class FormbuilderForm(Resource):
@@ -199,6 +586,10 @@ class FormbuilderForm(Resource):
 
     value: Mapped[FormbuilderFormValue | None] = mapped_column(Msgspec(FormbuilderFormValue))
     ngfp_fileobj_id: Mapped[int | None] = mapped_column(sa.ForeignKey(FileObj.id))
+    content_hash: Mapped[str | None] = mapped_column(sa.Unicode)
+    content_size: Mapped[int | None] = mapped_column(sa.BigInteger)
+    schema_fingerprint: Mapped[str | None] = mapped_column(sa.Unicode)
+    schema_fields: Mapped[SchemaFields | None] = mapped_column(JSONB)
 
     __table_args__ = (sa.CheckConstraint("(value IS NULL) != (ngfp_fileobj_id IS NULL)"),)
 
@@ -216,47 +607,535 @@ class FormbuilderForm(Resource):
     def srs(self):
         return self.parent.srs
 
+    def bind_schema(self) -> None:
+        """Remember the parent layer schema and the bound fields it provides"""
+
+        layer = {f.keyname: f.datatype for f in self.parent.fields}
+        self.schema_fingerprint = schema_fingerprint(layer.items())
+        self.schema_fields = {
+            f.keyname: f.datatype
+            for f in self.legacy_fields()
+            if layer.get(f.keyname) == f.datatype
+        }
+
+    def schema_conflicts(self) -> List[FieldKeyname]:
+        """Bound fields removed from the parent layer or changed since binding"""
+
+        if self.schema_fields is None:
+            return []
+        layer = {f.keyname: f.datatype for f in self.parent.fields}
+        if schema_fingerprint(layer.items()) == self.schema_fingerprint:
+            return []
+        return [kn for kn, dt in self.schema_fields.items() if layer.get(kn) != dt]
+
+    def check_schema(self) -> None:
+        if conflicts := self.schema_conflicts():
+            raise FormbuilderSchemaConflict(conflicts)
+
+    def update_value(self, value: FormbuilderFormValue) -> None:
+        # The decoder has already enforced the budget ceilings, the rest of
+        # the budget goes first to keep oversized forms away from others
+        env.formbuilder.budget.check_value(value)
+
+        value.validate()
+        value.share_labels()
+        previous = self.value
+        self.value = value
+        self.ngfp_fileobj = None
+        record_revision(self, previous)
+        index_elements(self, value)
+
+        # Values aren't encoded here, so unlike for uploaded files the hash is
+        # random. It changes only when the value does.
+        if previous is None or value != previous:
+            self.content_hash = uuid4().hex
+            self.content_size = None
+
+    def resolve_value(self) -> FormbuilderFormValue:
+        if (value := self.value) is not None:
+            return value
+        return self._cached(
+            "value",
+            lambda: FormbuilderFormValue.from_legacy(self.ngfp_fileobj.filename()),
+            type=FormbuilderFormValue,
+        )
+
+    def _cached(
+        self,
+        kind: str,
+        factory: Callable[[], T],
+        *,
+        type: Type[T],
+    ) -> T:
+        if (content_hash := self.content_hash) is None:
+            return factory()
+        return single_flight(
+            (kind, content_hash),
+            lambda: cached_artifact(kind, content_hash, factory, type),
+        )
+
+    def validate_records(self, records: Iterable[RecordValue]) -> List[FormbuilderRecordError]:
+        return self.resolve_value().validate_records(records)
+
+    def record_defaults(self) -> FormbuilderRecordDefaults:
+        return self._cached(
+            "defaults",
+            lambda: self.resolve_value().record_defaults(),
+            type=FormbuilderRecordDefaults,
+        )
+
+    def outline(self) -> List[FormbuilderOutlineItem]:
+        return self._cached(
+            "outline",
+            lambda: self.resolve_value().outline(),
+            type=List[FormbuilderOutlineItem],
+        )
+
+    def ngfp_archive_key(self, **options) -> Union[str, None]:
+        if (content_hash := self.content_hash) is None:
+            return None
+        return ngfp_archive_key(content_hash, self.display_name, options)
+
+    def ngfp_archive(self, **options) -> IO[bytes]:
+        """Generated NGFP file without features, shared between workers
+
+        The caller is responsible for closing the returned file."""
+
+        def write(fd):
+            self.write_ngfp(fd, **options)
+
+        if (key := self.ngfp_archive_key(**options)) is None:
+            return spooled_file(write)
+        return cached_artifact_file("ngfp", key, write)
+
+    def legacy_fields(self) -> List[LegacyField]:
+        if (value := self.value) is not None:
+            return [
+                LegacyField(
+                    keyname=f.keyname,
+                    display_name=f.display_name,
+                    datatype=f.datatype,
+                )
+                for f in value.fields
+            ]
+        with ZipFile(self.ngfp_fileobj.filename(), "r") as zf:
+            return legacy_meta_decoder.decode(zf.read("meta.json")).fields
+
+    def legacy_features(
+        self,
+        *,
+        filter: Sequence[Tuple[str, str, Any]] = (),
+        intersects: Union[Geometry, None] = None,
+    ) -> Iterator[LegacyFeature]:
+        layer = self.feature_layer
+        layer_keynames = {f.keyname for f in layer.fields}
+        keynames = [f.keyname for f in self.legacy_fields() if f.keyname in layer_keynames]
+
+        query = layer.feature_query()
+        query.fields(*keynames)
+        query.geom()
+        query.srs(SRS.filter_by(id=4326).one())
+        if len(filter) > 0:
+            query.filter(*filter)
+        if intersects is not None:
+            query.intersects(intersects)
+
+        for feature in query():
+            geom = feature.geom
+            yield LegacyFeature(
+                id=feature.id,
+                geometry=mapping(geom.shape) if geom is not None else None,
+                properties=feature.fields,
+            )
+
+    def distinct_values(
+        self,
+        keynames: Sequence[str],
+        *,
+        limit: int,
+        offset: int = 0,
+    ) -> List[Tuple[Tuple[Any, ...], int]]:
+        query = self.feature_layer.feature_query()
+        query.fields(*keynames)
+
+        if not IFeatureQueryOrderBy.providedBy(query):
+            counter: Counter[Tuple[Any, ...]] = Counter()
+            for feature in query():
+                values = tuple(feature.fields[k] for k in keynames)
+                if values[0] is None:
+                    continue
+                if values not in counter and len(counter) >= DISTINCT_MAX_KEYS:
+                    raise ValidationError(
+                        gettextf("Fields have more than {} distinct values.").format(
+                            DISTINCT_MAX_KEYS
+                        )
+                    )
+                counter[values] += 1
+            return counter.most_common(offset + limit)[offset:]
+
+        # Equal values are adjacent in the ordered stream, so only the top
+        # offset + limit runs are kept in memory
+        query.order_by(*(("asc", k) for k in keynames))
+        rows = (tuple(feature.fields[k] for k in keynames) for feature in query())
+        runs = (
+            (values, sum(1 for _ in group), seq)
+            for seq, (values, group) in enumerate(groupby(rows))
+            if values[0] is not None
+        )
+        top = nlargest(offset + limit, runs, key=lambda r: (r[1], -r[2]))
+        return [(values, count) for values, count, _ in top[offset:]]
+
+    def write_ngfp(
+        self,
+        fileobj: IO[bytes],
+        *,
+        features: Union[Iterable[LegacyFeature], None] = None,
+        pretty: bool = True,
+        compression: int = ZIP_DEFLATED,
+        compresslevel: Union[int, None] = None,
+    ) -> None:
+        if (value := self.value) is not None:
+            value.write_legacy(
+                fileobj,
+                self.display_name,
+                pretty=pretty,
+                compression=compression,
+                compresslevel=compresslevel,
+                features=features,
+            )
+            return
+
+        with (
+            ZipFile(self.ngfp_fileobj.filename(), "r") as src,
+            ZipFile(fileobj, "w", compression, compresslevel=compresslevel) as zf,
+        ):
+            for fn in ("meta.json", "form.json"):
+                zf.writestr(fn, src.read(fn))
+            with zf.open("data.geojson", "w") as fd:
+                legacy_write_features(fd, features if features is not None else ())
+
+
+NGFPJobStatus = Literal["pending", "done", "failed"]
+
+
+class FormbuilderNGFPJobNotFound(UserException):
+    title = gettext("NGFP conversion job not found")
+    message = gettext("The NGFP conversion job was not found or has expired.")
+    http_status_code = 404
+
+
+class FormbuilderNGFPJob(Base):
+    __tablename__ = "formbuilder_ngfp_job"
+
+    id: Mapped[UUID] = mapped_column(sa.Uuid, primary_key=True)
+    user_id: Mapped[int] = mapped_column(sa.ForeignKey(User.id, ondelete="CASCADE"))
+    status: Mapped[NGFPJobStatus] = mapped_column(sa.Unicode)
+    tstamp: Mapped[datetime]
+    value: Mapped[FormbuilderFormValue | None] = mapped_column(Msgspec(FormbuilderFormValue))
+    error: Mapped[str | None] = mapped_column(sa.Unicode)
+
+
+class FormbuilderArtifact(Base):
+    __tablename__ = "formbuilder_artifact"
+
+    kind: Mapped[str] = mapped_column(sa.Unicode, primary_key=True)
+    key: Mapped[str] = mapped_column(sa.Unicode, primary_key=True)
+    fileobj_id: Mapped[int] = mapped_column(sa.ForeignKey(FileObj.id))
+    size: Mapped[int] = mapped_column(sa.BigInteger)
+    tstamp: Mapped[datetime]
+
+    __table_args__ = (sa.Index("formbuilder_artifact_tstamp_idx", "tstamp"),)
+
+
+class FormbuilderFormElement(Base):
+    __tablename__ = "formbuilder_form_element"
+
+    resource_id: Mapped[int] = mapped_column(
+        sa.ForeignKey(FormbuilderForm.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    path: Mapped[str] = mapped_column(sa.Unicode, primary_key=True)
+    position: Mapped[int]
+    tag: Mapped[str] = mapped_column(sa.Unicode)
+    attrs: Mapped[Dict[str, Any]] = mapped_column(JSONB)
+
+    __table_args__ = (
+        sa.Index("formbuilder_form_element_position_idx", "resource_id", "position"),
+        sa.Index("formbuilder_form_element_tag_idx", "tag"),
+        sa.Index(
+            "formbuilder_form_element_attrs_idx",
+            "attrs",
+            postgresql_using="gin",
+            postgresql_ops={"attrs": "jsonb_path_ops"},
+        ),
+    )
+
+    resource: Mapped[FormbuilderForm] = orm.relationship()
+
+
+def index_elements(
+    obj: FormbuilderForm,
+    value: Union[FormbuilderFormValue, None],
+) -> None:
+    if obj.id is not None:
+        FormbuilderFormElement.filter_by(resource_id=obj.id).delete(synchronize_session=False)
+    if value is None:
+        return
+    # Position follows the document order, unlike paths compared as strings
+    for position, (path, tag, attrs) in enumerate(value.element_index()):
+        FormbuilderFormElement(
+            resource=obj,
+            path=path,
+            position=position,
+            tag=tag,
+            attrs=attrs,
+        ).persist()
+
+
+def schema_stale() -> sa.ColumnElement[bool]:
+    """Condition of forms bound to an outdated parent layer schema
+
+    For example, all such forms are selected by a single query:
+    sa.select(FormbuilderForm.id).where(schema_stale())"""
+
+    fingerprint = layer_schema_fingerprint(FormbuilderForm.parent_id)
+    return sa.and_(
+        FormbuilderForm.schema_fingerprint.isnot(None),
+        FormbuilderForm.schema_fingerprint != fingerprint,
+    )
+
+
+class FormbuilderSchemaConflict(UserException):
+    title = gettext("Form is out of date")
+    message = gettextf(
+        "Fields {} bound to the form elements were removed from the parent "
+        "layer or their data types were changed. Update the form to match "
+        "the layer."
+    )
+    http_status_code = 409
+
+    def __init__(self, keynames: Sequence[str]):
+        super().__init__(message=self.message.format(", ".join(keynames)))
+
+
+class FormbuilderRevisionNotFound(UserException):
+    title = gettext("Form revision not found")
+    message = gettextf("Form revision {} was not found.")
+    http_status_code = 404
+
+    def __init__(self, revision: int):
+        super().__init__(message=self.message.format(revision))
+
+
+class FormbuilderFormRevision(Base):
+    __tablename__ = "formbuilder_form_revision"
+
+    resource_id: Mapped[int] = mapped_column(
+        sa.ForeignKey(FormbuilderForm.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    revision: Mapped[int] = mapped_column(primary_key=True)
+    tstamp: Mapped[datetime]
+    snapshot: Mapped[FormbuilderFormValue | None] = mapped_column(Msgspec(FormbuilderFormValue))
+    delta: Mapped[RevisionDelta | None] = mapped_column(Msgspec(RevisionDelta))
+
+    resource: Mapped[FormbuilderForm] = orm.relationship()
+
+
+def record_revision(
+    obj: FormbuilderForm,
+    previous: Union[FormbuilderFormValue, None],
+) -> None:
+    value = obj.value
+    if value is None or value == previous:
+        return
+
+    R = FormbuilderFormRevision
+    last = last_snapshot = None
+    if obj.id is not None:
+        # Concurrent saves of the form wait here until the first one commits,
+        # then see its revision
+        F = FormbuilderForm
+        DBSession.execute(sa.select(F.id).where(F.id == obj.id).with_for_update())
+
+        last, last_snapshot = (
+            DBSession.query(
+                sa.func.max(R.revision),
+                sa.func.max(R.revision).filter(R.snapshot.isnot(None)),
+            )
+            .filter(R.resource_id == obj.id)
+            .one()
+        )
+
+    revision = 1 if last is None else last + 1
+    if last is None or previous is None:
+        delta = None
+    else:
+        delta = delta_between(flatten(previous), flatten(value))
+
+    interval = env.formbuilder.options["revision.snapshot_interval"]
+    if delta is None or last_snapshot is None or revision - last_snapshot >= interval:
+        snapshot = value
+    else:
+        snapshot = None
+
+    R(
+        resource=obj,
+        revision=revision,
+        tstamp=datetime.now(timezone.utc).replace(tzinfo=None),
+        snapshot=snapshot,
+        delta=delta,
+    ).persist()
+
+
+def revision_value(obj: FormbuilderForm, revision: int) -> FormbuilderFormValue:
+    R = FormbuilderFormRevision
+    snapshot_rev = (
+        DBSession.query(sa.func.max(R.revision))
+        .filter(
+            R.resource_id == obj.id,
+            R.snapshot.isnot(None),
+            R.revision <= revision,
+        )
+        .scalar()
+    )
+    if snapshot_rev is None:
+        raise FormbuilderRevisionNotFound(revision)
+
+    rows = (
+        R.filter(R.resource_id == obj.id, R.revision.between(snapshot_rev, revision))
+        .order_by(R.revision)
+        .all()
+    )
+    if rows[-1].revision != revision:
+        raise FormbuilderRevisionNotFound(revision)
+    elif len(rows) == 1:
+        return rows[0].snapshot
+
+    nodes = flatten(rows[0].snapshot)
+    for row in rows[1:]:
+        delta_apply(nodes, row.delta)
+    return msgspec_convert(unflatten(nodes), FormbuilderFormValue)
+
+
+def revision_changes(obj: FormbuilderForm, base: int, target: int) -> List[RevisionChange]:
+    R = FormbuilderFormRevision
+    lo, hi = sorted((base, target))
+
+    rows = (
+        R.filter(R.resource_id == obj.id, R.revision.between(lo, hi))
+        .options(orm.defer(R.snapshot))
+        .order_by(R.revision)
+        .all()
+    )
+    revisions = [row.revision for row in rows]
+    for rev in (lo, hi):
+        if rev not in revisions:
+            raise FormbuilderRevisionNotFound(rev)
+
+    # Deltas are composed unless a revision starts a new history, for
+    # example after a file upload. Then both revisions are rebuilt.
+    deltas = [row.delta for row in rows[1:]]
+    if any(d is None for d in deltas):
+        delta = delta_between(
+            flatten(revision_value(obj, lo)),
+            flatten(revision_value(obj, hi)),
+        )
+    else:
+        delta = delta_compose(deltas)
+
+    if base > target:
+        delta = delta_invert(delta)
+    return delta_changes(delta)
+
+
+def validate_ngfp_file(
+    file: Path,
+    *,
+    limits: Union[NGFPLimits, None] = None,
+    budget: Union[FormbuilderBudget, None] = None,
+) -> Tuple[LegacyMeta, LegacyForm]:
+    if limits is None:
+        limits = env.formbuilder.ngfp_limits
 
-def validate_ngfp_file(file: Path):
     msg_generic = gettext("Invalid NGFP file.")
     msg_size = gettextf("NGFP file size exceeds {} bytes.")
+    msg_member_size = gettextf("NGFP file entry '{}' exceeds {} bytes uncompressed.")
+    msg_total_size = gettextf("NGFP file contents exceed {} bytes uncompressed.")
+    msg_ratio = gettextf("NGFP file entry '{}' exceeds compression ratio {}.")
+
+    # Checked before the central directory is parsed
+    if file.stat().st_size > limits.max_size:
+        raise ValidationError(msg_size(limits.max_size))
+
+    def check_member(zi: ZipInfo, size: int, total: int):
+        if size > limits.max_member_size:
+            raise ValidationError(msg_member_size(zi.filename, limits.max_member_size))
+        if total > limits.max_total_size:
+            raise ValidationError(msg_total_size(limits.max_total_size))
+        if size > NGFP_RATIO_THRESHOLD and size > zi.compress_size * limits.max_ratio:
+            raise ValidationError(msg_ratio(zi.filename, limits.max_ratio))
 
     try:
         with ZipFile(file, mode="r") as zf:
             if set(zf.namelist()) != set(NGFP_FILE_SCHEMA.keys()):
                 raise ValidationError(msg_generic)
 
-            if file.stat().st_size > NGFP_MAX_SIZE:
-                raise ValidationError(msg_size(NGFP_MAX_SIZE))
+            # Sizes declared in the central directory allow to fail before
+            # decompressing anything, actual sizes are checked while reading.
+            members = [(zf.getinfo(fn), fs) for fn, fs in NGFP_FILE_SCHEMA.items()]
+            total = 0
+            for zi, _ in members:
+                total += zi.file_size
+                check_member(zi, zi.file_size, total)
+            if budget is not None:
+                budget.check_size(sum(zi.file_size for zi, fs in members if fs is not None))
 
-            for fn, fs in NGFP_FILE_SCHEMA.items():
-                zi = zf.getinfo(fn)
-                if zi.file_size > NGFP_MAX_SIZE:
-                    raise ValidationError(msg_size(NGFP_MAX_SIZE))
+            total = 0
+            decoded = dict()
+            for zi, fs in members:
+                buf = bytearray() if fs is not None else None
+                size = 0
+                with zf.open(zi, mode="r") as fd:
+                    while chunk := fd.read(NGFP_READ_CHUNK):
+                        size += len(chunk)
+                        total += len(chunk)
+                        check_member(zi, size, total)
+                        if buf is not None:
+                            buf += chunk
 
                 if fs is not None:
-                    with zf.open(zi, mode="r") as fd:
-                        msgspec_json_decode(fd.read(), type=fs)
+                    if budget is not None:
+                        budget.check_json(buf)
+                    decoded[zi.filename] = fs.decode(buf)
     except (BadZipFile, MsgspecDecodeErrror, MsgspecValidationError):
         raise ValidationError(msg_generic)
 
+    return decoded["meta.json"], decoded["form.json"]
+
 
 class ValueAttr(SAttribute):
     def get(self, srlzr: Serializer) -> Union[FormbuilderFormValue, None]:
         return super().get(srlzr)
 
     def set(self, srlzr: Serializer, value: FormbuilderFormValue, *, create: bool):
-        value.validate()
-        srlzr.obj.value = value
-        srlzr.obj.ngfp_fileobj = None
+        srlzr.obj.update_value(value)
 
 
 class FileUploadAttr(SAttribute):
     def set(self, srlzr: Serializer, value: FileUploadRef, *, create: bool):
+        from .job import convert_ngfp_upload
+
         file = value()
-        validate_ngfp_file(file.data_path)
+        indexed = convert_ngfp_upload(file.data_path)
+
+        with file.data_path.open("rb") as fd:
+            srlzr.obj.content_hash = file_digest(fd, "sha256").hexdigest()
+        srlzr.obj.content_size = file.data_path.stat().st_size
+
         srlzr.obj.ngfp_fileobj = file.to_fileobj()
         srlzr.obj.value = None
+        index_elements(srlzr.obj, indexed)
 
 
 class UpdateFieldsAttr(SAttribute):
@@ -287,17 +1166,9 @@ class FormbuilderFormSerializer(Serializer, resource=FormbuilderForm):
             raise ValidationError("'value' and 'file_upload' attributes should not pass together.")
         super().deserialize()
 
-
-def _check_number(text: str, is_real: bool) -> bool:
-    if is_real:
-        try:
-            v = float(text)
-        except ValueError:
-            return False
-        return math.isfinite(v)
-
-    try:
-        int(text)
-    except ValueError:
-        return False
-    return True
+        # After fields are possibly added to the parent by update_feature_layer_fields
+        if any(
+            getattr(self.data, attr) is not UNSET
+            for attr in ("value", "file_upload", "update_feature_layer_fields")
+        ):
+            self.obj.bind_schema()
@@ -1,4 +1,3 @@
-import { cloneDeep } from "lodash-es";
 import { action, observable } from "mobx";
 
 import type { FeatureLayerGeometryType } from "@nextgisweb/feature-layer/type/api";
@@ -16,7 +15,9 @@ import type {
   UIListItem,
   UITab,
 } from "./type";
-import { updateElementById } from "./util/updateElementById";
+import { EditorHistory } from "./util/history";
+import type { EditorHistoryOptions } from "./util/history";
+import { replaceListById, updateElementById } from "./util/updateElementById";
 
 export interface FormbuilderEditorField extends FormbuilderField {
   existing: boolean;
@@ -29,13 +30,20 @@ export interface FormbuilderValue {
   geometryType: FeatureLayerGeometryType;
 }
 
+interface EditorState {
+  tree: FormBuilderUIData;
+  fields: FormbuilderEditorField[];
+}
+
 export class FormbuilderEditorStore {
-  @observable.shallow accessor inputsTree: FormBuilderUIData = {
+  // Trees and field lists are replaced on every edit and never mutated, which
+  // lets history keep previous states sharing unchanged parts
+  @observable.ref accessor inputsTree: FormBuilderUIData = {
     listId: 0,
     list: [],
   };
   @observable.ref accessor geometryType: FeatureLayerGeometryType = "POINT";
-  @observable.shallow accessor fields: FormbuilderEditorField[] = [];
+  @observable.ref accessor fields: FormbuilderEditorField[] = [];
   @observable.ref accessor canUpdateFields: boolean = false;
   @observable.ref accessor updateFeatureLayerFields: boolean = false;
 
@@ -55,18 +63,89 @@ export class FormbuilderEditorStore {
 
   @observable.ref accessor editable: boolean = true;
 
+  @observable.ref accessor canUndo: boolean = false;
+  @observable.ref accessor canRedo: boolean = false;
+
+  private history: EditorHistory<EditorState>;
+  private pendingRecord: { key?: string } | null = null;
+
   constructor({
     onChange,
     setDirty,
     editable = true,
+    history,
   }: {
     onChange?: (val: FormbuilderValue) => void;
     setDirty?: (val: boolean) => void;
     editable?: boolean;
+    history?: EditorHistoryOptions;
   } = {}) {
     this.onChange = onChange ?? null;
     this.setDirty = setDirty ?? null;
     this.editable = editable;
+    this.history = new EditorHistory(history);
+    this.history.reset({ tree: this.inputsTree, fields: this.fields });
+  }
+
+  /** Start history over, e.g. after loading a form */
+  @action.bound
+  resetHistory() {
+    this.pendingRecord = null;
+    this.history.reset({ tree: this.inputsTree, fields: this.fields });
+    this.updateHistoryState();
+  }
+
+  @action.bound
+  undo() {
+    this.flushRecord();
+    this.restore(this.history.undo());
+  }
+
+  @action.bound
+  redo() {
+    this.flushRecord();
+    this.restore(this.history.redo());
+  }
+
+  private restore(state: EditorState | undefined) {
+    if (!state) return;
+    this.inputsTree = state.tree;
+    this.fields = state.fields;
+
+    // Selected element may be gone or replaced by its other version
+    const selectedId = this.selectedInput?.id;
+    this.selectedInput =
+      selectedId !== undefined ? this.getElementById(selectedId) : null;
+
+    this.updateHistoryState();
+    this.fireOnChange();
+    this.setDirty?.(true);
+  }
+
+  // Changes made synchronously, like removing and inserting an element while
+  // moving it, are recorded as a single undo step
+  private record(key?: string) {
+    if (this.pendingRecord) {
+      if (this.pendingRecord.key !== key) this.pendingRecord.key = undefined;
+      return;
+    }
+    this.pendingRecord = { key };
+    queueMicrotask(this.flushRecord);
+  }
+
+  @action.bound
+  private flushRecord() {
+    const pending = this.pendingRecord;
+    if (!pending) return;
+    this.pendingRecord = null;
+    const state = { tree: this.inputsTree, fields: this.fields };
+    this.history.record(state, pending.key);
+    this.updateHistoryState();
+  }
+
+  private updateHistoryState() {
+    this.canUndo = this.history.canUndo;
+    this.canRedo = this.history.canRedo;
   }
 
   @action.bound
@@ -89,12 +168,8 @@ export class FormbuilderEditorStore {
   @action.bound
   setInputsTree(inputs: FormBuilderUIData) {
     this.inputsTree = inputs;
-    this.onChange?.({
-      tree: inputs,
-      fields: this.fields,
-      updateFeatureLayerFields: this.updateFeatureLayerFields,
-      geometryType: this.geometryType,
-    });
+    this.record();
+    this.fireOnChange();
   }
 
   @action.bound
@@ -150,11 +225,15 @@ export class FormbuilderEditorStore {
     this.canUpdateFields = hasIFE && permissions.resource.update;
     this.updateFeatureLayerFields = this.canUpdateFields && absent.length === 0;
     this.setFields([...existing, ...absent]); // Will fire onChange event
+
+    // Merged fields aren't a user's change to undo
+    this.resetHistory();
   }
 
   @action.bound
   setFields(fields: FormbuilderEditorField[]) {
     this.fields = fields;
+    this.record();
     this.fireOnChange();
   }
 
@@ -173,6 +252,7 @@ export class FormbuilderEditorStore {
         return field;
       }
     });
+    this.record(`field:${keyname}`);
     this.fireOnChange();
   }
 
@@ -291,52 +371,8 @@ export class FormbuilderEditorStore {
 
   @action.bound
   setListById(id: number, newList: UIListItem[]) {
-    function setListByIdInner(
-      data: FormBuilderUIData | UIListItem | UITab,
-      targetListId: number,
-      newList: UIListItem[]
-    ): boolean {
-      if (
-        Object.keys(data).includes("listId") &&
-        (data as FormBuilderUIData).listId === targetListId
-      ) {
-        (data as FormBuilderUIData).list = newList;
-        return true;
-      }
-
-      if (
-        Object.keys(data).includes("list") &&
-        (data as FormBuilderUIData).list
-      ) {
-        for (const item of (data as FormBuilderUIData).list) {
-          if (setListByIdInner(item, targetListId, newList)) {
-            return true;
-          }
-        }
-      }
-
-      if (
-        (data as UIListItem).value &&
-        Object.keys((data as UIListItem).value).includes("tabs")
-      ) {
-        const tabs = (data as UIListItem).value.tabs;
-
-        if (tabs) {
-          for (const tab of tabs) {
-            if (setListByIdInner(tab.items, targetListId, newList)) {
-              return true;
-            }
-          }
-        }
-      }
-
-      return false;
-    }
-
-    const treeDeepClone = cloneDeep(this.inputsTree);
-    setListByIdInner(treeDeepClone, id, newList);
-
-    this.inputsTree = treeDeepClone;
+    this.inputsTree = replaceListById(this.inputsTree, id, newList);
+    this.record();
     this.fireOnChange();
   }
 
@@ -345,6 +381,7 @@ export class FormbuilderEditorStore {
     this.inputsTree = updateElementById(this.inputsTree, id, (element) => {
       element.data = newData;
     });
+    this.record(`element:${id}`);
     this.fireOnChange();
   }
 
@@ -353,6 +390,7 @@ export class FormbuilderEditorStore {
     this.inputsTree = updateElementById(this.inputsTree, id, (element) => {
       element.value = newValue;
     });
+    this.record(`element:${id}`);
     this.fireOnChange();
   }
 
@@ -1,6 +1,6 @@
 import classNames from "classnames";
 import { observer } from "mobx-react-lite";
-import { useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 
 import { useThemeVariables } from "@nextgisweb/gui/hook";
 import { route } from "@nextgisweb/pyramid/api/route";
@@ -15,6 +15,7 @@ import { ElementsPanel } from "./component/ElementsPanel";
 import { FieldsPanel } from "./component/FieldsPanel";
 import { Mockup, getInputElement } from "./component/Mockup";
 import { PropertiesPanel } from "./component/PropertiesPanel";
+import { VirtualScrollContext } from "./component/VirtualList";
 import { isNonFieldElement } from "./element";
 import { getNewFieldKeynamePostfix } from "./util/newFieldKeyname";
 import { convertToUIData } from "./util/serializeData";
@@ -53,6 +54,9 @@ export const FormbuilderEditorWidget = observer<FormbuilderEditorWidgetProps>(
       store.setEditable(editable);
     }, [editable, store]);
 
+    const mockupBodyRef = useRef<HTMLDivElement>(null);
+    const getMockupBody = useCallback(() => mockupBodyRef.current, []);
+
     const { fields, dragPos, dragging, isMoving, inputsTree, grabbedInput } =
       store;
 
@@ -78,9 +82,36 @@ export const FormbuilderEditorWidget = observer<FormbuilderEditorWidgetProps>(
           store.getNewListIndex
         );
         store.setInputsTree(tree);
+        store.resetHistory();
       }
     }, [store, value]);
 
+    useEffect(() => {
+      if (!editable) return;
+      const handleKeyDown = (e: KeyboardEvent) => {
+        if (!(e.ctrlKey || e.metaKey) || e.altKey) return;
+
+        // Inputs have their own undo for typed text
+        const target = e.target as HTMLElement | null;
+        if (target?.closest("input, textarea, [contenteditable=true]")) return;
+
+        const key = e.key.toLowerCase();
+        if (key === "z" && !e.shiftKey) {
+          store.undo();
+        } else if ((key === "z" && e.shiftKey) || key === "y") {
+          store.redo();
+        } else {
+          return;
+        }
+        e.preventDefault();
+      };
+
+      document.addEventListener("keydown", handleKeyDown);
+      return () => {
+        document.removeEventListener("keydown", handleKeyDown);
+      };
+    }, [editable, store]);
+
     useEffect(() => {
       const handleMouseMove = (e: MouseEvent) => {
         if (!store.dragging) return;
@@ -220,8 +251,10 @@ export const FormbuilderEditorWidget = observer<FormbuilderEditorWidgetProps>(
               <MoreVertIcon />
             </div>
             <div className="mockup-body-container">
-              <div className="mockup-body">
-                <Mockup inputsWithId={inputsTree} store={store} />
+              <div ref={mockupBodyRef} className="mockup-body">
+                <VirtualScrollContext.Provider value={getMockupBody}>
+                  <Mockup inputsWithId={inputsTree} store={store} />
+                </VirtualScrollContext.Provider>
               </div>
             </div>
           </div>
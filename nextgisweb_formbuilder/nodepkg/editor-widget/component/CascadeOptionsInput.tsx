@@ -17,6 +17,7 @@ import {
 } from "../util/csvOptions";
 
 import { OptionsModal } from "./OptionsModal";
+import { VIRTUAL_THRESHOLD } from "./VirtualList";
 import { OptionsEdiTableStore } from "./SimpleTableStores";
 import type { OptionsRow } from "./SimpleTableStores";
 
@@ -362,6 +363,7 @@ export const CascadeOptionsInput = observer(
             styles={{ root: { flex: "1 0" } }}
             card={true}
             parentHeight={true}
+            virtual={store.rows.length >= VIRTUAL_THRESHOLD}
             store={store}
             columns={columns || []}
             rowKey="key"
@@ -377,6 +379,7 @@ export const CascadeOptionsInput = observer(
               card={true}
               styles={{ root: { flex: "1 0" } }}
               parentHeight={true}
+              virtual={dependentStore.rows.length >= VIRTUAL_THRESHOLD}
               store={dependentStore}
               columns={depColumns || []}
               rowKey="key"
@@ -1,5 +1,6 @@
 import { observer } from "mobx-react-lite";
 
+import { Button, Space } from "@nextgisweb/gui/antd";
 import { gettext } from "@nextgisweb/pyramid/i18n";
 
 import { FormElement } from "../FormElement";
@@ -7,13 +8,36 @@ import type { FormbuilderEditorStore } from "../FormbuilderEditorStore";
 import { elementsData, getNewTabsElement } from "../element";
 import type { ElementData, FormElementData } from "../element";
 
+import RedoIcon from "@nextgisweb/icon/material/redo";
+import UndoIcon from "@nextgisweb/icon/material/undo";
+
 const msgHeader = gettext("Elements");
+const msgUndo = gettext("Undo");
+const msgRedo = gettext("Redo");
 
 export const ElementsPanel = observer(
   ({ store }: { store: FormbuilderEditorStore }) => {
     return (
       <div className="ngw-formbuilder-editor-widget-panel ngw-formbuilder-editor-widget-panel-elements">
-        <div className="panel-header">{msgHeader}</div>
+        <div className="panel-header">
+          {msgHeader}
+          <Space.Compact style={{ marginInlineStart: "auto" }}>
+            <Button
+              size="small"
+              title={msgUndo}
+              icon={<UndoIcon />}
+              disabled={!store.canUndo}
+              onClick={store.undo}
+            />
+            <Button
+              size="small"
+              title={msgRedo}
+              icon={<RedoIcon />}
+              disabled={!store.canRedo}
+              onClick={store.redo}
+            />
+          </Space.Compact>
+        </div>
         <div className="panel-body">
           {elementsData.map((element: ElementData) => (
             <FormElement
@@ -1,4 +1,5 @@
 import { observer } from "mobx-react-lite";
+import { useCallback, useRef } from "react";
 
 import type { FeatureLayerFieldDatatype } from "@nextgisweb/feature-layer/type/api";
 import {
@@ -23,6 +24,7 @@ import {
 } from "../util/fieldRelatedOperations";
 
 import { AddFieldModalButton } from "./AddFieldModalButton";
+import { VirtualList } from "./VirtualList";
 
 import NewUsedFieldIcon from "@nextgisweb/icon/material/add_link/outline";
 import ExistingUsedFieldIcon from "@nextgisweb/icon/material/link/outline";
@@ -36,6 +38,9 @@ const msgAddToLayer = gettext("Add absent fields to layer");
 
 export const FieldsPanel = observer(
   ({ store }: { store: FormbuilderEditorStore }) => {
+    const panelBodyRef = useRef<HTMLDivElement>(null);
+    const getPanelBody = useCallback(() => panelBodyRef.current, []);
+
     const handleFieldChange = (
       keyname: string,
       newData: Partial<FormbuilderEditorField>
@@ -147,71 +152,77 @@ export const FieldsPanel = observer(
           {msgFieldsPanelHeader}
           {store.editable && <AddFieldModalButton store={store} />}
         </div>
-        <div className="panel-body">
-          {store.fields.map((field, i) => {
-            const datatypeSelectOptions = getFilteredFieldDataTypeOptions(
-              field.keyname
-            );
-
-            const defaultValue =
-              datatypeSelectOptions.find((opt) => !opt.disabled)?.value ||
-              datatypeSelectOptions[0].value;
-
-            const deletable =
-              !field.existing &&
-              !isFieldOccupied(field.keyname, store.inputsTree);
-
-            const readOnlyField = field.existing || !store.editable;
-
-            return (
-              <div key={field.keyname + i} className="field-row">
-                <div className="status">{getStatusIcon(field)}</div>
-                <InputValue
-                  className="display-name"
-                  variant="borderless"
-                  size="small"
-                  value={field.display_name}
-                  readOnly={readOnlyField}
-                  onChange={(value) => {
-                    handleFieldChange(field.keyname, {
-                      display_name: value,
-                    });
-                  }}
-                />
-                <Select
-                  className="datatype"
-                  variant="borderless"
-                  options={datatypeSelectOptions}
-                  suffixIcon={readOnlyField ? <></> : undefined}
-                  open={readOnlyField ? false : undefined}
-                  style={readOnlyField ? { cursor: "default" } : undefined}
-                  defaultValue={defaultValue as FeatureLayerFieldDatatype}
-                  value={field.datatype}
-                  onChange={(value: FeatureLayerFieldDatatype) => {
-                    if (readOnlyField) return;
-                    handleFieldChange(field.keyname, {
-                      datatype: value,
-                    });
-                  }}
-                />
-
-                {store.editable && (
-                  <div className="action">
-                    <Button
-                      size="small"
-                      type="text"
-                      icon={
-                        deletable ? <RemoveIcon /> : <ExistingFieldLockIcon />
-                      }
-                      disabled={!deletable}
-                      style={deletable ? undefined : { cursor: "default" }}
-                      onClick={() => deleteField(field)}
-                    />
-                  </div>
-                )}
-              </div>
-            );
-          })}
+        <div ref={panelBodyRef} className="panel-body">
+          <VirtualList
+            items={store.fields}
+            estimateSize={32}
+            getScrollElement={getPanelBody}
+            getItemKey={(field, i) => field.keyname + i}
+            renderItem={(field, i) => {
+              const datatypeSelectOptions = getFilteredFieldDataTypeOptions(
+                field.keyname
+              );
+
+              const defaultValue =
+                datatypeSelectOptions.find((opt) => !opt.disabled)?.value ||
+                datatypeSelectOptions[0].value;
+
+              const deletable =
+                !field.existing &&
+                !isFieldOccupied(field.keyname, store.inputsTree);
+
+              const readOnlyField = field.existing || !store.editable;
+
+              return (
+                <div key={field.keyname + i} className="field-row">
+                  <div className="status">{getStatusIcon(field)}</div>
+                  <InputValue
+                    className="display-name"
+                    variant="borderless"
+                    size="small"
+                    value={field.display_name}
+                    readOnly={readOnlyField}
+                    onChange={(value) => {
+                      handleFieldChange(field.keyname, {
+                        display_name: value,
+                      });
+                    }}
+                  />
+                  <Select
+                    className="datatype"
+                    variant="borderless"
+                    options={datatypeSelectOptions}
+                    suffixIcon={readOnlyField ? <></> : undefined}
+                    open={readOnlyField ? false : undefined}
+                    style={readOnlyField ? { cursor: "default" } : undefined}
+                    defaultValue={defaultValue as FeatureLayerFieldDatatype}
+                    value={field.datatype}
+                    onChange={(value: FeatureLayerFieldDatatype) => {
+                      if (readOnlyField) return;
+                      handleFieldChange(field.keyname, {
+                        datatype: value,
+                      });
+                    }}
+                  />
+
+                  {store.editable && (
+                    <div className="action">
+                      <Button
+                        size="small"
+                        type="text"
+                        icon={
+                          deletable ? <RemoveIcon /> : <ExistingFieldLockIcon />
+                        }
+                        disabled={!deletable}
+                        style={deletable ? undefined : { cursor: "default" }}
+                        onClick={() => deleteField(field)}
+                      />
+                    </div>
+                  )}
+                </div>
+              );
+            }}
+          />
         </div>
         {store.editable &&
           store.fields.find((field) => !field.existing) &&
@@ -1,7 +1,7 @@
 import { Button, Modal } from "antd";
 import classNames from "classnames";
 import { observer } from "mobx-react-lite";
-import { useState } from "react";
+import { Fragment, useState } from "react";
 
 import { RemoveIcon } from "@nextgisweb/gui/icon";
 import { gettext } from "@nextgisweb/pyramid/i18n";
@@ -19,6 +19,7 @@ import type {
 
 import { DropPlace } from "./DropPlace";
 import { FieldPropertiesModalConent } from "./FieldPropertiesModalConent";
+import { VirtualList } from "./VirtualList";
 
 import { HolderOutlined } from "@ant-design/icons";
 
@@ -372,21 +373,29 @@ export const Mockup = observer(
 
     const { list: inputs, listId } = inputsWithId;
 
-    const renderList = store.editable
-      ? [
-          ...inputs.flatMap((input, i) => [
-            renderDropPlace(
-              store,
-              i,
-              listId,
-              setIsModalOpen,
-              setDropIndex,
-              parentId
-            ),
-            renderInputElement(store, input, i, listId),
-          ]),
-        ]
-      : inputs.map((input, i) => renderInputElement(store, input, i, listId));
+    const renderRow = (input: UIListItem, i: number) => (
+      <Fragment key={input.id ?? i}>
+        {store.editable &&
+          renderDropPlace(
+            store,
+            i,
+            listId,
+            setIsModalOpen,
+            setDropIndex,
+            parentId
+          )}
+        {renderInputElement(store, input, i, listId)}
+      </Fragment>
+    );
+
+    const renderList = (
+      <VirtualList
+        items={inputs}
+        estimateSize={40}
+        renderItem={renderRow}
+        getItemKey={(input, i) => input.id ?? i}
+      />
+    );
 
     const filterPendingFieldsOnUsage = (
       pendinNewFields: FormbuilderEditorField[]
@@ -412,7 +421,7 @@ export const Mockup = observer(
     };
 
     if (!store.editable) {
-      return <>{renderList}</>;
+      return renderList;
     }
 
     return (
@@ -420,7 +429,7 @@ export const Mockup = observer(
         {renderList}
         {renderDropPlace(
           store,
-          renderList.length - 1,
+          inputs.length,
           listId,
           setIsModalOpen,
           setDropIndex,
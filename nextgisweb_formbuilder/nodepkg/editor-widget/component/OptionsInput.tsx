@@ -13,6 +13,7 @@ import {
 } from "../util/csvOptions";
 
 import { OptionsModal } from "./OptionsModal";
+import { VIRTUAL_THRESHOLD } from "./VirtualList";
 import { OptionsEdiTableStore } from "./SimpleTableStores";
 import type { OptionsRow } from "./SimpleTableStores";
 
@@ -102,6 +103,7 @@ export const OptionsInput = observer(
             size="small"
             card={true}
             parentHeight={true}
+            virtual={store.rows.length >= VIRTUAL_THRESHOLD}
             store={store}
             columns={columns || []}
             rowKey="key"
@@ -126,7 +126,6 @@ export const TabsFormComponent = observer(
 
       const updatedTabs = deepClonedTabs.map((tab: UITab, index: number) => {
         if (index === currentTabIndex) {
-          tab.active = true;
           return { ...tab, active: true };
         } else {
           return { ...tab, active: false };
@@ -0,0 +1,108 @@
+import { useVirtualizer } from "@tanstack/react-virtual";
+import {
+  createContext,
+  useContext,
+  useLayoutEffect,
+  useRef,
+  useState,
+} from "react";
+import type { Key, ReactNode } from "react";
+
+export type ScrollElementGetter = () => HTMLElement | null;
+
+export const VirtualScrollContext = createContext<ScrollElementGetter>(
+  () => null
+);
+
+// Lists shorter than this are rendered as is, so the usual forms keep
+// their markup and drag-and-drop behavior
+export const VIRTUAL_THRESHOLD = 100;
+
+interface VirtualListProps<T> {
+  items: T[];
+  estimateSize: number;
+  renderItem: (item: T, index: number) => ReactNode;
+  getItemKey?: (item: T, index: number) => Key;
+  getScrollElement?: ScrollElementGetter;
+  threshold?: number;
+  overscan?: number;
+}
+
+function VirtualizedList<T>({
+  items,
+  estimateSize,
+  renderItem,
+  getItemKey,
+  getScrollElement,
+  overscan = 10,
+}: VirtualListProps<T> & { getScrollElement: ScrollElementGetter }) {
+  const listRef = useRef<HTMLDivElement>(null);
+  const [scrollMargin, setScrollMargin] = useState(0);
+
+  // Nested lists share the scroll element with the enclosing list, their
+  // offset inside the scroll element is needed to compute visible range
+  useLayoutEffect(() => {
+    const scrollEl = getScrollElement();
+    const listEl = listRef.current;
+    if (!scrollEl || !listEl) return;
+    const offset =
+      listEl.getBoundingClientRect().top -
+      scrollEl.getBoundingClientRect().top +
+      scrollEl.scrollTop;
+    setScrollMargin(offset);
+  });
+
+  const virtualizer = useVirtualizer({
+    count: items.length,
+    getScrollElement,
+    estimateSize: () => estimateSize,
+    getItemKey: getItemKey
+      ? (index) => getItemKey(items[index], index)
+      : undefined,
+    overscan,
+    scrollMargin,
+  });
+
+  return (
+    <div
+      ref={listRef}
+      style={{
+        position: "relative",
+        flexShrink: 0,
+        height: virtualizer.getTotalSize(),
+      }}
+    >
+      {virtualizer.getVirtualItems().map((row) => (
+        <div
+          key={row.key}
+          data-index={row.index}
+          ref={virtualizer.measureElement}
+          style={{
+            position: "absolute",
+            top: 0,
+            left: 0,
+            width: "100%",
+            transform: `translateY(${row.start - scrollMargin}px)`,
+          }}
+        >
+          {renderItem(items[row.index], row.index)}
+        </div>
+      ))}
+    </div>
+  );
+}
+
+export function VirtualList<T>({
+  getScrollElement: getScrollElementProp,
+  threshold = VIRTUAL_THRESHOLD,
+  ...props
+}: VirtualListProps<T>) {
+  const contextGetter = useContext(VirtualScrollContext);
+  const getScrollElement = getScrollElementProp ?? contextGetter;
+
+  if (props.items.length < threshold) {
+    return <>{props.items.map(props.renderItem)}</>;
+  }
+
+  return <VirtualizedList {...props} getScrollElement={getScrollElement} />;
+}
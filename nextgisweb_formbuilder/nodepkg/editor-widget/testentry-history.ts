@@ -0,0 +1,103 @@
+/** @testentry mocha */
+import { assert } from "chai";
+
+import { FormbuilderEditorStore } from "./FormbuilderEditorStore";
+import type { UIListItem } from "./type";
+import { replaceListById, updateElementById } from "./util/updateElementById";
+
+function textbox(id: number): UIListItem {
+  return { id, value: { type: "textbox" }, data: { field: `f${id}` } };
+}
+
+function tabs(id: number, lists: UIListItem[][]): UIListItem {
+  return {
+    id,
+    value: {
+      type: "tabs",
+      tabs: lists.map((list, i) => ({
+        title: `Tab ${i}`,
+        active: i === 0,
+        items: { listId: id * 100 + i, list },
+      })),
+    },
+    data: {},
+  };
+}
+
+const tick = () => new Promise((resolve) => setTimeout(resolve));
+
+describe("Formbuilder editor history", () => {
+  it("shares unchanged subtrees", () => {
+    const tree = {
+      listId: 0,
+      list: [textbox(1), tabs(2, [[textbox(3)], [textbox(4)]]), textbox(5)],
+    };
+
+    const updated = updateElementById(tree, 4, (item) => {
+      item.data = { field: "changed" };
+    });
+    assert.strictEqual(updated.list[0], tree.list[0]);
+    assert.strictEqual(updated.list[2], tree.list[2]);
+    const [before, after] = [tree.list[1], updated.list[1]];
+    assert.strictEqual(after.value.tabs![0], before.value.tabs![0]);
+    assert.notStrictEqual(after.value.tabs![1], before.value.tabs![1]);
+    assert.deepEqual(tree.list[1].value.tabs![1].items.list[0].data, {
+      field: "f4",
+    });
+
+    const replaced = replaceListById(tree, 200, []);
+    assert.strictEqual(replaced.list[0], tree.list[0]);
+    assert.lengthOf(replaced.list[1].value.tabs![0].items.list, 0);
+    assert.lengthOf(tree.list[1].value.tabs![0].items.list, 1);
+  });
+
+  it("undoes and redoes edits", async () => {
+    const store = new FormbuilderEditorStore();
+    store.setInputsTree({ listId: 0, list: [textbox(1)] });
+    store.resetHistory();
+    const loaded = store.inputsTree;
+
+    // Removal and insertion while moving is a single step
+    store.setListById(0, []);
+    store.setListById(0, [textbox(1), textbox(2)]);
+    await tick();
+    const moved = store.inputsTree;
+    assert.isTrue(store.canUndo);
+
+    store.undo();
+    assert.strictEqual(store.inputsTree, loaded);
+    assert.isFalse(store.canUndo);
+    store.redo();
+    assert.strictEqual(store.inputsTree, moved);
+    assert.isFalse(store.canRedo);
+  });
+
+  it("coalesces edits of an element", async () => {
+    const store = new FormbuilderEditorStore();
+    store.setInputsTree({ listId: 0, list: [textbox(1)] });
+    store.resetHistory();
+
+    for (const field of ["a", "ab", "abc"]) {
+      store.setNewElementData(1, { field });
+      await tick();
+    }
+    store.undo();
+    assert.isFalse(store.canUndo);
+    assert.deepEqual(store.inputsTree.list[0].data, { field: "f1" });
+  });
+
+  it("keeps memory within the limit", async () => {
+    const maxBytes = 64 * 1024;
+    const store = new FormbuilderEditorStore({ history: { maxBytes } });
+    const list = Array.from({ length: 1000 }, (_, i) => textbox(i));
+    store.setInputsTree({ listId: 0, list });
+    store.resetHistory();
+
+    for (let i = 0; i < 200; i++) {
+      store.setNewElementData(i, { field: "x".repeat(1000) });
+      await tick();
+    }
+    assert.isBelow(store["history"].size, maxBytes);
+    assert.isTrue(store.canUndo);
+  });
+});
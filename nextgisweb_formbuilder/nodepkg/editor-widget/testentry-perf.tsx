@@ -0,0 +1,46 @@
+/** @testentry mocha */
+import { assert } from "chai";
+import { act } from "react";
+import { createRoot } from "react-dom/client";
+
+import { FormbuilderEditorWidget } from "./FormbuilderEditorWidget";
+import { syntheticForm } from "./util/syntheticForm";
+
+// Time from mount to the first idle frame, generous enough for CI runners
+const TTI_BUDGET = 3000;
+
+describe("Formbuilder editor with a huge form", function () {
+  this.timeout(60000);
+
+  it("opens within the time budget", async () => {
+    const value = syntheticForm({ items: 5000, options: 20000 });
+
+    const container = document.createElement("div");
+    document.body.appendChild(container);
+    const root = createRoot(container);
+
+    const start = performance.now();
+    await act(async () => {
+      root.render(<FormbuilderEditorWidget value={{ value }} />);
+    });
+    await new Promise((resolve) => {
+      requestAnimationFrame(() => setTimeout(resolve));
+    });
+    const elapsed = performance.now() - start;
+
+    const rendered = container.querySelectorAll(
+      ".ngw-formbuilder-editor-widget-mockup-element-wrapper"
+    ).length;
+
+    console.log(`Time-to-interactive ${elapsed.toFixed(0)} ms`);
+    console.log(`Rendered ${rendered} of ${value.items.length} items`);
+
+    try {
+      assert.isBelow(rendered, 200);
+      assert.isBelow(elapsed, TTI_BUDGET);
+    } finally {
+      act(() => root.unmount());
+      container.remove();
+    }
+  });
+});
@@ -0,0 +1,140 @@
+export interface EditorHistoryOptions {
+  /** Approximate limit of memory taken by previous states in bytes */
+  maxBytes?: number;
+  /** Edits with the same key within this interval are merged into one */
+  coalesceMs?: number;
+}
+
+interface HistoryEntry<T> {
+  state: T;
+  size: number;
+  key?: string;
+  time: number;
+}
+
+const OBJECT_OVERHEAD = 16;
+const REFERENCE_SIZE = 8;
+
+/**
+ * Estimate memory taken by a value excluding objects already in seen
+ *
+ * States are updated immutably, so unchanged subtrees are shared between
+ * them. Only objects first appeared in a state are counted and traversed,
+ * which keeps the estimate proportional to the size of a change.
+ */
+export function estimateSize(value: unknown, seen: WeakSet<object>): number {
+  if (typeof value === "string") return OBJECT_OVERHEAD + value.length * 2;
+  if (value === null || typeof value !== "object") return REFERENCE_SIZE;
+  if (seen.has(value)) return REFERENCE_SIZE;
+  seen.add(value);
+
+  let size = OBJECT_OVERHEAD;
+  const children = Array.isArray(value) ? value : Object.values(value);
+  for (const child of children) {
+    size += REFERENCE_SIZE + estimateSize(child, seen);
+  }
+  return size;
+}
+
+/** Undo and redo stacks of immutable states sharing unchanged parts */
+export class EditorHistory<T extends object> {
+  readonly maxBytes: number;
+  readonly coalesceMs: number;
+
+  private past: HistoryEntry<T>[] = [];
+  private future: HistoryEntry<T>[] = [];
+  private present: HistoryEntry<T> | null = null;
+  private seen = new WeakSet<object>();
+  private bytes = 0;
+
+  constructor({
+    maxBytes = 16 * 2 ** 20,
+    coalesceMs = 500,
+  }: EditorHistoryOptions = {}) {
+    this.maxBytes = maxBytes;
+    this.coalesceMs = coalesceMs;
+  }
+
+  get canUndo() {
+    return this.past.length > 0;
+  }
+
+  get canRedo() {
+    return this.future.length > 0;
+  }
+
+  get size() {
+    return this.bytes;
+  }
+
+  /** Forget all states and start over with the given one */
+  reset(state: T) {
+    this.past = [];
+    this.future = [];
+    this.seen = new WeakSet();
+    this.bytes = 0;
+    // The initial state is alive anyway, only changes to it count
+    estimateSize(state, this.seen);
+    this.present = { state, size: 0, time: Date.now() };
+  }
+
+  /**
+   * Record a new state after an edit
+   *
+   * If the key matches the key of the previous edit done recently, the
+   * previous state is replaced, so typing into an input produces a single
+   * undo step.
+   */
+  record(state: T, key?: string) {
+    const present = this.present;
+    if (present === null) {
+      this.reset(state);
+      return;
+    }
+    if (present.state === state) return;
+
+    for (const entry of this.future) this.bytes -= entry.size;
+    this.future = [];
+
+    const now = Date.now();
+    const entry = this.entry(state, key, now);
+    if (
+      key !== undefined &&
+      key === present.key &&
+      now - present.time < this.coalesceMs
+    ) {
+      // Objects of the replaced state are still in seen, so the estimate
+      // errs on the larger side until they are evicted
+      entry.size += present.size;
+    } else {
+      this.past.push(present);
+    }
+    this.present = entry;
+
+    while (this.bytes > this.maxBytes && this.past.length > 0) {
+      this.bytes -= this.past.shift()!.size;
+    }
+  }
+
+  undo(): T | undefined {
+    const entry = this.past.pop();
+    if (!entry) return undefined;
+    this.future.push(this.present!);
+    this.present = { ...entry, key: undefined };
+    return entry.state;
+  }
+
+  redo(): T | undefined {
+    const entry = this.future.pop();
+    if (!entry) return undefined;
+    this.past.push(this.present!);
+    this.present = { ...entry, key: undefined };
+    return entry.state;
+  }
+
+  private entry(state: T, key?: string, time = Date.now()): HistoryEntry<T> {
+    const size = estimateSize(state, this.seen);
+    this.bytes += size;
+    return { state, size, key, time };
+  }
+}
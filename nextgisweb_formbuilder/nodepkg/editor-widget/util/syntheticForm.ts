@@ -0,0 +1,37 @@
+import type { FormbuilderFormValue } from "../../legacy";
+
+export function syntheticForm({
+  items,
+  options,
+}: {
+  items: number;
+  options: number;
+}): FormbuilderFormValue {
+  const value: FormbuilderFormValue = {
+    geometry_type: "POINT",
+    fields: [],
+    items: [],
+  };
+
+  for (let i = 0; i < items; i++) {
+    const keyname = `field_${i + 1}`;
+    value.fields.push({ keyname, display_name: keyname, datatype: "STRING" });
+    value.items.push(
+      i % 10 === 0
+        ? {
+            type: "dropdown",
+            field: keyname,
+            remember: false,
+            search: true,
+            free_input: false,
+            options: Array.from({ length: options }, (_, j) => ({
+              value: `v${j}`,
+              label: `Value ${j}`,
+            })),
+          }
+        : { type: "textbox", field: keyname, remember: false, max_lines: 1 }
+    );
+  }
+
+  return value;
+}
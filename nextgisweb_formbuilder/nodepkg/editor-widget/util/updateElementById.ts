@@ -1,27 +1,62 @@
-import { traverseTree } from "@nextgisweb/gui/util/tree";
-
 import type { FormBuilderUIData, UIListItem } from "../type";
 
-import { formBuilderRelation } from "./formBuilderRelation";
+type ListUpdater = (data: FormBuilderUIData) => FormBuilderUIData | null;
+
+// Copies only the path from the root to the updated list, everything else is
+// shared with the original tree. Returns null if nothing was updated.
+function updateList(
+  data: FormBuilderUIData,
+  updater: ListUpdater
+): FormBuilderUIData | null {
+  const own = updater(data);
+  if (own) return own;
+
+  for (let i = 0; i < data.list.length; i++) {
+    const item = data.list[i];
+    const tabs = item.value?.tabs;
+    if (!tabs) continue;
+
+    for (let j = 0; j < tabs.length; j++) {
+      const items = updateList(tabs[j].items, updater);
+      if (!items) continue;
+
+      const newTabs = tabs.slice();
+      newTabs[j] = { ...tabs[j], items };
+      const list = data.list.slice();
+      list[i] = { ...item, value: { ...item.value, tabs: newTabs } };
+      return { ...data, list };
+    }
+  }
+
+  return null;
+}
 
 export function updateElementById(
   tree: FormBuilderUIData,
   id: number,
   updater: (item: UIListItem) => void
-) {
-  const clonedTree: FormBuilderUIData = {
-    ...tree,
-    list: [...tree.list],
-  };
-  traverseTree(
-    clonedTree.list,
-    (item) => {
-      if (item.id === id) {
-        updater(item);
-        return true;
-      }
-    },
-    formBuilderRelation
+): FormBuilderUIData {
+  const updated = updateList(tree, (data) => {
+    const idx = data.list.findIndex((item) => item.id === id);
+    if (idx < 0) return null;
+
+    // The updater receives a copy, so it's safe to assign its properties
+    const item = { ...data.list[idx] };
+    updater(item);
+    const list = data.list.slice();
+    list[idx] = item;
+    return { ...data, list };
+  });
+  return updated ?? tree;
+}
+
+export function replaceListById(
+  tree: FormBuilderUIData,
+  listId: number,
+  list: UIListItem[]
+): FormBuilderUIData {
+  const updated = updateList(tree, (data) =>
+    data.listId === listId ? { ...data, list } : null
   );
-  return clonedTree;
+  return updated ?? tree;
 }
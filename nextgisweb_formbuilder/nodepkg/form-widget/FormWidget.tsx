@@ -3,7 +3,7 @@ import { observer } from "mobx-react-lite";
 import { useState } from "react";
 
 import { FileUploader } from "@nextgisweb/file-upload/file-uploader";
-import { Select } from "@nextgisweb/gui/antd";
+import { Button, Select, Upload } from "@nextgisweb/gui/antd";
 import { errorModal } from "@nextgisweb/gui/error";
 import { route } from "@nextgisweb/pyramid/api";
 import { gettext } from "@nextgisweb/pyramid/i18n";
@@ -12,6 +12,7 @@ import type { EditorWidget } from "@nextgisweb/resource/type";
 import { FormbuilderEditorWidget } from "../editor-widget/FormbuilderEditorWidget";
 import { isFieldOccupied } from "../editor-widget/util/fieldRelatedOperations";
 import { serializeData } from "../editor-widget/util/serializeData";
+import { parseNgfpInWorker } from "../legacy";
 
 import type { FormStore, Mode } from "./FormStore";
 
@@ -19,6 +20,7 @@ import "./FormWidget.less";
 
 const msgUploadForm = gettext("Upload form");
 const msgDesingForm = gettext("Design form");
+const msgOpenFile = gettext("Open form file");
 
 const msgUploader = {
   uploadText: gettext("Select a form file"),
@@ -40,6 +42,22 @@ export const FormWidget: EditorWidget<FormStore> = observer(({ store }) => {
   const { mode } = store;
 
   const [switchModeCounter, setSwitchModeCounter] = useState(0);
+  const [parsing, setParsing] = useState(false);
+
+  // NGFP files are converted in a web worker without a server round trip
+  const handleOpenFile = async (file: File) => {
+    setParsing(true);
+    try {
+      const value = await parseNgfpInWorker(file);
+      store.load({ value });
+      store.setDirty(true);
+    } catch (error: any) {
+      errorModal(error);
+    } finally {
+      setParsing(false);
+    }
+    return false;
+  };
 
   const handleModeChange = async (mode: Mode) => {
     const resourceId = store.composite.resourceId;
@@ -88,26 +106,35 @@ export const FormWidget: EditorWidget<FormStore> = observer(({ store }) => {
         );
       case "input":
         return (
-          <FormbuilderEditorWidget
-            key="input"
-            value={store.initEditorData}
-            parent={store.composite.parent}
-            setDirty={store.setDirty}
-            onChange={(val) => {
-              runInAction(() => {
-                const usedFields = val.fields.filter((field) =>
-                  isFieldOccupied(field.keyname, val.tree)
-                );
-
-                store.editorData = {
-                  geometryType: val.geometryType,
-                  fields: usedFields,
-                  items: serializeData(val.tree),
-                  updateFeatureLayerFields: val.updateFeatureLayerFields,
-                };
-              });
-            }}
-          />
+          <>
+            <Upload
+              accept=".ngfp"
+              showUploadList={false}
+              beforeUpload={handleOpenFile}
+            >
+              <Button loading={parsing}>{msgOpenFile}</Button>
+            </Upload>
+            <FormbuilderEditorWidget
+              key="input"
+              value={store.initEditorData}
+              parent={store.composite.parent}
+              setDirty={store.setDirty}
+              onChange={(val) => {
+                runInAction(() => {
+                  const usedFields = val.fields.filter((field) =>
+                    isFieldOccupied(field.keyname, val.tree)
+                  );
+
+                  store.editorData = {
+                    geometryType: val.geometryType,
+                    fields: usedFields,
+                    items: serializeData(val.tree),
+                    updateFeatureLayerFields: val.updateFeatureLayerFields,
+                  };
+                });
+              }}
+            />
+          </>
         );
       default:
         return null;
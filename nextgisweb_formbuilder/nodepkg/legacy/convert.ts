@@ -0,0 +1,189 @@
+import type { FormbuilderFormRead } from "@nextgisweb/formbuilder/type/api";
+
+import { zipEntries, zipRead } from "./zip";
+import type { ZipLimits } from "./zip";
+
+export type FormbuilderFormValue = NonNullable<FormbuilderFormRead["value"]>;
+
+type FormItem = FormbuilderFormValue["items"][number];
+
+export interface LegacyMeta {
+  geometry_type: FormbuilderFormValue["geometry_type"];
+  fields: FormbuilderFormValue["fields"];
+}
+
+interface LegacyOption {
+  name: string;
+  alias: string;
+  alias2?: string;
+  default?: boolean;
+  values?: LegacyOption[] | null;
+}
+
+export interface LegacyElement {
+  type: string;
+  attributes?: Record<string, any> | null;
+  pages?: { caption: string; default?: boolean; elements: LegacyElement[] }[];
+}
+
+const LEGACY_DATETIME = ["date", "time", "datetime"] as const;
+
+function options(values: LegacyOption[] | null | undefined) {
+  return (values ?? []).map((o) => ({
+    value: o.name,
+    label: o.alias,
+    ...(o.default !== undefined && { initial: o.default }),
+  }));
+}
+
+function legacyDatetime(type: number, value: string | null) {
+  if (value === null) return "CURRENT";
+  // Legacy "%Y-%m-%d %H:%M:%S" to ISO 8601 as datetime.isoformat() does
+  return type === 2 ? value.replace(" ", "T") : value;
+}
+
+export function itemFromLegacy(el: LegacyElement): FormItem {
+  const a = el.attributes ?? {};
+  switch (el.type) {
+    case "text_label":
+      return { type: "label", label: a.text };
+    case "text_edit":
+      if (a.ngid_login || a.ngw_login) {
+        const system = a.ngid_login ? "ngid_username" : "ngw_username";
+        return { type: "system", field: a.field, system };
+      }
+      return {
+        type: "textbox",
+        field: a.field,
+        remember: a.last,
+        initial: a.text,
+        max_lines: a.max_string_count,
+      };
+    case "checkbox":
+      return {
+        type: "checkbox",
+        field: a.field,
+        remember: a.last,
+        initial: a.init_value,
+        label: a.text,
+      };
+    case "date_time": {
+      const datetime = LEGACY_DATETIME[a.date_type];
+      if (datetime === undefined) {
+        throw new Error(`Unknown date_type ${a.date_type}.`);
+      }
+      return {
+        type: "datetime",
+        field: a.field,
+        remember: a.last,
+        datetime,
+        initial: legacyDatetime(a.date_type, a.datetime),
+      };
+    }
+    case "radio_group":
+      return {
+        type: "radio",
+        field: a.field,
+        remember: a.last,
+        options: options(a.values),
+      };
+    case "combobox":
+      return {
+        type: "dropdown",
+        field: a.field,
+        remember: a.last,
+        options: options(a.values),
+        search: a.input_search,
+        free_input: a.allow_adding_values,
+      };
+    case "split_combobox":
+      return {
+        type: "dropdown_dual",
+        field: a.field,
+        remember: a.last,
+        options: ((a.values ?? []) as LegacyOption[]).map((o) => ({
+          value: o.name,
+          first: o.alias,
+          second: o.alias2!,
+          ...(o.default !== undefined && { initial: o.default }),
+        })),
+        label_first: a.label1,
+        label_second: a.label2,
+      };
+    case "double_combobox":
+      return {
+        type: "cascade",
+        field_primary: a.field_level1,
+        field_secondary: a.field_level2,
+        remember: a.last,
+        options: ((a.values ?? []) as LegacyOption[]).map((o) => ({
+          ...options([o])[0],
+          items: options(o.values),
+        })),
+      };
+    case "coordinates":
+      return {
+        type: "coordinates",
+        field_lon: a.field_long,
+        field_lat: a.field_lat,
+        hidden: a.hidden,
+      };
+    case "distance":
+      return { type: "distance", field: a.field };
+    case "average_counter":
+      return { type: "average", field: a.field, samples: a.num_values };
+    case "photo":
+      return {
+        type: "photo",
+        max_count: a.gallery_size,
+        comment: a.comment,
+      };
+    case "space":
+      return { type: "spacer" };
+    case "counter":
+    case "signature":
+      return { type: "label", label: "UNSUPPORTED" };
+    case "tabs":
+      return {
+        type: "tabs",
+        tabs: (el.pages ?? []).map((p) => ({
+          title: p.caption,
+          active: p.default === true,
+          items: p.elements.map(itemFromLegacy),
+        })),
+      };
+  }
+  throw new Error(`Unknown item type ${el.type}.`);
+}
+
+export function valueFromLegacy(
+  meta: LegacyMeta,
+  form: LegacyElement[]
+): FormbuilderFormValue {
+  return {
+    geometry_type: meta.geometry_type,
+    fields: meta.fields.map(({ keyname, display_name, datatype }) => ({
+      keyname,
+      display_name,
+      datatype,
+    })),
+    items: form.map(itemFromLegacy),
+  };
+}
+
+export async function parseNgfp(
+  buffer: ArrayBuffer,
+  limits?: ZipLimits
+): Promise<FormbuilderFormValue> {
+  const entries = zipEntries(buffer, limits);
+  const read = async (name: string) => {
+    const entry = entries.get(name);
+    if (entry === undefined) throw new Error(`Missing ${name} in NGFP file`);
+    return JSON.parse(new TextDecoder().decode(await zipRead(buffer, entry)));
+  };
+  const [meta, form] = await Promise.all([
+    read("meta.json"),
+    read("form.json"),
+  ]);
+  return valueFromLegacy(meta, form);
+}
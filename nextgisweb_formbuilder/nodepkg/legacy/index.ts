@@ -0,0 +1,36 @@
+import settings from "@nextgisweb/pyramid/settings!formbuilder";
+
+import type { FormbuilderFormValue } from "./convert";
+
+export { parseNgfp, valueFromLegacy } from "./convert";
+export type { FormbuilderFormValue } from "./convert";
+export type { ZipLimits } from "./zip";
+
+export async function parseNgfpInWorker(
+  file: Blob
+): Promise<FormbuilderFormValue> {
+  // Checked before reading the file, the worker checks the rest
+  const limits = settings.ngfp_limits;
+  if (file.size > limits.max_size) {
+    throw new Error(`NGFP file size exceeds ${limits.max_size} bytes.`);
+  }
+  const buffer = await file.arrayBuffer();
+  const worker = new Worker(new URL("./parse.worker.ts", import.meta.url), {
+    type: "module",
+  });
+  try {
+    return await new Promise((resolve, reject) => {
+      worker.onmessage = ({ data }) => {
+        if (data.error !== undefined) {
+          reject(new Error(data.error));
+        } else {
+          resolve(data.value);
+        }
+      };
+      worker.onerror = (evt) => reject(new Error(evt.message));
+      worker.postMessage({ buffer, limits }, [buffer]);
+    });
+  } finally {
+    worker.terminate();
+  }
+}
@@ -0,0 +1,16 @@
+import { parseNgfp } from "./convert";
+import type { ZipLimits } from "./zip";
+
+interface ParseMessage {
+  buffer: ArrayBuffer;
+  limits: ZipLimits;
+}
+
+self.onmessage = async ({ data }: MessageEvent<ParseMessage>) => {
+  try {
+    self.postMessage({ value: await parseNgfp(data.buffer, data.limits) });
+  } catch (err) {
+    const error = err instanceof Error ? err.message : String(err);
+    self.postMessage({ error });
+  }
+};
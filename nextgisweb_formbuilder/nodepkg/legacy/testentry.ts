@@ -0,0 +1,82 @@
+/** @testentry mocha */
+import { assert } from "chai";
+
+import { fileUploader } from "@nextgisweb/file-upload";
+import { route } from "@nextgisweb/pyramid/api";
+
+import { parseNgfp } from "./convert";
+
+// One entry per file of test/data/elements, add new files here as well
+const ELEMENT_URL: Record<string, URL> = {
+  average_counter: new URL(
+    "../../test/data/elements/average_counter.ngfp",
+    import.meta.url
+  ),
+  checkbox: new URL("../../test/data/elements/checkbox.ngfp", import.meta.url),
+  combobox: new URL("../../test/data/elements/combobox.ngfp", import.meta.url),
+  coordinates: new URL(
+    "../../test/data/elements/coordinates.ngfp",
+    import.meta.url
+  ),
+  date: new URL("../../test/data/elements/date.ngfp", import.meta.url),
+  datetime: new URL("../../test/data/elements/datetime.ngfp", import.meta.url),
+  datetime_current: new URL(
+    "../../test/data/elements/datetime_current.ngfp",
+    import.meta.url
+  ),
+  distance: new URL("../../test/data/elements/distance.ngfp", import.meta.url),
+  double_combobox: new URL(
+    "../../test/data/elements/double_combobox.ngfp",
+    import.meta.url
+  ),
+  photo: new URL("../../test/data/elements/photo.ngfp", import.meta.url),
+  radio_group: new URL(
+    "../../test/data/elements/radio_group.ngfp",
+    import.meta.url
+  ),
+  space: new URL("../../test/data/elements/space.ngfp", import.meta.url),
+  split_combobox: new URL(
+    "../../test/data/elements/split_combobox.ngfp",
+    import.meta.url
+  ),
+  tabs: new URL("../../test/data/elements/tabs.ngfp", import.meta.url),
+  text_edit: new URL(
+    "../../test/data/elements/text_edit.ngfp",
+    import.meta.url
+  ),
+  text_edit_system: new URL(
+    "../../test/data/elements/text_edit_system.ngfp",
+    import.meta.url
+  ),
+  text_label: new URL(
+    "../../test/data/elements/text_label.ngfp",
+    import.meta.url
+  ),
+  time: new URL("../../test/data/elements/time.ngfp", import.meta.url),
+};
+
+// The expected value is converted from the same file by the server, so the
+// client converter is checked against FormbuilderFormValue.from_legacy
+async function serverValue(name: string, blob: Blob) {
+  const file = new File([blob], `${name}.ngfp`);
+  const [upload] = await fileUploader([file]);
+  const job = await route("formbuilder.ngfp_job.collection").post({
+    json: { file: { id: upload.id } },
+  });
+  for (let current = job; ; ) {
+    if (current.status === "done") return current.value;
+    if (current.status === "failed") throw new Error(current.error);
+    await new Promise((resolve) => setTimeout(resolve, 100));
+    current = await route("formbuilder.ngfp_job.item", current.id).get();
+  }
+}
+
+describe("Legacy NGFP conversion", () => {
+  for (const [name, url] of Object.entries(ELEMENT_URL)) {
+    it(name, async () => {
+      const blob = await (await fetch(url)).blob();
+      const value = await parseNgfp(await blob.arrayBuffer());
+      assert.deepEqual(value, await serverValue(name, blob));
+    });
+  }
+});
@@ -0,0 +1,228 @@
+const SIG_EOCD = 0x06054b50;
+const SIG_EOCD64 = 0x06064b50;
+const SIG_EOCD64_LOCATOR = 0x07064b50;
+const SIG_CENTRAL = 0x02014b50;
+const SIG_LOCAL = 0x04034b50;
+
+const METHOD_STORED = 0;
+const METHOD_DEFLATED = 8;
+
+const FLAG_ENCRYPTED = 0x0001;
+const EXTRA_ZIP64 = 0x0001;
+const ZIP64_MARKER = 0xffffffff;
+
+// Same as NGFP_RATIO_THRESHOLD, smaller entries are never checked for ratio
+const RATIO_THRESHOLD = 2 ** 20;
+
+/** Limits of NGFP files, the same as the server applies on upload */
+export interface ZipLimits {
+  max_size: number;
+  max_member_size: number;
+  max_total_size: number;
+  max_ratio: number;
+}
+
+export interface ZipEntry {
+  name: string;
+  method: number;
+  compressedSize: number;
+  size: number;
+  offset: number;
+}
+
+function getUint64(view: DataView, pos: number): number {
+  const value = view.getBigUint64(pos, true);
+  if (value > BigInt(Number.MAX_SAFE_INTEGER)) {
+    throw new Error("Invalid ZIP64 value");
+  }
+  return Number(value);
+}
+
+function findEndOfCentralDirectory(view: DataView): number {
+  // EOCD is 22 bytes followed by up to 64 KiB of comment
+  const min = Math.max(0, view.byteLength - 22 - 0xffff);
+  for (let pos = view.byteLength - 22; pos >= min; pos--) {
+    if (view.getUint32(pos, true) === SIG_EOCD) return pos;
+  }
+  throw new Error("Not a ZIP archive");
+}
+
+function centralDirectory(view: DataView): { count: number; pos: number } {
+  const eocd = findEndOfCentralDirectory(view);
+  const count = view.getUint16(eocd + 10, true);
+  const pos = view.getUint32(eocd + 16, true);
+  if (count !== 0xffff && pos !== ZIP64_MARKER) return { count, pos };
+
+  // ZIP64 end of central directory is referenced by a locator right
+  // before the regular one
+  const locator = eocd - 20;
+  if (locator < 0 || view.getUint32(locator, true) !== SIG_EOCD64_LOCATOR) {
+    throw new Error("Invalid ZIP64 end of central directory");
+  }
+  const eocd64 = getUint64(view, locator + 8);
+  if (view.getUint32(eocd64, true) !== SIG_EOCD64) {
+    throw new Error("Invalid ZIP64 end of central directory");
+  }
+  return {
+    count: getUint64(view, eocd64 + 32),
+    pos: getUint64(view, eocd64 + 48),
+  };
+}
+
+function readZip64Extra(
+  view: DataView,
+  start: number,
+  end: number,
+  entry: ZipEntry
+) {
+  for (let pos = start; pos + 4 <= end; ) {
+    const id = view.getUint16(pos, true);
+    const length = view.getUint16(pos + 2, true);
+    if (id === EXTRA_ZIP64) {
+      // Only values marked in the fixed fields are present, in this order
+      let field = pos + 4;
+      for (const key of ["size", "compressedSize", "offset"] as const) {
+        if (entry[key] !== ZIP64_MARKER) continue;
+        if (field + 8 > pos + 4 + length) {
+          throw new Error(`Invalid ZIP64 extra field of ${entry.name}`);
+        }
+        entry[key] = getUint64(view, field);
+        field += 8;
+      }
+      return;
+    }
+    pos += 4 + length;
+  }
+}
+
+function checkLimits(entry: ZipEntry, total: number, limits: ZipLimits) {
+  const { name, size, compressedSize } = entry;
+  if (size > limits.max_member_size) {
+    throw new Error(
+      `NGFP file entry '${name}' exceeds ${limits.max_member_size} bytes uncompressed.`
+    );
+  }
+  if (total > limits.max_total_size) {
+    throw new Error(
+      `NGFP file contents exceed ${limits.max_total_size} bytes uncompressed.`
+    );
+  }
+  if (size > RATIO_THRESHOLD && size > compressedSize * limits.max_ratio) {
+    throw new Error(
+      `NGFP file entry '${name}' exceeds compression ratio ${limits.max_ratio}.`
+    );
+  }
+}
+
+/**
+ * Read entries of the central directory
+ *
+ * Sizes come from the central directory, so entries written with data
+ * descriptors, which have zero sizes in local headers, are read correctly.
+ * Entries exceeding limits by declared sizes are rejected before inflating.
+ */
+export function zipEntries(
+  buffer: ArrayBuffer,
+  limits?: ZipLimits
+): Map<string, ZipEntry> {
+  if (limits && buffer.byteLength > limits.max_size) {
+    throw new Error(`NGFP file size exceeds ${limits.max_size} bytes.`);
+  }
+
+  const view = new DataView(buffer);
+  const { count, pos: start } = centralDirectory(view);
+  const decoder = new TextDecoder();
+
+  const result = new Map<string, ZipEntry>();
+  let pos = start;
+  let total = 0;
+  for (let i = 0; i < count; i++) {
+    if (view.getUint32(pos, true) !== SIG_CENTRAL) {
+      throw new Error("Invalid ZIP central directory");
+    }
+    const nameLength = view.getUint16(pos + 28, true);
+    const extraLength = view.getUint16(pos + 30, true);
+    const name = decoder.decode(
+      new Uint8Array(buffer, pos + 46, nameLength)
+    );
+    if (view.getUint16(pos + 8, true) & FLAG_ENCRYPTED) {
+      throw new Error(`Encrypted ZIP entry ${name}`);
+    }
+
+    const entry: ZipEntry = {
+      name,
+      method: view.getUint16(pos + 10, true),
+      compressedSize: view.getUint32(pos + 20, true),
+      size: view.getUint32(pos + 24, true),
+      offset: view.getUint32(pos + 42, true),
+    };
+    const extra = pos + 46 + nameLength;
+    readZip64Extra(view, extra, extra + extraLength, entry);
+    if (entry.offset + entry.compressedSize > buffer.byteLength) {
+      throw new Error(`Invalid ZIP entry ${name}`);
+    }
+
+    total += entry.size;
+    if (limits) checkLimits(entry, total, limits);
+
+    result.set(name, entry);
+    pos = extra + extraLength + view.getUint16(pos + 32, true);
+  }
+  return result;
+}
+
+async function inflate(data: Uint8Array, entry: ZipEntry) {
+  const reader = new Blob([data])
+    .stream()
+    .pipeThrough(new DecompressionStream("deflate-raw"))
+    .getReader();
+
+  // Declared sizes are checked against limits, so the stream is aborted as
+  // soon as it produces more than declared
+  const result = new Uint8Array(entry.size);
+  let length = 0;
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    if (length + value.length > entry.size) {
+      await reader.cancel();
+      throw new Error(`ZIP entry ${entry.name} exceeds its declared size`);
+    }
+    result.set(value, length);
+    length += value.length;
+  }
+  if (length !== entry.size) {
+    throw new Error(`ZIP entry ${entry.name} is truncated`);
+  }
+  return result;
+}
+
+export async function zipRead(
+  buffer: ArrayBuffer,
+  entry: ZipEntry
+): Promise<Uint8Array> {
+  const view = new DataView(buffer);
+  const { offset, method, compressedSize } = entry;
+  if (view.getUint32(offset, true) !== SIG_LOCAL) {
+    throw new Error(`Invalid ZIP local header of ${entry.name}`);
+  }
+  const start =
+    offset +
+    30 +
+    view.getUint16(offset + 26, true) +
+    view.getUint16(offset + 28, true);
+  if (start + compressedSize > buffer.byteLength) {
+    throw new Error(`Invalid ZIP entry ${entry.name}`);
+  }
+  const data = new Uint8Array(buffer, start, compressedSize);
+
+  if (method === METHOD_STORED) {
+    if (compressedSize !== entry.size) {
+      throw new Error(`Invalid ZIP entry ${entry.name}`);
+    }
+    return data;
+  } else if (method === METHOD_DEFLATED) {
+    return await inflate(data, entry);
+  }
+  throw new Error(`Unsupported ZIP compression method ${method}`);
+}
@@ -0,0 +1,151 @@
+import type { FormbuilderFormRead } from "@nextgisweb/formbuilder/type/api";
+import {
+  Checkbox,
+  Divider,
+  Input,
+  Radio,
+  Select,
+  Space,
+  Tabs,
+} from "@nextgisweb/gui/antd";
+import { gettext } from "@nextgisweb/pyramid/i18n";
+
+import "./FormPreview.less";
+
+type FormbuilderFormValue = NonNullable<FormbuilderFormRead["value"]>;
+type FormItem = FormbuilderFormValue["items"][number];
+
+const msgPhoto = gettext("Photo");
+const msgCoordinates = gettext("Coordinates");
+
+interface PreviewContext {
+  displayName: (keyname: string) => string;
+}
+
+function ItemControl({ item, ctx }: { item: FormItem; ctx: PreviewContext }) {
+  switch (item.type) {
+    case "label":
+      return <div className="label">{item.label}</div>;
+    case "spacer":
+      return <Divider plain />;
+    case "checkbox":
+      return (
+        <Checkbox disabled checked={item.initial === true}>
+          {item.label}
+        </Checkbox>
+      );
+    case "radio":
+      return (
+        <Radio.Group
+          disabled
+          value={item.options.find((o) => o.initial)?.value}
+          options={item.options.map(({ value, label }) => ({ value, label }))}
+        />
+      );
+    case "dropdown":
+      return (
+        <Select
+          disabled
+          style={{ width: "100%" }}
+          value={item.options.find((o) => o.initial)?.label}
+        />
+      );
+    case "dropdown_dual":
+      return (
+        <Select
+          disabled
+          style={{ width: "100%" }}
+          value={item.options.find((o) => o.initial)?.first}
+        />
+      );
+    case "cascade": {
+      const primary = item.options.find((o) => o.initial);
+      return (
+        <Space.Compact style={{ width: "100%" }}>
+          <Select disabled style={{ width: "50%" }} value={primary?.label} />
+          <Select
+            disabled
+            style={{ width: "50%" }}
+            value={primary?.items.find((o) => o.initial)?.label}
+          />
+        </Space.Compact>
+      );
+    }
+    case "coordinates":
+      return <Input disabled value={msgCoordinates} />;
+    case "photo":
+      return <Input disabled value={`${msgPhoto} × ${item.max_count}`} />;
+    case "tabs":
+      return (
+        <Tabs
+          size="small"
+          defaultActiveKey={String(
+            Math.max(
+              item.tabs.findIndex((t) => t.active),
+              0
+            )
+          )}
+          items={item.tabs.map((tab, idx) => ({
+            key: String(idx),
+            label: tab.title,
+            children: <ItemList items={tab.items} ctx={ctx} />,
+          }))}
+        />
+      );
+    default: {
+      const initial = "initial" in item ? item.initial : undefined;
+      return (
+        <Input
+          disabled
+          value={typeof initial === "string" ? initial : undefined}
+        />
+      );
+    }
+  }
+}
+
+function itemCaption(item: FormItem, ctx: PreviewContext) {
+  if (item.type === "cascade") {
+    return [item.field_primary, item.field_secondary]
+      .map(ctx.displayName)
+      .join(" / ");
+  } else if (item.type === "coordinates") {
+    return [item.field_lon, item.field_lat].map(ctx.displayName).join(" / ");
+  } else if ("field" in item && item.field) {
+    return ctx.displayName(item.field);
+  }
+  return undefined;
+}
+
+function ItemList({ items, ctx }: { items: FormItem[]; ctx: PreviewContext }) {
+  return (
+    <>
+      {items.map((item, idx) => {
+        const caption = itemCaption(item, ctx);
+        return (
+          <div key={idx} className="item">
+            {caption && <div className="caption">{caption}</div>}
+            <ItemControl item={item} ctx={ctx} />
+          </div>
+        );
+      })}
+    </>
+  );
+}
+
+export default function FormPreview({
+  value,
+}: {
+  value: FormbuilderFormValue;
+}) {
+  const names = new Map(value.fields.map((f) => [f.keyname, f.display_name]));
+  const ctx: PreviewContext = {
+    displayName: (keyname) => names.get(keyname) ?? keyname,
+  };
+
+  return (
+    <div className="ngw-formbuilder-form-preview">
+      <ItemList items={value.items} ctx={ctx} />
+    </div>
+  );
+}
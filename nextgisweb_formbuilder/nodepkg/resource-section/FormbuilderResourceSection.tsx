@@ -1,24 +1,56 @@
+import { Suspense, lazy, useEffect, useRef, useState } from "react";
+
 import { assert } from "@nextgisweb/jsrealm/error";
 import { gettext } from "@nextgisweb/pyramid/i18n";
 import type { ResourceSection } from "@nextgisweb/resource/resource-section";
 
-import { FormbuilderEditorWidget } from "../editor-widget/FormbuilderEditorWidget";
+import { OutlinePreview } from "./OutlinePreview";
+
+const FormPreview = lazy(() => import("./FormPreview"));
 
 const msgPreviewForm = gettext("Form preview");
 
+function useVisible<E extends Element>() {
+  const ref = useRef<E>(null);
+  const [visible, setVisible] = useState(false);
+
+  useEffect(() => {
+    const el = ref.current;
+    if (visible || !el) return;
+    if (typeof IntersectionObserver === "undefined") {
+      setVisible(true);
+      return;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((e) => e.isIntersecting)) setVisible(true);
+    });
+    observer.observe(el);
+    return () => observer.disconnect();
+  }, [visible]);
+
+  return [ref, visible] as const;
+}
+
 export const FormbuilderResourceSection: ResourceSection = ({
   resourceData,
 }) => {
   const formbuilderForm = resourceData.formbuilder_form;
   assert(formbuilderForm);
 
+  const [ref, visible] = useVisible<HTMLDivElement>();
+  const value = formbuilderForm.value;
+
   return (
-    <div style={{ display: "flex", height: "600px" }}>
-      <FormbuilderEditorWidget
-        value={formbuilderForm}
-        parent={resourceData.resource.parent?.id}
-        editable={false}
-      />
+    <div ref={ref} style={{ minHeight: "120px" }}>
+      {visible && (
+        <Suspense fallback={<OutlinePreview id={resourceData.resource.id} />}>
+          {value ? (
+            <FormPreview value={value} />
+          ) : (
+            <OutlinePreview id={resourceData.resource.id} />
+          )}
+        </Suspense>
+      )}
     </div>
   );
 };
@@ -0,0 +1,50 @@
+import { useEffect, useState } from "react";
+
+import type { FormbuilderOutlineItem } from "@nextgisweb/formbuilder/type/api";
+import { Skeleton } from "@nextgisweb/gui/antd";
+import { route } from "@nextgisweb/pyramid/api";
+
+function OutlineList({ items }: { items: FormbuilderOutlineItem[] }) {
+  return (
+    <ul>
+      {items.map((item, idx) => (
+        <li key={idx}>
+          {[item.type, item.label, item.fields.join(", ")]
+            .filter(Boolean)
+            .join(" · ")}
+          {item.options !== undefined && ` (${item.options})`}
+          {item.tabs && (
+            <ul>
+              {item.tabs.map((tab, tidx) => (
+                <li key={tidx}>
+                  {tab.title}
+                  <OutlineList items={tab.items} />
+                </li>
+              ))}
+            </ul>
+          )}
+        </li>
+      ))}
+    </ul>
+  );
+}
+
+export function OutlinePreview({ id }: { id: number }) {
+  const [outline, setOutline] = useState<FormbuilderOutlineItem[]>();
+
+  useEffect(() => {
+    const abort = new AbortController();
+    route("formbuilder.outline", id)
+      .get({ cache: true, signal: abort.signal })
+      .then(setOutline)
+      .catch(() => {});
+    return () => abort.abort();
+  }, [id]);
+
+  if (outline === undefined) return <Skeleton active paragraph={{ rows: 4 }} />;
+  return (
+    <div className="ngw-formbuilder-form-preview">
+      <OutlineList items={outline} />
+    </div>
+  );
+}
@@ -0,0 +1,236 @@
+from bisect import bisect_left
+from collections import defaultdict
+from hashlib import sha256
+from itertools import count
+from typing import Any, Dict, Iterable, List, Literal, Tuple, Union
+
+from msgspec import UNSET, Struct
+from msgspec import to_builtins as msgspec_to_builtins
+from msgspec.json import encode as msgspec_json_encode
+
+from .element import FormbuilderTab
+
+ROOT = "/"
+
+RevisionChangeOp = Literal["added", "removed", "moved", "changed", "rebound"]
+RevisionNodeKind = Literal["form", "field", "item", "tab", "option"]
+
+
+class RevisionNode(Struct, array_like=True, frozen=True):
+    parent: str
+    slot: str
+    index: int
+    data: Dict[str, Any]
+
+
+RevisionNodes = Dict[str, RevisionNode]
+RevisionDelta = Dict[str, Tuple[Union[RevisionNode, None], Union[RevisionNode, None]]]
+
+
+class RevisionChange(Struct, kw_only=True):
+    op: RevisionChangeOp
+    kind: RevisionNodeKind
+    key: str
+    before: Union[RevisionNode, None]
+    after: Union[RevisionNode, None]
+
+
+def node_kind(key: str) -> RevisionNodeKind:
+    if key == ROOT:
+        return "form"
+    last = key.rsplit("/", 1)[-1]
+    if last.startswith("f:"):
+        return "field"
+    elif last.startswith("t:"):
+        return "tab"
+    elif last.startswith("o:"):
+        return "option"
+    return "item"
+
+
+def flatten(value) -> RevisionNodes:
+    """Flatten a form value into nodes keyed by a stable structural key
+
+    Items bound to fields are keyed by their field keynames, so they keep
+    their identity when moved around. Other items are keyed by their type,
+    a hash of their own attributes and an ordinal among items with the same
+    hash, so inserting an item doesn't rekey others. Tabs are keyed by their
+    position, options by their values."""
+
+    nodes: RevisionNodes = dict()
+    counters: Dict[Tuple[str, str], count] = defaultdict(count)
+    nodes[ROOT] = RevisionNode(
+        parent="",
+        slot="",
+        index=0,
+        data=dict(geometry_type=value.geometry_type, fields=[], items=[]),
+    )
+    for index, field in enumerate(value.fields):
+        key = f"f:{field.keyname}"
+        nodes[key] = RevisionNode(ROOT, "fields", index, msgspec_to_builtins(field))
+    _flatten(nodes, counters, ROOT, "items", value.items)
+    return nodes
+
+
+def _flatten(nodes, counters, parent, slot, objs):
+    seen = set()
+    for index, obj in enumerate(objs):
+        tag = obj.__struct_config__.tag
+        data: Dict[str, Any] = dict() if tag is None else dict(type=tag)
+        children = []
+        for attr in obj.__struct_fields__:
+            attr_value = getattr(obj, attr)
+            if attr_value is UNSET:
+                continue
+            elif isinstance(attr_value, list):
+                data[attr] = []
+                children.append((attr, attr_value))
+            else:
+                data[attr] = msgspec_to_builtins(attr_value)
+
+        if tag is not None:
+            if keynames := sorted(getattr(obj, a) for a, _ in obj.field_specs):
+                key = "i:" + ",".join(keynames)
+            else:
+                digest = sha256(msgspec_json_encode(data)).hexdigest()[:12]
+                key = f"i:{tag}:{digest}#{next(counters[(tag, digest)])}"
+        elif isinstance(obj, FormbuilderTab):
+            key = f"{parent}/t:{index}"
+        else:
+            key = f"{parent}/o:{obj.value}"
+            if key in seen:
+                key = f"{key}#{index}"
+            seen.add(key)
+
+        nodes[key] = RevisionNode(parent, slot, index, data)
+        for child_slot, child_objs in children:
+            _flatten(nodes, counters, key, child_slot, child_objs)
+
+
+def unflatten(nodes: RevisionNodes) -> Dict[str, Any]:
+    """Assemble nodes back into a builtin form value structure"""
+
+    dicts = {key: dict(node.data) for key, node in nodes.items()}
+    slots: Dict[Tuple[str, str], List[Tuple[int, str]]] = defaultdict(list)
+    for key, node in nodes.items():
+        if key != ROOT:
+            slots[(node.parent, node.slot)].append((node.index, key))
+
+    for (parent, slot), children in slots.items():
+        children.sort()
+        dicts[parent][slot] = [dicts[key] for _, key in children]
+
+    return dicts[ROOT]
+
+
+def delta_between(before: RevisionNodes, after: RevisionNodes) -> RevisionDelta:
+    result: RevisionDelta = dict()
+    for key, node in after.items():
+        if (prev := before.get(key)) != node:
+            result[key] = (prev, node)
+    for key, prev in before.items():
+        if key not in after:
+            result[key] = (prev, None)
+    return result
+
+
+def delta_apply(nodes: RevisionNodes, value: RevisionDelta) -> None:
+    for key, (_, node) in value.items():
+        if node is None:
+            nodes.pop(key, None)
+        else:
+            nodes[key] = node
+
+
+def delta_compose(deltas: Iterable[RevisionDelta]) -> RevisionDelta:
+    result: RevisionDelta = dict()
+    for value in deltas:
+        for key, (before, after) in value.items():
+            if (prev := result.get(key)) is not None:
+                before = prev[0]
+            result[key] = (before, after)
+    return {k: v for k, v in result.items() if v[0] != v[1]}
+
+
+def delta_invert(value: RevisionDelta) -> RevisionDelta:
+    return {k: (a, b) for k, (b, a) in value.items()}
+
+
+def delta_changes(value: RevisionDelta) -> List[RevisionChange]:
+    """Classify a delta into structural changes"""
+
+    result: List[RevisionChange] = []
+    added: Dict[Tuple[str, str, int, str], str] = dict()
+    containers: Dict[Tuple[str, str], List[Tuple[int, int, str]]] = defaultdict(list)
+
+    def change(op, key, before, after):
+        result.append(
+            RevisionChange(op=op, kind=node_kind(key), key=key, before=before, after=after)
+        )
+
+    for key, (before, after) in value.items():
+        if before is None:
+            if node_kind(key) == "item":
+                added[(after.parent, after.slot, after.index, after.data["type"])] = key
+            continue
+        elif after is None:
+            continue
+
+        if before.data != after.data:
+            change("changed", key, before, after)
+        if (before.parent, before.slot) != (after.parent, after.slot):
+            change("moved", key, before, after)
+        elif before.index != after.index:
+            containers[(after.parent, after.slot)].append((before.index, after.index, key))
+
+    # Within a container only nodes outside the longest run preserving their
+    # relative order are reported as moved, plain index shifts are not.
+    for nodes in containers.values():
+        nodes.sort()
+        for key in _out_of_order(nodes):
+            change("moved", key, *value[key])
+
+    # An item removed and another of the same type added at the same place
+    # is the same item bound to another field.
+    for key, (before, after) in value.items():
+        if after is not None:
+            continue
+        if node_kind(key) == "item":
+            pos = (before.parent, before.slot, before.index, before.data["type"])
+            if (akey := added.pop(pos, None)) is not None:
+                change("rebound", akey, before, value[akey][1])
+                continue
+        change("removed", key, before, None)
+
+    for key in added.values():
+        change("added", key, None, value[key][1])
+
+    for key, (before, after) in value.items():
+        if before is None and node_kind(key) != "item":
+            change("added", key, None, after)
+
+    return result
+
+
+def _out_of_order(nodes: List[Tuple[int, int, str]]) -> List[str]:
+    # Longest increasing subsequence on new indexes ordered by old indexes
+    tails: List[int] = []
+    tails_pos: List[int] = []
+    prev: List[int] = [-1] * len(nodes)
+    for pos, (_, new_index, _) in enumerate(nodes):
+        i = bisect_left(tails, new_index)
+        if i == len(tails):
+            tails.append(new_index)
+            tails_pos.append(pos)
+        else:
+            tails[i] = new_index
+            tails_pos[i] = pos
+        prev[pos] = tails_pos[i - 1] if i > 0 else -1
+
+    keep = set()
+    pos = tails_pos[-1] if tails_pos else -1
+    while pos != -1:
+        keep.add(pos)
+        pos = prev[pos]
+
+    return [key for pos, (_, _, key) in enumerate(nodes) if pos not in keep]
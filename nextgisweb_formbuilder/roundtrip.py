@@ -0,0 +1,151 @@
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+
+from msgspec import Struct
+from msgspec import convert as msgspec_convert
+from msgspec import to_builtins as msgspec_to_builtins
+
+from .model import FormbuilderFormValue
+
+ELEMENTS = Path(__file__).parent / "test" / "data" / "elements"
+
+FIELD_ATTRS = ("field", "field_primary", "field_secondary", "field_lon", "field_lat")
+
+
+class RoundtripBudget(Struct, kw_only=True, frozen=True):
+    time: float = 1.0
+    memory: int = 64 * 2**20
+
+
+class RoundtripResult(Struct, kw_only=True):
+    name: str
+    error: Union[str, None] = None
+    elapsed: float = 0.0
+    memory: int = 0
+    over_budget: bool = False
+
+
+class RoundtripReport(Struct, kw_only=True):
+    total: int
+    failed: List[RoundtripResult]
+    over_budget: List[RoundtripResult]
+    slowest: List[RoundtripResult]
+    heaviest: List[RoundtripResult]
+
+    def format(self) -> str:
+        lines = [
+            f"{self.total} forms, {len(self.failed)} failed, {len(self.over_budget)} over budget"
+        ]
+        for title, results in (
+            ("Failed", self.failed),
+            ("Over budget", self.over_budget),
+            ("Slowest", self.slowest),
+            ("Most allocating", self.heaviest),
+        ):
+            if results:
+                lines.extend(("", title))
+                for r in results:
+                    line = f"  {r.name}: {r.elapsed * 1000:.1f} ms, {r.memory / 2**20:.2f} MiB"
+                    lines.append(line if r.error is None else f"{line}, {r.error}")
+        return "\n".join(lines)
+
+
+def roundtrip(data: bytes) -> None:
+    """Convert an NGFP file to a form value and back, check the result"""
+
+    value = FormbuilderFormValue.from_legacy(BytesIO(data))
+    value.validate()
+    converted = FormbuilderFormValue.from_legacy(BytesIO(value.to_legacy("Form")))
+    if converted != value:
+        raise AssertionError("Value changed after conversion to NGFP and back")
+
+
+def check(name: str, data: bytes, budget: RoundtripBudget) -> RoundtripResult:
+    result = RoundtripResult(name=name)
+    try:
+        start = perf_counter()
+        roundtrip(data)
+        result.elapsed = perf_counter() - start
+
+        # Tracing slows execution down, so it's measured in a separate pass
+        tracemalloc.start()
+        try:
+            roundtrip(data)
+            result.memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+
+    result.over_budget = result.elapsed > budget.time or result.memory > budget.memory
+    return result
+
+
+def generate(count: int, *, seed: int = 0, size: int = 20) -> Iterable[Tuple[str, bytes]]:
+    """Forms mixing items of real element files with renamed fields"""
+
+    sources = [
+        msgspec_to_builtins(FormbuilderFormValue.from_legacy(p))
+        for p in sorted(ELEMENTS.glob("*.ngfp"))
+    ]
+    rnd = Random(seed)
+    for n in range(count):
+        fields: List[Dict[str, Any]] = []
+        items: List[Dict[str, Any]] = []
+        for i in range(rnd.randint(1, size)):
+            source = rnd.choice(sources)
+            rename = {f["keyname"]: f"{f['keyname']}_{i}" for f in source["fields"]}
+            fields.extend(
+                dict(f, keyname=rename[f["keyname"]], display_name=f"{f['display_name']} {i}")
+                for f in source["fields"]
+            )
+            items.extend(_rename(item, rename) for item in source["items"])
+        value = msgspec_convert(
+            dict(geometry_type="POINT", fields=fields, items=items),
+            FormbuilderFormValue,
+        )
+        yield f"generated-{seed}-{n}", value.to_legacy(f"Generated {n}")
+
+
+def _rename(item: Dict[str, Any], rename: Dict[str, str]) -> Dict[str, Any]:
+    result = dict(item)
+    for attr in FIELD_ATTRS:
+        if attr in result:
+            result[attr] = rename[result[attr]]
+    if "tabs" in result:
+        result["tabs"] = [
+            dict(tab, items=[_rename(i, rename) for i in tab["items"]]) for tab in result["tabs"]
+        ]
+    return result
+
+
+def run(
+    forms: Iterable[Tuple[str, bytes]],
+    *,
+    budget: RoundtripBudget = RoundtripBudget(),
+    workers: Union[int, None] = None,
+    top: int = 10,
+) -> RoundtripReport:
+    forms = list(forms)
+    names, datas = [n for n, _ in forms], [d for _, d in forms]
+    with ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(check, names, datas, [budget] * len(names), chunksize=4))
+
+    return RoundtripReport(
+        total=len(results),
+        failed=[r for r in results if r.error is not None],
+        over_budget=[r for r in results if r.error is None and r.over_budget],
+        slowest=sorted(results, key=lambda r: r.elapsed, reverse=True)[:top],
+        heaviest=sorted(results, key=lambda r: r.memory, reverse=True)[:top],
+    )
+
+
+def read(paths: Sequence[Path]) -> Iterable[Tuple[str, bytes]]:
+    for path in paths:
+        for fn in sorted(path.rglob("*.ngfp")) if path.is_dir() else (path,):
+            yield str(fn), fn.read_bytes()
@@ -0,0 +1,10 @@
+import os
+
+import pytest
+
+# Wall-clock and memory budgets depend on the machine and its load, so they
+# are checked only when requested explicitly
+benchmark = pytest.mark.skipif(
+    not os.environ.get("FORMBUILDER_BENCHMARK"),
+    reason="Set FORMBUILDER_BENCHMARK=1 to run benchmarks",
+)
@@ -1,10 +1,13 @@
+from io import BytesIO
 from random import randbytes
 from shutil import copyfile
-from zipfile import ZipFile
+from zipfile import ZIP_DEFLATED, ZipFile
 
 import pytest
 import transaction
 
+from nextgisweb.lib.json import loadb
+
 from nextgisweb.resource.test import ResourceAPI
 from nextgisweb.vector_layer import VectorLayer
 
@@ -53,6 +56,16 @@ def ngfp_big(*, tmp_path, ngw_data_path):
     return fn
 
 
+def ngfp_bomb(*, tmp_path, ngw_data_path):
+    fn = tmp_path / "bomb.ngfp"
+    minimal_fn = ngfp_minimal(tmp_path=tmp_path, ngw_data_path=ngw_data_path)
+    with ZipFile(fn, mode="a", compression=ZIP_DEFLATED) as zf, ZipFile(minimal_fn) as zs:
+        for fi in NGFP_FILE_SCHEMA:
+            fb = bytes(NGFP_MAX_SIZE // 2) if fi == "data.geojson" else zs.read(fi)
+            zf.writestr(fi, fb)
+    return fn
+
+
 def ngfp_schema(*, tmp_path, ngw_data_path):
     fn = tmp_path / "schema.ngfp"
     minimal_fn = ngfp_minimal(tmp_path=tmp_path, ngw_data_path=ngw_data_path)
@@ -63,6 +76,16 @@ def ngfp_schema(*, tmp_path, ngw_data_path):
     return fn
 
 
+def ngfp_unknown(*, tmp_path, ngw_data_path):
+    fn = tmp_path / "unknown.ngfp"
+    minimal_fn = ngfp_minimal(tmp_path=tmp_path, ngw_data_path=ngw_data_path)
+    with ZipFile(fn, mode="a") as zf, ZipFile(minimal_fn, mode="r") as zs:
+        for fi in NGFP_FILE_SCHEMA:
+            fb = b'[{"type": "unknown", "attributes": {}}]' if fi == "form.json" else zs.read(fi)
+            zf.writestr(fi, fb)
+    return fn
+
+
 @pytest.mark.parametrize(
     "name,valid",
     [
@@ -70,7 +93,9 @@ def ngfp_schema(*, tmp_path, ngw_data_path):
         pytest.param("broken", False, id="broken"),
         pytest.param("empty", False, id="empty"),
         pytest.param("schema", False, id="schema"),
+        pytest.param("unknown", False, id="unknown"),
         pytest.param("big", False, id="big"),
+        pytest.param("bomb", False, id="bomb"),
     ],
 )
 def test_ngfp(name, valid, vector_layer, ngw_file_upload, ngw_data_path, tmp_path):
@@ -88,6 +113,22 @@ def test_ngfp(name, valid, vector_layer, ngw_file_upload, ngw_data_path, tmp_pat
     )
 
 
+@pytest.mark.parametrize("name,valid", [("minimal", True), ("broken", False), ("bomb", False)])
+def test_ngfp_job(name, valid, ngw_file_upload, ngw_data_path, ngw_webtest_app, tmp_path):
+    fn = globals()[f"ngfp_{name}"](tmp_path=tmp_path, ngw_data_path=ngw_data_path)
+    job = ngw_webtest_app.post(
+        "/api/component/formbuilder/ngfp_job/",
+        json={"file": ngw_file_upload(fn)},
+        status=200,
+    ).json
+    assert job["status"] == ("done" if valid else "failed")
+    assert ("value" in job) is valid and ("error" in job) is not valid
+
+    url = f"/api/component/formbuilder/ngfp_job/{job['id']}"
+    assert ngw_webtest_app.get(url, status=200).json == job
+    ngw_webtest_app.get("/api/component/formbuilder/ngfp_job/invalid", status=404)
+
+
 def get_fields(rapi: ResourceAPI, res_id: int):
     return rapi.read(res_id)["feature_layer"]["fields"]
 
@@ -172,7 +213,11 @@ def test_struct(vector_layer):
         },
     )
 
-    rapi.client.get(f"{res_id}/ngfp", status=200)
+    resp = rapi.client.get(f"{res_id}/ngfp", status=200)
+    assert resp.content_length == len(resp.body)
+
+    resp_range = rapi.client.get(f"{res_id}/ngfp", headers={"Range": "bytes=0-9"}, status=206)
+    assert resp_range.body == resp.body[:10]
 
     fields = get_fields(rapi, vector_layer)
     assert len(fields) == 0
@@ -220,3 +265,448 @@ def test_fields_update(vector_layer):
     for f1, f2 in zip(fields, form_fields):
         for k in ("keyname", "datatype", "display_name"):
             assert f1[k] == f2[k]
+
+
+def test_ngfp_data(ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    with transaction.manager:
+        layer_id = VectorLayer(geometry_type="POINT").persist().id
+
+    value = {
+        "geometry_type": "POINT",
+        "fields": [{"keyname": "f1", "datatype": "STRING", "display_name": "F1"}],
+        "items": [{"type": "textbox", "field": "f1", "remember": False, "max_lines": 1}],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": layer_id}},
+            "formbuilder_form": {"value": value, "update_feature_layer_fields": True},
+        },
+    )
+
+    for v in ("foo", "bar"):
+        ngw_webtest_app.post(
+            f"/api/resource/{layer_id}/feature/",
+            json={"geom": "POINT (0 0)", "fields": {"f1": v}},
+            status=200,
+        )
+
+    def read_data(**params):
+        resp = rapi.client.get(f"{res_id}/ngfp", params, status=200)
+        with ZipFile(BytesIO(resp.body)) as zf:
+            return loadb(zf.read("data.geojson"))
+
+    data = read_data(data="true")
+    assert data["type"] == "FeatureCollection"
+    assert sorted(f["properties"]["f1"] for f in data["features"]) == ["bar", "foo"]
+
+    data = read_data(data="true", fld_f1="foo")
+    assert [f["properties"]["f1"] for f in data["features"]] == ["foo"]
+
+    data = read_data(data="true", bbox="10,10,20,20")
+    assert data["features"] == []
+
+
+def test_manifest(vector_layer, ngw_file_upload, ngw_data_path, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    fu = ngw_file_upload(ngw_data_path / "minimal.ngfp")
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"file_upload": fu},
+        },
+    )
+
+    def manifest_item():
+        data = ngw_webtest_app.get(
+            "/api/component/formbuilder/manifest",
+            params=dict(parent=vector_layer),
+            status=200,
+        ).json
+        return next(i for i in data if i["id"] == res_id)
+
+    item = manifest_item()
+    assert item["parent"] == vector_layer
+    assert item["size"] == (ngw_data_path / "minimal.ngfp").stat().st_size
+    first_hash = item["hash"]
+
+    value = ngw_webtest_app.post(
+        "/api/component/formbuilder/ngfp_convert",
+        json={"resource": {"id": res_id}},
+        status=200,
+    ).json
+    ngw_webtest_app.put(
+        f"/api/resource/{res_id}",
+        json={"formbuilder_form": {"value": value}},
+        status=200,
+    )
+
+    item = manifest_item()
+    assert item["hash"] != first_hash
+
+    # The name goes into the generated file, so renaming changes the hash
+    ngw_webtest_app.put(
+        f"/api/resource/{res_id}",
+        json={"resource": {"display_name": "Renamed"}},
+        status=200,
+    )
+    assert manifest_item()["hash"] != item["hash"]
+
+
+def test_schema_stale(ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    with transaction.manager:
+        layer_id = VectorLayer(geometry_type="POINT").persist().id
+
+    value = {
+        "geometry_type": "POINT",
+        "fields": [{"keyname": "f1", "datatype": "STRING", "display_name": "F1"}],
+        "items": [{"type": "textbox", "field": "f1", "remember": False, "max_lines": 1}],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": layer_id}},
+            "formbuilder_form": {"value": value, "update_feature_layer_fields": True},
+        },
+    )
+
+    def stale(**params):
+        data = ngw_webtest_app.get(
+            "/api/component/formbuilder/manifest",
+            params=dict(parent=layer_id, **params),
+            status=200,
+        ).json
+        return [i["stale"] for i in data if i["id"] == res_id]
+
+    def update_fields(fields):
+        ngw_webtest_app.put(
+            f"/api/resource/{layer_id}",
+            json={"feature_layer": {"fields": fields}},
+            status=200,
+        )
+
+    assert stale() == [False]
+    assert stale(stale="true") == []
+    rapi.client.get(f"{res_id}/ngfp", status=200)
+
+    # A new field isn't bound, so the form is stale but still valid
+    f1 = get_fields(rapi, layer_id)[0]
+    update_fields([{"id": f1["id"]}, {"keyname": "f2", "datatype": "INTEGER"}])
+    assert stale(stale="true") == [True]
+    rapi.client.get(f"{res_id}/ngfp", status=200)
+
+    f2 = get_fields(rapi, layer_id)[1]
+    update_fields([{"id": f1["id"], "delete": True}, {"id": f2["id"]}])
+    rapi.client.get(f"{res_id}/ngfp", status=409)
+
+    ngw_webtest_app.put(
+        f"/api/resource/{res_id}",
+        json={"formbuilder_form": {"value": value, "update_feature_layer_fields": True}},
+        status=200,
+    )
+    assert stale() == [False]
+    rapi.client.get(f"{res_id}/ngfp", status=200)
+
+
+def test_revision(vector_layer, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    def textbox(keyname):
+        return {"type": "textbox", "field": keyname, "remember": False, "max_lines": 1}
+
+    fields = [
+        {"keyname": k, "datatype": "STRING", "display_name": k.upper()} for k in ("f1", "f2", "f3")
+    ]
+    value = {"geometry_type": "POINT", "fields": fields, "items": [textbox("f1"), textbox("f2")]}
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"value": value},
+        },
+    )
+
+    value_v2 = dict(value, items=[textbox("f2"), textbox("f1"), textbox("f3")])
+    ngw_webtest_app.put(
+        f"/api/resource/{res_id}",
+        json={"formbuilder_form": {"value": value_v2}},
+        status=200,
+    )
+
+    url = f"/api/resource/{res_id}/formbuilder/revision"
+    revisions = ngw_webtest_app.get(f"{url}/", status=200).json
+    assert [(r["revision"], r["snapshot"]) for r in revisions] == [(1, True), (2, False)]
+
+    resp = ngw_webtest_app.get(f"{url}/2", status=200).json
+    assert [i["field"] for i in resp["items"]] == ["f2", "f1", "f3"]
+
+    changes = ngw_webtest_app.get(f"{url}/diff", params=dict(base=1, target=2), status=200).json
+    assert {(c["op"], c["key"]) for c in changes} == {("moved", "i:f1"), ("added", "i:f3")}
+
+    ngw_webtest_app.get(f"{url}/3", status=404)
+
+
+def test_validate(vector_layer, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    fields = [
+        {"keyname": k, "datatype": dt, "display_name": k.upper()}
+        for k, dt in (("n", "INTEGER"), ("d", "DATE"), ("p", "STRING"), ("s", "STRING"))
+    ]
+    option = {
+        "value": "x",
+        "label": "X",
+        "items": [{"value": "x1", "label": "X1"}],
+    }
+    value = {
+        "geometry_type": "POINT",
+        "fields": fields,
+        "items": [
+            {"type": "textbox", "field": "n", "remember": False, "max_lines": 1},
+            {"type": "datetime", "field": "d", "remember": False, "datetime": "date"},
+            {
+                "type": "cascade",
+                "field_primary": "p",
+                "field_secondary": "s",
+                "remember": False,
+                "options": [option],
+            },
+        ],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"value": value},
+        },
+    )
+
+    records = [
+        {"n": 1, "d": "2025-04-26", "p": "x", "s": "x1"},
+        {"n": "1.5", "d": "2025-13-01", "p": "x", "s": "y"},
+        {"p": "z"},
+    ]
+    resp = ngw_webtest_app.post(
+        f"/api/resource/{res_id}/formbuilder/validate",
+        json={"records": records},
+        status=200,
+    ).json
+
+    assert resp["total"] == 3 and resp["invalid"] == 2
+    assert [(e["record"], e["field"], e["code"]) for e in resp["errors"]] == [
+        (1, "n", "number"),
+        (1, "d", "datetime"),
+        (1, "s", "cascade"),
+        (2, "p", "option"),
+    ]
+
+
+def test_defaults(vector_layer, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    fields = [
+        {"keyname": k, "datatype": dt, "display_name": k.upper()}
+        for k, dt in (("n", "INTEGER"), ("c", "INTEGER"), ("u", "STRING"), ("o", "STRING"))
+    ]
+    options = [{"value": "a", "label": "A"}, {"value": "b", "label": "B", "initial": True}]
+    value = {
+        "geometry_type": "POINT",
+        "fields": fields,
+        "items": [
+            {"type": "textbox", "field": "n", "remember": False, "max_lines": 1, "initial": "42"},
+            {"type": "checkbox", "field": "c", "remember": False, "label": "C", "initial": True},
+            {"type": "system", "field": "u", "system": "ngw_username"},
+            {"type": "radio", "field": "o", "remember": False, "options": options},
+        ],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"value": value},
+        },
+    )
+
+    url = f"/api/resource/{res_id}/formbuilder/defaults"
+    expected = {"n": 42, "c": 1, "u": "administrator", "o": "b"}
+
+    resp = ngw_webtest_app.post(url, json={"count": 2}, status=200).json
+    assert resp == [expected, expected]
+
+    resp = ngw_webtest_app.post(url, json={"records": [{"o": "a"}]}, status=200).json
+    assert resp == [dict(expected, o="a")]
+
+    ngw_webtest_app.post(url, json={}, status=422)
+
+
+def test_outline(vector_layer, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    fields = [{"keyname": k, "datatype": "STRING", "display_name": k.upper()} for k in ("t", "o")]
+    options = [{"value": "a", "label": "A"}, {"value": "b", "label": "B"}]
+    tab = {
+        "title": "Tab",
+        "active": True,
+        "items": [{"type": "radio", "field": "o", "remember": False, "options": options}],
+    }
+    value = {
+        "geometry_type": "POINT",
+        "fields": fields,
+        "items": [
+            {"type": "label", "label": "Title"},
+            {"type": "textbox", "field": "t", "remember": False, "max_lines": 1},
+            {"type": "tabs", "tabs": [tab]},
+        ],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"value": value},
+        },
+    )
+
+    resp = ngw_webtest_app.get(f"/api/resource/{res_id}/formbuilder/outline", status=200).json
+    assert resp == [
+        {"type": "label", "label": "Title", "fields": []},
+        {"type": "textbox", "fields": ["t"]},
+        {
+            "type": "tabs",
+            "fields": [],
+            "tabs": [
+                {
+                    "title": "Tab",
+                    "active": True,
+                    "items": [{"type": "radio", "fields": ["o"], "options": 2}],
+                }
+            ],
+        },
+    ]
+
+
+def test_distinct(ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    with transaction.manager:
+        layer_id = VectorLayer(geometry_type="POINT").persist().id
+
+    fields = [
+        {"keyname": k, "datatype": "STRING", "display_name": k.upper()} for k in ("o", "p", "s")
+    ]
+    value = {
+        "geometry_type": "POINT",
+        "fields": fields,
+        "items": [
+            {
+                "type": "dropdown",
+                "field": "o",
+                "remember": False,
+                "options": [],
+                "search": False,
+                "free_input": False,
+            },
+            {
+                "type": "cascade",
+                "field_primary": "p",
+                "field_secondary": "s",
+                "remember": False,
+                "options": [],
+            },
+        ],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": layer_id}},
+            "formbuilder_form": {"value": value, "update_feature_layer_fields": True},
+        },
+    )
+
+    for o, p, s in (("a", "x", "x1"), ("a", "x", "x2"), ("b", "y", "y1"), ("a", "x", "x1")):
+        ngw_webtest_app.post(
+            f"/api/resource/{layer_id}/feature/",
+            json={"geom": "POINT (0 0)", "fields": {"o": o, "p": p, "s": s}},
+            status=200,
+        )
+
+    url = f"/api/resource/{res_id}/formbuilder/distinct"
+    resp = ngw_webtest_app.get(url, params=dict(field="o"), status=200).json
+    assert resp == [{"value": "a", "count": 3}, {"value": "b", "count": 1}]
+
+    resp = ngw_webtest_app.get(url, params=dict(field="o", limit=1, offset=1), status=200).json
+    assert resp == [{"value": "b", "count": 1}]
+
+    ngw_webtest_app.post(f"{url}/options", json={"field": "o", "apply": True}, status=200)
+    body = {"field_primary": "p", "field_secondary": "s", "apply": True}
+    ngw_webtest_app.post(f"{url}/cascade", json=body, status=200)
+
+    items = rapi.read(res_id)["formbuilder_form"]["value"]["items"]
+    assert [o["value"] for o in items[0]["options"]] == ["a", "b"]
+    assert [(o["value"], [i["value"] for i in o["items"]]) for o in items[1]["options"]] == [
+        ("x", ["x1", "x2"]),
+        ("y", ["y1"]),
+    ]
+
+
+def test_element_search(vector_layer, ngw_webtest_app):
+    rapi = ResourceAPI()
+
+    value = {
+        "geometry_type": "POINT",
+        "fields": [],
+        "items": [
+            {
+                "type": "tabs",
+                "tabs": [
+                    {
+                        "title": "Tab",
+                        "active": True,
+                        "items": [
+                            {"type": "photo", "max_count": 5, "comment": ""},
+                            {"type": "photo", "max_count": 20, "comment": ""},
+                        ]
+                        + [{"type": "label", "label": str(i)} for i in range(10)]
+                        + [{"type": "photo", "max_count": 30, "comment": ""}],
+                    }
+                ],
+            },
+        ],
+    }
+
+    res_id = rapi.create(
+        "formbuilder_form",
+        {
+            "resource": {"parent": {"id": vector_layer}},
+            "formbuilder_form": {"value": value},
+        },
+    )
+
+    def search(**params):
+        resp = ngw_webtest_app.get("/api/component/formbuilder/element", params, status=200)
+        return [(i["path"], i["attrs"]["max_count"]) for i in resp.json if i["resource"] == res_id]
+
+    # Ordered by position, so /items/12 goes after /items/1
+    assert search(tag="photo", attr_max_count__gt="10") == [
+        ("/items/0/tabs/0/items/1", 20),
+        ("/items/0/tabs/0/items/12", 30),
+    ]
+    assert search(tag="photo", attr_max_count="5") == [("/items/0/tabs/0/items/0", 5)]
+
+    ngw_webtest_app.get(
+        "/api/component/formbuilder/element",
+        dict(attr_max_count__like="5"),
+        status=422,
+    )
@@ -0,0 +1,66 @@
+from io import BytesIO
+
+import pytest
+from msgspec import ValidationError as MsgspecValidationError
+from msgspec import convert
+from msgspec.json import encode
+
+from nextgisweb.core.exception import ValidationError
+
+from ..element import TEXT_MAX_LENGTH
+from ..loadtest import synthetic_value
+from ..model import FormbuilderBudget, FormbuilderFormValue, value_decoder, value_encoder
+
+BUDGET = FormbuilderBudget(
+    max_items=100,
+    max_depth=3,
+    max_options=1000,
+    max_size=2**20,
+    max_string=100,
+)
+
+
+def nested(depth):
+    items = [{"type": "label", "label": "Label"}]
+    for _ in range(depth - 1):
+        items = [{"type": "tabs", "tabs": [{"title": "Tab", "active": True, "items": items}]}]
+    return dict(geometry_type="POINT", fields=[], items=items)
+
+
+@pytest.mark.parametrize(
+    "value, valid",
+    [
+        pytest.param(synthetic_value(items=20, options=100), True, id="ok"),
+        pytest.param(synthetic_value(items=2, options=500), True, id="options-ok"),
+        pytest.param(synthetic_value(items=101, options=1), False, id="items"),
+        pytest.param(synthetic_value(items=2, options=1001), False, id="options"),
+        pytest.param(nested(3), True, id="depth-ok"),
+        pytest.param(nested(4), False, id="depth"),
+        pytest.param(
+            dict(nested(1), items=[{"type": "label", "label": "x" * 101}]),
+            False,
+            id="string",
+        ),
+    ],
+)
+def test_budget(value, valid):
+    value = convert(value, FormbuilderFormValue)
+    data = BytesIO(value.to_legacy("Form"))
+
+    if valid:
+        BUDGET.check_value(value)
+        BUDGET.check_json(value_encoder.encode(value))
+        FormbuilderFormValue.from_legacy(data, budget=BUDGET)
+    else:
+        with pytest.raises(ValidationError):
+            BUDGET.check_value(value)
+        with pytest.raises(ValidationError):
+            BUDGET.check_json(value_encoder.encode(value))
+        with pytest.raises(ValidationError):
+            FormbuilderFormValue.from_legacy(data, budget=BUDGET)
+
+
+def test_decode_ceiling():
+    value = dict(nested(1), items=[{"type": "label", "label": "x" * (TEXT_MAX_LENGTH + 1)}])
+    with pytest.raises(MsgspecValidationError):
+        value_decoder.decode(encode(value))
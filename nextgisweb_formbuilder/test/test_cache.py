@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Lock
+from time import sleep
+
+import pytest
+
+from ..cache import DiskArtifactCache, SingleFlight, spooled_copy, spooled_file
+
+
+def test_disk(tmp_path):
+    cache = DiskArtifactCache(tmp_path, max_size=1000)
+    assert cache.get("ngfp", "0a") is None
+
+    for i in range(10):
+        cache.put("ngfp", f"{i:02x}", bytes([i]) * 100)
+        os.utime(cache._path("ngfp", f"{i:02x}"), (i, i))
+    assert cache.get("ngfp", "00") == b"\x00" * 100
+
+    # The recently read entry survives, the least recently used are evicted
+    cache.put("ngfp", "0a", b"\x0a" * 100)
+    assert cache.get("ngfp", "00") is not None
+    assert cache.get("ngfp", "01") is None
+    assert cache.get("ngfp", "02") is None
+    assert cache.get("ngfp", "0a") is not None
+    assert cache.evict() <= 900
+
+    # Other processes see entries written by this one and account for them
+    other = DiskArtifactCache(tmp_path, max_size=1000)
+    assert other.get("ngfp", "0a") == b"\x0a" * 100
+    other.put("ngfp", "0b", b"\x0b" * 200)
+    assert cache.evict() <= 1000
+    assert not any(fn.startswith(".tmp-") for _, _, fns in os.walk(tmp_path) for fn in fns)
+
+
+def test_disk_usage(tmp_path):
+    cache = DiskArtifactCache(tmp_path, max_size=1000)
+    walks, evict = [], cache._evict
+    cache._evict = lambda: walks.append(None) or evict()
+
+    # The directory is walked once to find out initial usage, then only
+    # when usage exceeds max_size
+    for i in range(10):
+        cache.put("ngfp", f"{i:02x}", bytes([i]) * 100)
+    assert len(walks) == 1
+    cache.put("ngfp", "00", b"\x00" * 50)
+    cache.put("ngfp", "0a", b"\x0a" * 50)
+    assert len(walks) == 1
+    cache.put("ngfp", "0b", b"\x0b" * 100)
+    assert len(walks) == 2
+    assert cache._read_usage() <= 900
+
+
+def test_disk_file(tmp_path):
+    cache = DiskArtifactCache(tmp_path, max_size=1000)
+    writes = []
+
+    def write(fd):
+        writes.append(1)
+        fd.write(b"ngfp")
+
+    for _ in range(2):
+        with cache.build_file("ngfp", "0a", write) as fd:
+            assert fd.read() == b"ngfp"
+    assert len(writes) == 1
+
+
+@pytest.mark.parametrize("clients", (1, 8, 64))
+@pytest.mark.parametrize("coalesce", ("process", "node"))
+def test_single_flight(clients, coalesce, tmp_path):
+    flight, barrier, lock = SingleFlight(), Barrier(clients), Lock()
+    builds = []
+
+    def build():
+        with lock:
+            builds.append(None)
+        sleep(0.2)
+        return b"ngfp"
+
+    def client():
+        barrier.wait()
+        if coalesce == "process":
+            return flight("ab", build)
+        # Separate cache instances behave like separate worker processes
+        cache = DiskArtifactCache(tmp_path, max_size=1000)
+        return cache.build("ngfp", "ab", build, type=bytes)
+
+    with ThreadPoolExecutor(clients) as executor:
+        results = [executor.submit(client) for _ in range(clients)]
+    assert [r.result() for r in results] == [b"ngfp"] * clients
+
+    # The work doesn't grow with the number of concurrent clients
+    assert len(builds) == 1
+
+
+def test_single_flight_file():
+    clients = 8
+    flight, barrier, lock = SingleFlight(), Barrier(clients), Lock()
+    writes = []
+
+    def write(fd):
+        with lock:
+            writes.append(None)
+        sleep(0.2)
+        fd.write(b"ngfp")
+
+    def client():
+        barrier.wait()
+        # Each caller reads its own file, so offsets don't interfere
+        with flight("ab", lambda: spooled_file(write), share=spooled_copy) as fd:
+            return fd.read()
+
+    with ThreadPoolExecutor(clients) as executor:
+        results = [executor.submit(client) for _ in range(clients)]
+    assert [r.result() for r in results] == [b"ngfp"] * clients
+    assert len(writes) == 1
@@ -1,5 +1,6 @@
+from io import BytesIO
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import ZIP_STORED, ZipFile
 
 import pytest
 import transaction
@@ -10,6 +11,10 @@ from nextgisweb.pyramid.test import WebTestApp
 from nextgisweb.resource.test import ResourceAPI
 from nextgisweb.vector_layer import VectorLayer
 
+from .. import roundtrip
+from ..model import FormbuilderFormValue
+from . import benchmark
+
 pytestmark = pytest.mark.usefixtures("ngw_resource_defaults", "ngw_auth_administrator")
 
 
@@ -53,3 +58,38 @@ def test_element(ngfp, meta, form, vector_layer, ngw_file_upload, ngw_webtest_ap
     assert data["geometry_type"] == meta["geometry_type"]
     assert len(data["fields"]) == len(meta["fields"])
     assert len(data["items"]) == len(form)
+
+
+@pytest.mark.parametrize("ngfp", [pytest.param(p, id=p.stem) for p in ELEMENTS.iterdir()])
+@pytest.mark.parametrize(
+    "options",
+    [
+        pytest.param(dict(), id="default"),
+        pytest.param(dict(pretty=False, compression=ZIP_STORED), id="compact"),
+    ],
+)
+def test_roundtrip(ngfp, options):
+    value = FormbuilderFormValue.from_legacy(ngfp)
+    value.validate()
+
+    data = value.to_legacy("Form", **options)
+    assert FormbuilderFormValue.from_legacy(BytesIO(data)) == value
+
+
+def roundtrip_corpus():
+    return [*roundtrip.read([ELEMENTS]), *roundtrip.generate(50, size=30)]
+
+
+def test_roundtrip_corpus():
+    forms = roundtrip_corpus()
+    report = roundtrip.run(forms, workers=2)
+    assert report.total == len(forms)
+    assert report.failed == [], report.format()
+
+
+@benchmark
+def test_roundtrip_corpus_budget():
+    forms = roundtrip_corpus()
+    budget = roundtrip.RoundtripBudget(time=0.5, memory=16 * 2**20)
+    report = roundtrip.run(forms, budget=budget, workers=2)
+    assert report.failed == [] and report.over_budget == [], report.format()
@@ -0,0 +1,25 @@
+import pytest
+import transaction
+
+from nextgisweb.vector_layer import VectorLayer
+
+from ..loadtest import LoadProfile, WebTestClient, run_load
+
+pytestmark = pytest.mark.usefixtures("ngw_resource_defaults", "ngw_auth_administrator")
+
+
+@pytest.fixture(scope="module")
+def vector_layer():
+    with transaction.manager:
+        res = VectorLayer(geometry_type="POINT").persist()
+    return res.id
+
+
+def test_run_load(vector_layer, ngw_webtest_app):
+    profile = LoadProfile(devices=1, requests=50, items=6, options=10)
+    report = run_load(WebTestClient(ngw_webtest_app), parent=vector_layer, profile=profile)
+
+    assert report.requests == 50 and report.errors == 0
+    assert sum(lat.count for lat in report.latency.values()) == 50
+    assert report.latency["ngfp"].count > report.latency["save"].count
+    assert report.throughput > 0 and report.memory
@@ -1,9 +1,29 @@
+/*** Table: formbuilder_artifact ***/
+
+CREATE TABLE formbuilder_artifact (
+    kind character varying NOT NULL,
+    key character varying NOT NULL,
+    fileobj_id integer NOT NULL,
+    size bigint NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    PRIMARY KEY (kind, key),
+    FOREIGN KEY (fileobj_id) REFERENCES fileobj (id)
+);
+
+CREATE INDEX formbuilder_artifact_tstamp_idx ON formbuilder_artifact (tstamp);
+
+COMMENT ON TABLE formbuilder_artifact IS 'formbuilder';
+
 /*** Table: formbuilder_form ***/
 
 CREATE TABLE formbuilder_form (
     id integer NOT NULL,
     value jsonb,
     ngfp_fileobj_id integer,
+    content_hash character varying,
+    content_size bigint,
+    schema_fingerprint character varying,
+    schema_fields jsonb,
     PRIMARY KEY (id),
     CHECK ((
         value IS NULL
@@ -15,3 +35,52 @@ CREATE TABLE formbuilder_form (
 );
 
 COMMENT ON TABLE formbuilder_form IS 'formbuilder';
+
+/*** Table: formbuilder_form_element ***/
+
+CREATE TABLE formbuilder_form_element (
+    resource_id integer NOT NULL,
+    path character varying NOT NULL,
+    position integer NOT NULL,
+    tag character varying NOT NULL,
+    attrs jsonb NOT NULL,
+    PRIMARY KEY (resource_id, path),
+    FOREIGN KEY (resource_id) REFERENCES formbuilder_form (id) ON DELETE CASCADE
+);
+
+CREATE INDEX formbuilder_form_element_attrs_idx ON formbuilder_form_element USING gin (attrs jsonb_path_ops);
+
+CREATE INDEX formbuilder_form_element_position_idx ON formbuilder_form_element (resource_id, position);
+
+CREATE INDEX formbuilder_form_element_tag_idx ON formbuilder_form_element (tag);
+
+COMMENT ON TABLE formbuilder_form_element IS 'formbuilder';
+
+/*** Table: formbuilder_form_revision ***/
+
+CREATE TABLE formbuilder_form_revision (
+    resource_id integer NOT NULL,
+    revision integer NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    snapshot jsonb,
+    delta jsonb,
+    PRIMARY KEY (resource_id, revision),
+    FOREIGN KEY (resource_id) REFERENCES formbuilder_form (id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE formbuilder_form_revision IS 'formbuilder';
+
+/*** Table: formbuilder_ngfp_job ***/
+
+CREATE TABLE formbuilder_ngfp_job (
+    id uuid NOT NULL,
+    user_id integer NOT NULL,
+    status character varying NOT NULL,
+    tstamp timestamp without time zone NOT NULL,
+    value jsonb,
+    error character varying,
+    PRIMARY KEY (id),
+    FOREIGN KEY (user_id) REFERENCES auth_user (principal_id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE formbuilder_ngfp_job IS 'formbuilder';
@@ -0,0 +1,73 @@
+import gc
+import tracemalloc
+
+from msgspec.json import decode, encode
+
+from ..model import FormbuilderFormValue
+from . import benchmark
+
+PRIMARY, SECONDARY = 1000, 100
+
+
+def cascade_form() -> bytes:
+    options = [
+        {
+            "value": f"p{p}",
+            "label": f"p{p}",
+            "items": [{"value": f"s{p}-{s}", "label": f"s{p}-{s}"} for s in range(SECONDARY)],
+        }
+        for p in range(PRIMARY)
+    ]
+    return encode(
+        {
+            "geometry_type": "POINT",
+            "fields": [
+                {"keyname": k, "datatype": "STRING", "display_name": k} for k in ("p", "s")
+            ],
+            "items": [
+                {
+                    "type": "cascade",
+                    "field_primary": "p",
+                    "field_secondary": "s",
+                    "remember": False,
+                    "options": options,
+                }
+            ],
+        }
+    )
+
+
+def test_cascade_memory():
+    data = cascade_form()
+
+    gc.collect()
+    tracked = len(gc.get_objects())
+    value = decode(data, type=FormbuilderFormValue)
+
+    # Only option lists are tracked by the garbage collector, not options
+    assert len(gc.get_objects()) - tracked < PRIMARY + 100
+
+    # Labels equal to values share one string in large option lists
+    value.share_labels()
+    option = value.items[0].options[-1]
+    assert option.label is option.value
+    assert option.items[-1].label is option.items[-1].value
+
+    assert decode(encode(value)) == decode(data)
+
+
+@benchmark
+def test_cascade_memory_size():
+    data = cascade_form()
+
+    tracemalloc.start()
+    try:
+        value = decode(data, type=FormbuilderFormValue)
+        value.share_labels()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # A string shared by value and label, the struct and a list slot
+    per_option = size / (PRIMARY * (SECONDARY + 1))
+    assert per_option < 130, f"{per_option:.0f} bytes per option"
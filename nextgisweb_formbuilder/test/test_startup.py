@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+from msgspec.json import Decoder
+
+from ..model import FormbuilderFormValue, value_decoder
+from . import benchmark
+
+SCRIPT = """
+import sys
+from time import perf_counter
+import nextgisweb_formbuilder.model as m
+
+t = perf_counter()
+m.value_decoder.decode(b'{"geometry_type": "POINT", "fields": [], "items": []}')
+print(perf_counter() - t)
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+def run_script():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    first_decode, modules = proc.stdout.splitlines()
+    return proc.stderr, float(first_decode), set(modules.split())
+
+
+def test_startup():
+    # Decoders are built at import time, not by the first request
+    assert isinstance(value_decoder, Decoder)
+    assert value_decoder.type is FormbuilderFormValue
+
+    # API and views are imported lazily from setup_pyramid
+    _, _, modules = run_script()
+    assert "nextgisweb_formbuilder.model" in modules
+    assert "nextgisweb_formbuilder.api" not in modules
+    assert "nextgisweb_formbuilder.view" not in modules
+
+
+@benchmark
+def test_startup_time():
+    importtime, first_decode, _ = run_script()
+
+    # Import time: self | cumulative | module, in microseconds
+    own = 0
+    for line in importtime.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, module = line.removeprefix("import time:").split("|")
+        if module.strip().startswith("nextgisweb_formbuilder"):
+            own += int(self_us)
+
+    assert own < 100_000, f"Modules imported in {own / 1000:.1f} ms"
+    assert first_decode < 0.001, f"First decode took {first_decode * 1000:.2f} ms"
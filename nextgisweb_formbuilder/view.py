@@ -13,7 +13,7 @@ class FormbuilderFormWidget(Widget):
 
 @resource_sections("@nextgisweb/formbuilder/resource-section")
 def resource_section(obj, **kwargs):
-    return isinstance(obj, FormbuilderForm) and obj.value is not None
+    return isinstance(obj, FormbuilderForm)
 
 
 def setup_pyramid(comp, config):